@@ -1,6 +1,17 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from .models import (
     Region, 
@@ -12,6 +23,239 @@ from .models import (
     Departamento,
     Municipio
 )
+from .parasitos import en_mascara
+from .services.busqueda import filtrar as filtrar_busqueda, indice_disponible
+from .services.conteo import conteo_estimado
+from .services.exportacion import respuesta_exportacion
+
+
+# ==================== CONSULTAS DE LOS LISTADOS ====================
+# Cada ModelAdmin trae en get_queryset lo que muestran sus columnas
+# (select_related y conteos anotados): un listado hace siempre el mismo
+# número de consultas, sin importar cuántas filas tenga la página.
+
+def _conteo(queryset, campo):
+    """
+    Subconsulta con el número de filas de `queryset` cuyo `campo` apunta a la
+    fila externa. Se usa cuando un listado cuenta dos relaciones: con dos
+    Count() los JOIN multiplicarían las filas.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{campo: OuterRef('pk')})
+            .order_by()
+            .values(campo)
+            .annotate(total=Count('*'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def _es_listado(request):
+    """True en la página de listado y sus acciones (no en formularios ni autocompletar)"""
+    nombre = getattr(request.resolver_match, 'url_name', None) or ''
+    return nombre.endswith('_changelist')
+
+
+# ==================== BÚSQUEDA INDEXADA ====================
+
+class BusquedaIndexadaAdmin:
+    """
+    Mixin de ModelAdmin (Expediente y Muestra) que busca en el índice de
+    examen.services.busqueda en lugar de icontains sobre search_fields.
+    search_fields solo se usa si el motor no tiene índice de texto (y el
+    autocompletar del admin exige que no esté vacío).
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not indice_disponible(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return filtrar_busqueda(queryset, search_term), False
+
+
+# ==================== TABLAS GRANDES ====================
+# Con settings.ADMIN_TABLAS_GRANDES los listados de Muestra y Expediente
+# no cuentan la tabla ni paginan con OFFSET:
+# - El total es una estimación (services.conteo)
+# - Con el orden por defecto se pagina por cursor sobre (-fecha, -id):
+#   ?despues=<fecha>_<id> continúa después de la última fila mostrada
+# - Los filtros de centro, región y expediente son selects de autocompletar
+#   y no hay date_hierarchy (ambos listan todos los valores posibles)
+
+TABLAS_GRANDES = getattr(settings, 'ADMIN_TABLAS_GRANDES', False)
+
+CURSOR_VAR = 'despues'
+
+
+class PaginadorEstimado(Paginator):
+    """Paginator cuyo total sale de conteo_estimado"""
+
+    @cached_property
+    def count(self):
+        total, self.tipo_conteo = conteo_estimado(self.object_list)
+        return total
+
+
+class ChangeListTablaGrande(ChangeList):
+    """Listado paginado por cursor cuando se usa el orden por defecto"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.url_siguiente = None
+        super().__init__(request, *args, **kwargs)
+        # Los enlaces de orden y filtros vuelven a la primera página
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+        self.url_primera = self.get_query_string()
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def _desde_cursor(self, queryset, campo):
+        valor, _, ultimo_id = self.cursor.rpartition('_')
+        try:
+            valor = self.lookup_opts.get_field(campo).to_python(valor)
+            ultimo_id = int(ultimo_id)
+        except (ValidationError, ValueError):
+            raise IncorrectLookupParameters('Cursor de paginación no válido')
+        if valor is None:
+            raise IncorrectLookupParameters('Cursor de paginación no válido')
+        return queryset.filter(
+            Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'pk__lt': ultimo_id})
+        )
+
+    def get_results(self, request):
+        self.paginacion_keyset = ORDER_VAR not in self.params
+        if not self.paginacion_keyset:
+            return super().get_results(request)
+
+        campo = self.model_admin.campo_cursor
+        queryset = self.queryset.order_by(f'-{campo}', '-pk')
+        if self.cursor:
+            queryset = self._desde_cursor(queryset, campo)
+        filas = list(queryset[:self.list_per_page + 1])
+        if len(filas) > self.list_per_page:
+            ultima = filas[self.list_per_page - 1]
+            valor = getattr(ultima, campo)
+            self.url_siguiente = self.get_query_string({CURSOR_VAR: f'{valor.isoformat()}_{ultima.pk}'})
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = filas[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.url_siguiente)
+        self.paginator = paginator
+
+
+class FiltroAutocompletar(admin.SimpleListFilter):
+    """
+    Filtro de listado con un select de autocompletar en lugar de un enlace
+    por valor. Busca con el admin del modelo al que apunta `campo_origen`
+    ((modelo, nombre de la ForeignKey)), que debe tener search_fields.
+    """
+    template = 'admin/examen/filtro_autocompletar.html'
+    campo_origen = None
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.admin_site = model_admin.admin_site
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        modelo, nombre = self.campo_origen
+        campo = modelo._meta.get_field(nombre)
+        seleccion = forms.ModelChoiceField(
+            queryset=campo.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(campo, self.admin_site, attrs={
+                'data-filtro-url': changelist.get_query_string({self.parameter_name: '__valor__'}),
+                'style': 'width: 100%',
+            }),
+        )
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'Todos',
+            'widget': seleccion.widget.render(f'filtro_{self.parameter_name}', self.value()),
+        }
+
+
+class FiltroCentro(FiltroAutocompletar):
+    title = 'centro de atención'
+    parameter_name = 'centro_atencion__id__exact'
+    campo_origen = (Muestra, 'centro_atencion')
+
+
+class FiltroRegion(FiltroAutocompletar):
+    title = 'región'
+    parameter_name = 'centro_atencion__region__id__exact'
+    campo_origen = (CentroAtencion, 'region')
+
+
+class FiltroExpediente(FiltroAutocompletar):
+    title = 'expediente'
+    parameter_name = 'expediente__id__exact'
+    campo_origen = (Muestra, 'expediente')
+
+
+class TablaGrandeAdmin:
+    """
+    Mixin de ModelAdmin para el modo de tablas grandes. Las subclases
+    indican `campo_cursor` (fecha del orden por defecto) y los filtros y
+    campos de búsqueda a usar en ese modo.
+    """
+    tabla_grande = TABLAS_GRANDES
+    campo_cursor = None
+    list_filter_tabla_grande = ()
+    search_fields_tabla_grande = ()
+
+    def __init__(self, model, admin_site):
+        super().__init__(model, admin_site)
+        if self.tabla_grande:
+            self.date_hierarchy = None
+            self.show_full_result_count = False
+
+    @property
+    def media(self):
+        media = super().media
+        if self.tabla_grande:
+            media += AutocompleteSelect(Muestra._meta.get_field('centro_atencion'), self.admin_site).media
+        return media
+
+    def get_list_filter(self, request):
+        if self.tabla_grande:
+            return self.list_filter_tabla_grande
+        return super().get_list_filter(request)
+
+    def get_search_fields(self, request):
+        if self.tabla_grande:
+            return self.search_fields_tabla_grande
+        return super().get_search_fields(request)
+
+    def get_changelist(self, request, **kwargs):
+        if self.tabla_grande:
+            return ChangeListTablaGrande
+        return super().get_changelist(request, **kwargs)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if self.tabla_grande:
+            return PaginadorEstimado(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
 
 # ==================== DEPARTAMENTO ====================
 
@@ -24,13 +268,17 @@ class DepartamentoAdmin(admin.ModelAdmin):
     
     readonly_fields = ('fecha_creacion',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_municipios=Count('municipios'))
+    
     def cantidad_municipios(self, obj):
-        count = obj.municipios.count()
+        count = obj.num_municipios
         return format_html(
             '<span style="background-color: #17a2b8; color: white; padding: 3px 10px; border-radius: 3px;">{}</span>',
             count
         )
     cantidad_municipios.short_description = 'Municipios'
+    cantidad_municipios.admin_order_field = 'num_municipios'
 
 
 # ==================== MUNICIPIO ====================
@@ -43,6 +291,9 @@ class MunicipioAdmin(admin.ModelAdmin):
     ordering = ('codigo',)
     
     readonly_fields = ('fecha_creacion',)
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('departamento')
 
 # ==================== INLINE PARA PROFILE EN USER ====================
 
@@ -88,6 +339,9 @@ class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'get_rol', 'get_centro', 'is_active')
     list_filter = ('is_active', 'is_staff', 'profile__rol__nivel')
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('profile__rol', 'profile__centro_atencion')
+    
     def get_rol(self, obj):
         if hasattr(obj, 'profile'):
             return obj.profile.rol.nombre
@@ -126,13 +380,17 @@ class RegionAdmin(admin.ModelAdmin):
     
     readonly_fields = ('fecha_creacion',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_centros=Count('centros_atencion'))
+    
     def cantidad_centros(self, obj):
-        count = obj.centros_atencion.count()
+        count = obj.num_centros
         return format_html(
             '<span style="background-color: #28a745; color: white; padding: 3px 10px; border-radius: 3px;">{}</span>',
             count
         )
     cantidad_centros.short_description = 'Centros'
+    cantidad_centros.admin_order_field = 'num_centros'
 
 
 # ==================== CENTRO DE ATENCIÓN ====================
@@ -158,23 +416,35 @@ class CentroAtencionAdmin(admin.ModelAdmin):
     
     readonly_fields = ('fecha_creacion',)
     
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related('region')
+        # El autocompletar de los filtros y formularios no necesita los conteos
+        if _es_listado(request):
+            queryset = queryset.annotate(
+                num_expedientes=_conteo(Expediente.objects.all(), 'centro_atencion'),
+                num_muestras=_conteo(Muestra.objects.all(), 'centro_atencion'),
+            )
+        return queryset
+    
     def cantidad_expedientes(self, obj):
-        count = obj.expedientes.count()
+        count = obj.num_expedientes
         color = '#007bff' if count > 0 else '#6c757d'
         return format_html(
             '<span style="background-color: {}; color: white; padding: 3px 10px; border-radius: 3px;">{}</span>',
             color, count
         )
     cantidad_expedientes.short_description = 'Expedientes'
+    cantidad_expedientes.admin_order_field = 'num_expedientes'
     
     def cantidad_muestras(self, obj):
-        count = obj.muestras.count()
+        count = obj.num_muestras
         color = '#17a2b8' if count > 0 else '#6c757d'
         return format_html(
             '<span style="background-color: {}; color: white; padding: 3px 10px; border-radius: 3px;">{}</span>',
             color, count
         )
     cantidad_muestras.short_description = 'Muestras'
+    cantidad_muestras.admin_order_field = 'num_muestras'
 
 
 # ==================== ROL ====================
@@ -204,13 +474,17 @@ class RolAdmin(admin.ModelAdmin):
     
     readonly_fields = ('fecha_creacion',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_usuarios=Count('usuarios'))
+    
     def cantidad_usuarios(self, obj):
-        count = obj.usuarios.count()
+        count = obj.num_usuarios
         return format_html(
             '<span style="background-color: #6f42c1; color: white; padding: 3px 10px; border-radius: 3px;">{}</span>',
             count
         )
     cantidad_usuarios.short_description = 'Usuarios'
+    cantidad_usuarios.admin_order_field = 'num_usuarios'
     
     def permisos_resumidos(self, obj):
         permisos = []
@@ -260,6 +534,9 @@ class ProfileAdmin(admin.ModelAdmin):
     
     readonly_fields = ('ultimo_acceso', 'fecha_creacion', 'fecha_modificacion')
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'rol', 'region', 'centro_atencion__region')
+    
     def get_region_display(self, obj):
         if obj.region:
             return f"Región {obj.region.numero_region}"
@@ -272,7 +549,7 @@ class ProfileAdmin(admin.ModelAdmin):
 # ==================== EXPEDIENTE ====================
 
 @admin.register(Expediente)
-class ExpedienteAdmin(admin.ModelAdmin):
+class ExpedienteAdmin(BusquedaIndexadaAdmin, TablaGrandeAdmin, admin.ModelAdmin):
     list_display = (
         'dni', 
         'nombre_completo_display', 
@@ -283,8 +560,14 @@ class ExpedienteAdmin(admin.ModelAdmin):
         'fecha_creacion'
     )
     list_filter = ('sexo', 'centro_atencion', 'departamento', 'activo')
-    search_fields = ('dni', 'primer_nombre', 'primer_apellido', 'municipio')
+    search_fields = ('dni', 'primer_nombre', 'primer_apellido', 'municipio__nombre')
     ordering = ('-fecha_creacion',)
+    raw_id_fields = ('usuario_creacion',)
+    
+    # Modo tablas grandes: búsqueda por índices (DNI exacto, inicio del apellido o nombre)
+    campo_cursor = 'fecha_creacion'
+    list_filter_tabla_grande = ('sexo', FiltroCentro, 'departamento', 'activo')
+    search_fields_tabla_grande = ('=dni', '^primer_apellido', '^primer_nombre')
     
     fieldsets = (
         ('Identificación', {
@@ -327,10 +610,20 @@ class ExpedienteAdmin(admin.ModelAdmin):
         return f"{obj.edad} años"
     edad_display.short_description = 'Edad'
     
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related('centro_atencion')
+        if _es_listado(request):
+            queryset = queryset.annotate(
+                num_muestras=Count('muestras'),
+                num_positivas=Count('muestras', filter=Q(muestras__resultado='POS')),
+                num_negativas=Count('muestras', filter=Q(muestras__resultado='NEG')),
+            )
+        return queryset
+    
     def cantidad_muestras(self, obj):
-        count = obj.muestras.count()
-        pos = obj.muestras.filter(resultado='POS').count()
-        neg = obj.muestras.filter(resultado='NEG').count()
+        count = obj.num_muestras
+        pos = obj.num_positivas
+        neg = obj.num_negativas
         
         return format_html(
             '<span style="background-color: #007bff; color: white; padding: 2px 8px; border-radius: 3px; margin-right: 5px;">Total: {}</span>'
@@ -339,12 +632,13 @@ class ExpedienteAdmin(admin.ModelAdmin):
             count, pos, neg
         )
     cantidad_muestras.short_description = 'Muestras'
+    cantidad_muestras.admin_order_field = 'num_muestras'
 
 
 # ==================== MUESTRA ====================
 
 @admin.register(Muestra)
-class MuestraAdmin(admin.ModelAdmin):
+class MuestraAdmin(BusquedaIndexadaAdmin, TablaGrandeAdmin, admin.ModelAdmin):
     list_display = (
         'numero_examen',
         'expediente_info',
@@ -370,6 +664,19 @@ class MuestraAdmin(admin.ModelAdmin):
     )
     ordering = ('-fecha_examen',)
     date_hierarchy = 'fecha_examen'
+    autocomplete_fields = ('expediente',)
+    raw_id_fields = ('usuario_creacion',)
+    
+    # Modo tablas grandes: filtros de autocompletar y búsqueda exacta por índices
+    campo_cursor = 'fecha_examen'
+    list_filter_tabla_grande = (
+        'resultado',
+        FiltroCentro,
+        FiltroRegion,
+        FiltroExpediente,
+        'activo',
+    )
+    search_fields_tabla_grande = ('=numero_examen', '=expediente__dni')
     
     fieldsets = (
         ('Información del Examen', {
@@ -458,6 +765,29 @@ class MuestraAdmin(admin.ModelAdmin):
     
     readonly_fields = ('resultado', 'fecha_creacion', 'fecha_modificacion')
     
+    # Columnas que lee el listado; el resto de los ~60 campos no se trae
+    CAMPOS_LISTADO = (
+        'numero_examen',
+        'fecha_examen',
+        'resultado',
+        'mascara_parasitos',
+        'expediente__dni',
+        'expediente__primer_nombre',
+        'expediente__segundo_nombre',
+        'expediente__primer_apellido',
+        'expediente__segundo_apellido',
+        'centro_atencion__codigo',
+        'centro_atencion__nombre',
+    )
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).select_related('expediente', 'centro_atencion')
+        # Las acciones y los formularios necesitan la muestra completa
+        # (los signals calculan los deltas con todos los campos rastreados)
+        if _es_listado(request) and request.method == 'GET':
+            queryset = queryset.only(*self.CAMPOS_LISTADO)
+        return queryset
+    
     def expediente_info(self, obj):
         return format_html(
             '<strong>{}</strong><br><small>{}</small>',
@@ -465,6 +795,7 @@ class MuestraAdmin(admin.ModelAdmin):
             obj.expediente.nombre_completo
         )
     expediente_info.short_description = 'Paciente'
+    expediente_info.admin_order_field = 'expediente__dni'
     
     def resultado_badge(self, obj):
         if obj.resultado == 'POS':
@@ -478,12 +809,13 @@ class MuestraAdmin(admin.ModelAdmin):
     resultado_badge.short_description = 'Resultado'
     
     def parasitos_encontrados_resumido(self, obj):
-        parasitos = obj.get_parasitos_encontrados()
+        # Los nombres salen de la máscara: no se leen los campos de parásitos
+        parasitos = [parasito.nombre for parasito in en_mascara(obj.mascara_parasitos)]
         if not parasitos:
             return format_html('<em style="color: #6c757d;">Sin parásitos</em>')
         
         # Mostrar solo los primeros 3 parásitos
-        lista = list(parasitos.keys())[:3]
+        lista = parasitos[:3]
         texto = ', '.join(lista)
         
         if len(parasitos) > 3:
@@ -493,17 +825,22 @@ class MuestraAdmin(admin.ModelAdmin):
     parasitos_encontrados_resumido.short_description = 'Parásitos'
     
     # Acciones personalizadas
-    actions = ['marcar_como_inactivo', 'exportar_json']
+    actions = ['marcar_como_inactivo', 'exportar_json', 'exportar_csv']
     
     def marcar_como_inactivo(self, request, queryset):
-        updated = queryset.update(activo=False)
+        # update() no aplica auto_now: se marca la modificación para la exportación incremental
+        updated = queryset.update(activo=False, fecha_modificacion=timezone.now())
         self.message_user(request, f'{updated} muestra(s) marcada(s) como inactiva(s).')
     marcar_como_inactivo.short_description = 'Marcar como inactivo'
     
     def exportar_json(self, request, queryset):
-        # Aquí podrías implementar lógica de exportación
-        self.message_user(request, f'Exportación de {queryset.count()} muestra(s) (función pendiente).')
-    exportar_json.short_description = 'Exportar a JSON'
+        # Descarga en streaming: una muestra por línea (NDJSON)
+        return respuesta_exportacion(queryset, 'ndjson')
+    exportar_json.short_description = 'Exportar a JSON (NDJSON)'
+    
+    def exportar_csv(self, request, queryset):
+        return respuesta_exportacion(queryset, 'csv')
+    exportar_csv.short_description = 'Exportar a CSV (PowerBI/Excel)'
 
 
 # ==================== PERSONALIZACIÓN DEL ADMIN SITE ====================
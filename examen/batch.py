@@ -0,0 +1,128 @@
+# examen/batch.py
+"""
+Modo lote para guardar o eliminar muchas muestras.
+
+    from examen.batch import lote_de_muestras
+
+    with lote_de_muestras():
+        for muestra in muestras:
+            muestra.giardia_intestinalis = 'Q'
+            muestra.save()
+
+Dentro del bloque los signals de Muestra no actualizan nada por fila: solo
+anotan en el lote lo que cambió (deltas del resumen diario y de los
+contadores semanales, claves centro/parásito/fecha de alertas y centros).
+Al salir se hace un único recálculo consolidado:
+
+1. ResumenDiarioParasito: un UPDATE por valor de delta y una inserción
+2. SemanaEpidemiologica y EstadisticaSemanalCentro: un UPDATE ... F() por
+   valor de delta y una inserción
+3. Alertas: una serie diaria por (centro, parásito) afectado
+4. Cache de dashboards: una invalidación por centro al confirmar
+
+El bloque es una transacción: si se lanza una excepción no se guarda ni se
+recalcula nada. Un bloque anidado se une al lote exterior al terminar.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import transaction
+
+from examen.services.resumen_diario import claves_resumen, aplicar_deltas
+from examen.services.estadisticas import deltas_estadisticas, aplicar_deltas_estadisticas
+from examen.services.alertas import claves_cambio, evaluar_lote
+from examen.services.cache_dashboard import invalidar_por_centros
+
+
+_lote_actual = ContextVar('lote_de_muestras', default=None)
+
+
+class Lote:
+    """Cambios acumulados de las muestras guardadas o eliminadas en un bloque"""
+
+    def __init__(self):
+        self.muestras = 0
+        self.deltas = Counter()
+        self.estadisticas = Counter()
+        self.alertas = {}
+        self.centros = set()
+
+    def registrar(self, anterior, actual, muestra=None):
+        """
+        Anota el cambio de una muestra entre dos estados (Muestra.capturar_estado).
+        Para una muestra nueva `anterior` es None; para una eliminada `actual` es None.
+        """
+        self.muestras += 1
+
+        for clave in claves_resumen(anterior):
+            self.deltas[clave] -= 1
+        for clave in claves_resumen(actual):
+            self.deltas[clave] += 1
+
+        self.estadisticas.update(deltas_estadisticas(anterior, actual))
+
+        for estado in (anterior, actual):
+            if estado:
+                self.centros.add(estado['centro_atencion_id'])
+
+        # Los casos nuevos pueden crear una alerta (con la muestra como origen)
+        nuevas, quitadas = claves_cambio(anterior, actual)
+        for clave in nuevas:
+            self.alertas[clave] = muestra
+        for clave in quitadas:
+            self.alertas.setdefault(clave, None)
+
+    def unir(self, otro):
+        """Agrega los cambios de un lote anidado"""
+        self.muestras += otro.muestras
+        self.deltas.update(otro.deltas)
+        self.estadisticas.update(otro.estadisticas)
+        self.centros |= otro.centros
+        for clave, muestra in otro.alertas.items():
+            self.alertas[clave] = muestra or self.alertas.get(clave)
+
+    def conciliar(self):
+        """Recalcula una sola vez todo lo afectado por el lote"""
+        aplicar_deltas(self.deltas)
+        aplicar_deltas_estadisticas(self.estadisticas)
+        evaluar_lote(
+            (centro_id, campo, fecha, muestra)
+            for (centro_id, campo, fecha), muestra in self.alertas.items()
+        )
+        centros = set(self.centros)
+        transaction.on_commit(lambda: invalidar_por_centros(centros))
+
+
+def lote_activo():
+    """Lote en curso en este contexto (None fuera de lote_de_muestras)"""
+    return _lote_actual.get()
+
+
+@contextmanager
+def lote_de_muestras():
+    """Agrupa los guardados y eliminaciones de muestras (ver el docstring del módulo)"""
+    padre = _lote_actual.get()
+    lote = Lote()
+
+    with transaction.atomic():
+        token = _lote_actual.set(lote)
+        try:
+            yield lote
+        finally:
+            _lote_actual.reset(token)
+
+        if padre is None:
+            lote.conciliar()
+        else:
+            padre.unir(lote)
+
+
+def omitir_en_lote(receptor):
+    """Decorador para receivers de Muestra que no deben ejecutarse dentro de un lote"""
+    @wraps(receptor)
+    def envoltura(*args, **kwargs):
+        if _lote_actual.get() is None:
+            return receptor(*args, **kwargs)
+    return envoltura
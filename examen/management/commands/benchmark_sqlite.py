@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from examen.services.sqlite import directorio_base_datos, medir_escritura, pragmas_configurados
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el rendimiento de escritura de SQLite con sus valores por defecto '
+        'y con SQLITE_PRAGMAS + BEGIN IMMEDIATE, en una base temporal'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=4, help='Hilos que registran muestras')
+        parser.add_argument('--lectores', type=int, default=2, help='Hilos que consultan mientras tanto')
+        parser.add_argument('--transacciones', type=int, default=200, help='Muestras por escritor')
+        parser.add_argument(
+            '--directorio',
+            help='Dónde crear la base temporal (por defecto: junto a la base configurada)'
+        )
+
+    def handle(self, *args, **options):
+        directorio = options['directorio'] or directorio_base_datos()
+        parametros = {
+            'escritores': options['escritores'],
+            'lectores': options['lectores'],
+            'transacciones': options['transacciones'],
+            'directorio': directorio,
+        }
+        self.stdout.write(
+            f'⏱️  {options["escritores"]} escritores × {options["transacciones"]} transacciones, '
+            f'{options["lectores"]} lectores\n'
+        )
+
+        resultados = []
+        for titulo, pragmas, inmediata in (
+            ('Antes (valores por defecto, BEGIN diferido)', {}, False),
+            ('Después (SQLITE_PRAGMAS, BEGIN IMMEDIATE)', pragmas_configurados(), True),
+        ):
+            self.stdout.write(f'🔄 {titulo}...')
+            resultado = medir_escritura(pragmas, inmediata, **parametros)
+            resultados.append(resultado)
+            p95 = f'{resultado["latencia_p95_ms"]:.1f} ms' if resultado['latencia_p95_ms'] is not None else '-'
+            self.stdout.write(
+                f'   ✅ {resultado["transacciones_por_segundo"]:.0f} transacciones/s '
+                f'({resultado["guardadas"]} guardadas en {resultado["segundos"]:.1f}s)\n'
+                f'   ❌ database is locked: {resultado["errores"]} escrituras, '
+                f'{resultado["errores_lectura"]} lecturas\n'
+                f'   📈 Latencia p95: {p95}; lecturas completadas: {resultado["lecturas"]}\n'
+            )
+
+        antes, despues = resultados
+        if antes['transacciones_por_segundo']:
+            mejora = despues['transacciones_por_segundo'] / antes['transacciones_por_segundo']
+            self.stdout.write(self.style.SUCCESS(f'🎉 Escritura ×{mejora:.1f} con el perfil configurado'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from examen.models import Region, CentroAtencion
+from examen.services.cache_dashboard import recalcular_contexto, recalcular_widget
+from examen.services.widgets import WIDGETS
+
+
+class Command(BaseCommand):
+    help = 'Precalcula los snapshots cacheados de los dashboards (nacional, regiones y centros)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alcance',
+            choices=['todos', 'nacional', 'regiones', 'centros'],
+            default='todos',
+            help='Alcances a precalcular (por defecto: todos)'
+        )
+
+    def handle(self, *args, **options):
+        alcance = options['alcance']
+        
+        self.stdout.write('🔥 Calentando cache de dashboards...\n')
+        
+        calculados = 0
+        
+        if alcance in ('todos', 'nacional'):
+            calculados += self.calentar('nacional')
+            self.stdout.write('   ✅ Nacional')
+        
+        if alcance in ('todos', 'regiones'):
+            for region in Region.objects.filter(activo=True).order_by('numero_region'):
+                calculados += self.calentar('region', region)
+                self.stdout.write(f'   ✅ Región {region.numero_region}')
+        
+        if alcance in ('todos', 'centros'):
+            for centro in CentroAtencion.objects.filter(activo=True).select_related('region'):
+                calculados += self.calentar('centro', centro)
+            self.stdout.write('   ✅ Centros de atención')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'\n🎉 ¡Cache calentado! Snapshots calculados: {calculados}\n')
+        )
+    
+    def calentar(self, alcance, objeto=None):
+        """Recalcula el contexto y los widgets de la API de un alcance"""
+        recalcular_contexto(alcance, objeto)
+        for widget in WIDGETS:
+            recalcular_widget(widget, alcance, objeto)
+        return 1 + len(WIDGETS)
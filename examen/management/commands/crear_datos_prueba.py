@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from examen.models import Expediente, Muestra, CentroAtencion
+from examen.batch import lote_de_muestras
 from django.contrib.auth.models import User
 from datetime import date, timedelta
 import random
@@ -68,45 +69,47 @@ class Command(BaseCommand):
         fecha_actual = date.today()
         
         # Crear muestras para las últimas 12 semanas
-        for semana_offset in range(12):
-            fecha = fecha_actual - timedelta(weeks=semana_offset)
-            
-            # 3-5 muestras por semana
-            for j in range(random.randint(3, 5)):
-                ultimo_numero += 1
-                numero = f"LNP-2025-{ultimo_numero:04d}"
-                
-                # 30% positivas
-                es_positiva = random.random() < 0.3
-                
-                # Crear kwargs base
-                kwargs = {
-                    'expediente': random.choice(expedientes),
-                    'numero_examen': numero,
-                    'fecha_examen': fecha,
-                    'responsable_analisis': 'Dra. María López',
-                    'centro_atencion': centro,
-                    'consistencia': random.choice(['FOR', 'BLA', 'LIQ']),
-                    'moco': random.choice(['N', 'E', 'M', 'A']),
-                    'sangre_macroscopica': random.choice(['NO', 'SI']),
-                    'usuario_creacion': usuario
-                }
-                
-                # Si es positiva, agregar parásitos
-                if es_positiva:
-                    kwargs['giardia_intestinalis'] = 'Q'
-                    kwargs['ascaris_lumbricoides'] = 'H'
-                    positivas_creadas += 1
-                
-                muestra = Muestra(**kwargs)
-                # FORZAR resultado antes de guardar
-                muestra.resultado = 'POS' if es_positiva else 'NEG'
-                muestra.save()
+        # (en lote: estadísticas y alertas se recalculan una vez al final)
+        with lote_de_muestras():
+            for semana_offset in range(12):
+                fecha = fecha_actual - timedelta(weeks=semana_offset)
                 
-                muestras_creadas += 1
-                emoji = "🔴" if muestra.resultado == 'POS' else "🟢"
-                self.stdout.write(f'   {emoji} {numero} - {muestra.resultado}')
-        
+                # 3-5 muestras por semana
+                for j in range(random.randint(3, 5)):
+                    ultimo_numero += 1
+                    numero = f"LNP-2025-{ultimo_numero:04d}"
+                    
+                    # 30% positivas
+                    es_positiva = random.random() < 0.3
+                    
+                    # Crear kwargs base
+                    kwargs = {
+                        'expediente': random.choice(expedientes),
+                        'numero_examen': numero,
+                        'fecha_examen': fecha,
+                        'responsable_analisis': 'Dra. María López',
+                        'centro_atencion': centro,
+                        'consistencia': random.choice(['FOR', 'BLA', 'LIQ']),
+                        'moco': random.choice(['N', 'E', 'M', 'A']),
+                        'sangre_macroscopica': random.choice(['NO', 'SI']),
+                        'usuario_creacion': usuario
+                    }
+                    
+                    # Si es positiva, agregar parásitos
+                    if es_positiva:
+                        kwargs['giardia_intestinalis'] = 'Q'
+                        kwargs['ascaris_lumbricoides'] = 'H'
+                        positivas_creadas += 1
+                    
+                    muestra = Muestra(**kwargs)
+                    # FORZAR resultado antes de guardar
+                    muestra.resultado = 'POS' if es_positiva else 'NEG'
+                    muestra.save()
+                    
+                    muestras_creadas += 1
+                    emoji = "🔴" if muestra.resultado == 'POS' else "🟢"
+                    self.stdout.write(f'   {emoji} {numero} - {muestra.resultado}')
+            
         self.stdout.write(self.style.SUCCESS(f'\n   Muestras creadas: {muestras_creadas}'))
         self.stdout.write(self.style.SUCCESS(f'   Positivas: {positivas_creadas}'))
         self.stdout.write(self.style.SUCCESS(f'   Negativas: {muestras_creadas - positivas_creadas}\n'))
@@ -0,0 +1,63 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from examen.models import Muestra
+from examen.services.analitica import exportar_hechos, EXTENSIONES, TAMANO_BLOQUE
+
+
+class Command(BaseCommand):
+    help = 'Exporta la tabla de hechos de muestras en formato columnar (Parquet o Feather) para pandas y PowerBI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('destino', help='Directorio donde se guardan las particiones')
+        parser.add_argument(
+            '--formato',
+            choices=list(EXTENSIONES),
+            default='parquet',
+            help='Formato de archivo (por defecto: parquet)'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Agrega solo las muestras creadas o modificadas desde la última exportación'
+        )
+        parser.add_argument(
+            '--año',
+            type=int,
+            help='Limita la exportación a un año epidemiológico'
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Muestras por bloque leído y escrito (por defecto: {TAMANO_BLOQUE})'
+        )
+
+    def handle(self, *args, **options):
+        muestras = Muestra.objects.all()
+        if options['año']:
+            muestras = muestras.filter(año_epidemiologico=options['año'])
+
+        tipo = 'incremental' if options['incremental'] else 'completa'
+        self.stdout.write(f'📦 Exportación {tipo} en {options["formato"]} a {options["destino"]}...\n')
+
+        try:
+            resultado = exportar_hechos(
+                options['destino'],
+                formato=options['formato'],
+                muestras=muestras,
+                incremental=options['incremental'],
+                tamano_bloque=options['bloque'],
+                al_escribir_bloque=lambda filas: self.stdout.write(f'   ✅ {filas} muestras escritas'),
+            )
+        except (ImproperlyConfigured, ValueError) as e:
+            raise CommandError(str(e))
+
+        archivo = resultado['archivo'].name if resultado['archivo'] else 'sin cambios, no se creó partición'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n🎉 ¡Exportación completada!\n'
+                f"   🧪 Muestras: {resultado['filas']}\n"
+                f'   📄 Archivo: {archivo}\n'
+                f"   🧩 Particiones en el destino: {resultado['particiones']}\n"
+            )
+        )
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from examen.services.boletines import generar_boletines, ultima_semana_cerrada
+from examen.services.reportes_excel import parsear_semana
+
+
+class Command(BaseCommand):
+    help = 'Genera los boletines epidemiológicos semanales en PDF (nacional y uno por región)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semana',
+            help='Semana AAAA-SS (por defecto: la última semana cerrada)'
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            help='Procesos que dibujan los PDF en paralelo (por defecto: uno por CPU)'
+        )
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help='Vuelve a dibujar los boletines ya guardados'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            año, semana = parsear_semana(options['semana']) if options['semana'] else ultima_semana_cerrada()
+        except ValueError:
+            raise CommandError('Semana en formato AAAA-SS')
+
+        self.stdout.write(f'📰 Generando boletines de la semana {semana}/{año}...\n')
+        inicio = time.monotonic()
+        generados = []
+
+        def progreso(ruta):
+            generados.append(ruta)
+            self.stdout.write(f'   ✅ {ruta.name}')
+
+        try:
+            rutas = generar_boletines(
+                año, semana,
+                procesos=options['procesos'],
+                forzar=options['forzar'],
+                al_terminar=progreso,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n🎉 ¡Boletines listos!\n'
+                f'   📄 Generados: {len(generados)}\n'
+                f'   ♻️  Ya guardados: {len(rutas) - len(generados)}\n'
+                f'   ⏱️  Tiempo: {time.monotonic() - inicio:.1f}s\n'
+            )
+        )
@@ -0,0 +1,89 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from examen.models import Region, CentroAtencion
+from examen.services.reportes_excel import parsear_semana, fechas_del_rango, generar_reporte, reporte_en_cache
+from examen.services.tareas import encolar, tarea_reporte_excel
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera el reporte Excel semanal (muestras, semanal por centro, frecuencia de '
+        'parásitos y alertas) de un alcance y rango de semanas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            help='Semana inicial AAAA-SS (por defecto: la última semana completa)'
+        )
+        parser.add_argument(
+            '--hasta',
+            help='Semana final AAAA-SS (por defecto: igual a --desde)'
+        )
+        parser.add_argument(
+            '--region',
+            type=int,
+            help='Número de región (por defecto: nacional)'
+        )
+        parser.add_argument(
+            '--centro',
+            help='Código del centro de atención'
+        )
+        parser.add_argument(
+            '--todas-las-regiones',
+            action='store_true',
+            help='Un reporte por cada región activa'
+        )
+        parser.add_argument(
+            '--encolar',
+            action='store_true',
+            help='No genera nada: encola las tareas para `procesar_tareas`'
+        )
+
+    def handle(self, *args, **options):
+        anterior = (date.today() - timedelta(days=7)).isocalendar()
+        try:
+            desde = parsear_semana(options['desde'] or f'{anterior[0]}-{anterior[1]}')
+            hasta = parsear_semana(options['hasta'] or f'{desde[0]}-{desde[1]}')
+            fechas_del_rango(desde, hasta)
+        except ValueError:
+            raise CommandError('Semanas en formato AAAA-SS y --desde anterior o igual a --hasta')
+
+        if options['todas_las_regiones']:
+            alcances = [
+                ('region', region_id)
+                for region_id in Region.objects.filter(activo=True).order_by('numero_region').values_list('id', flat=True)
+            ]
+        elif options['centro']:
+            centro = CentroAtencion.objects.filter(codigo=options['centro']).first()
+            if not centro:
+                raise CommandError(f'No existe el centro {options["centro"]}')
+            alcances = [('centro', centro.id)]
+        elif options['region']:
+            region = Region.objects.filter(numero_region=options['region']).first()
+            if not region:
+                raise CommandError(f'No existe la región {options["region"]}')
+            alcances = [('region', region.id)]
+        else:
+            alcances = [('nacional', None)]
+
+        rango = f'{desde[0]}-S{desde[1]:02d} a {hasta[0]}-S{hasta[1]:02d}'
+
+        if options['encolar']:
+            encolar([tarea_reporte_excel(alcance, objeto_id, desde, hasta) for alcance, objeto_id in alcances])
+            self.stdout.write(self.style.SUCCESS(f'📥 {len(alcances)} reporte(s) encolado(s) ({rango})'))
+            return
+
+        self.stdout.write(f'📊 Generando {len(alcances)} reporte(s) Excel ({rango})...\n')
+        for alcance, objeto_id in alcances:
+            etiqueta = alcance + (f' {objeto_id}' if objeto_id else '')
+            if reporte_en_cache(alcance, objeto_id, desde, hasta):
+                self.stdout.write(f'   ♻️  {etiqueta}: ya está al día')
+                continue
+            inicio = time.monotonic()
+            ruta = generar_reporte(alcance, objeto_id, desde, hasta)
+            self.stdout.write(f'   ✅ {etiqueta}: {ruta.name} ({time.monotonic() - inicio:.1f}s)')
+
+        self.stdout.write(self.style.SUCCESS('\n🎉 ¡Reportes generados!'))
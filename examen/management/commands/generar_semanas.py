@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
-from examen.models import SemanaEpidemiologica
-from datetime import date, timedelta
+from examen.services.semanas import prellenar, semanas_del_año, semanas_del_rango
+from datetime import date
 
 
 class Command(BaseCommand):
@@ -28,47 +28,14 @@ class Command(BaseCommand):
             f'\n🗓️  Generando semanas epidemiológicas ({año_inicio}-{año_fin})...\n'
         ))
         
-        creadas = 0
-        existentes = 0
+        # Todas las semanas ISO del rango, calculadas sin consultar la BD
+        desde = date.fromisocalendar(año_inicio, 1, 1)
+        hasta = date.fromisocalendar(año_fin, semanas_del_año(año_fin), 7)
+        total = len(semanas_del_rango(desde, hasta))
         
-        for año in range(año_inicio, año_fin + 1):
-            # Primera semana del año
-            fecha = date(año, 1, 1)
-            año_iso, semana_iso, dia = fecha.isocalendar()
-            
-            # Si el 1 de enero no es semana 1, avanzar al lunes de la semana 1
-            if semana_iso != 1:
-                dias_hasta_lunes = (7 - dia + 1) % 7
-                fecha = fecha + timedelta(days=dias_hasta_lunes)
-            
-            # Determinar cuántas semanas tiene este año
-            ultimo_dia = date(año, 12, 31)
-            semanas_en_año = ultimo_dia.isocalendar()[1]
-            
-            # Si la última semana es 1, el año tiene 52 semanas
-            if semanas_en_año == 1:
-                semanas_en_año = 52
-            
-            for semana in range(1, semanas_en_año + 1):
-                inicio_semana = fecha
-                fin_semana = inicio_semana + timedelta(days=6)
-                
-                obj, created = SemanaEpidemiologica.objects.get_or_create(
-                    año=año,
-                    semana=semana,
-                    defaults={
-                        'fecha_inicio': inicio_semana,
-                        'fecha_fin': fin_semana
-                    }
-                )
-                
-                if created:
-                    creadas += 1
-                    self.stdout.write(f'   ✅ Creada: {obj}')
-                else:
-                    existentes += 1
-                
-                fecha = fecha + timedelta(days=7)
+        # Una lectura y una sola inserción para las que falten
+        creadas = prellenar(desde, hasta)
+        existentes = total - creadas
         
         self.stdout.write(self.style.SUCCESS(f'\n📊 Resumen:'))
         self.stdout.write(f'   Semanas creadas: {creadas}')
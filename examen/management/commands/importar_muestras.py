@@ -0,0 +1,98 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from examen.models import CentroAtencion
+from examen.services.importacion import importar_muestras, TAMANO_BLOQUE
+
+
+class Command(BaseCommand):
+    help = 'Importa muestras (y expedientes nuevos) desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument(
+            '--usuario',
+            required=True,
+            help='Usuario que queda como creador de las muestras y expedientes'
+        )
+        parser.add_argument(
+            '--formato',
+            choices=['csv', 'xlsx'],
+            help='Formato del archivo (por defecto: según la extensión)'
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Filas por bloque (por defecto: {TAMANO_BLOQUE})'
+        )
+        parser.add_argument(
+            '--region',
+            type=int,
+            help='Solo acepta centros de esta región (número de región)'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo valida el archivo, no guarda nada'
+        )
+        parser.add_argument(
+            '--errores',
+            help='Ruta de un CSV donde escribir las filas con error'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario {options["usuario"]}')
+
+        centros = CentroAtencion.objects.all()
+        if options['region']:
+            centros = centros.filter(region__numero_region=options['region'])
+
+        modo = ' (simulación)' if options['simular'] else ''
+        self.stdout.write(f'📥 Importando {options["archivo"]}{modo}...\n')
+
+        def progreso(resultado):
+            self.stdout.write(
+                f'   ✅ {resultado["filas"]} filas leídas | '
+                f'{resultado["importadas"]} importadas | '
+                f'{len(resultado["errores"])} con error'
+            )
+
+        try:
+            resultado = importar_muestras(
+                options['archivo'],
+                usuario,
+                formato=options['formato'],
+                tamano_bloque=options['bloque'],
+                centros=centros,
+                simular=options['simular'],
+                al_procesar_bloque=progreso,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        errores = resultado['errores']
+        if errores:
+            for fila, mensaje in errores[:20]:
+                self.stdout.write(self.style.WARNING(f'   ⚠️  Fila {fila}: {mensaje}'))
+            if len(errores) > 20:
+                self.stdout.write(f'   ... y {len(errores) - 20} filas más con error')
+
+            if options['errores']:
+                with open(options['errores'], 'w', newline='', encoding='utf-8') as archivo:
+                    escritor = csv.writer(archivo)
+                    escritor.writerow(['fila', 'error'])
+                    escritor.writerows(errores)
+                self.stdout.write(f'\n📄 Errores guardados en {options["errores"]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n🎉 ¡Importación completada!{modo}\n'
+            f'   Filas leídas: {resultado["filas"]}\n'
+            f'   Muestras importadas: {resultado["importadas"]}\n'
+            f'   Expedientes creados: {resultado["expedientes_creados"]}\n'
+            f'   Filas con error: {len(errores)}\n'
+        ))
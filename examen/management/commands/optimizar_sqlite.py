@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from examen.services.sqlite import optimizar, pragmas_actuales
+
+
+class Command(BaseCommand):
+    help = 'Mantenimiento periódico de la base SQLite: estadísticas del planificador, índice de búsqueda y WAL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='ANALYZE completo en vez de PRAGMA optimize (tras importaciones grandes)'
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Reescribe el archivo para liberar el espacio de filas borradas (bloquea la base)'
+        )
+        parser.add_argument(
+            '--pragmas',
+            action='store_true',
+            help='Muestra los pragmas vigentes en la conexión'
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔧 Optimizando la base SQLite...\n')
+        inicio = time.monotonic()
+        try:
+            resultado = optimizar(
+                analizar=options['analyze'],
+                compactar=options['vacuum'],
+                using=options['database'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        if options['pragmas']:
+            self.stdout.write('⚙️  Pragmas vigentes:')
+            for nombre, valor in pragmas_actuales(options['database']).items():
+                self.stdout.write(f'   {nombre} = {valor}')
+            self.stdout.write('')
+
+        antes, despues = resultado['antes'], resultado['despues']
+        _, paginas_wal, copiadas = resultado['checkpoint']
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'🎉 ¡Base optimizada!\n'
+                f'   📊 Estadísticas: {"ANALYZE completo" if options["analyze"] else "PRAGMA optimize"}\n'
+                f'   💾 Tamaño: {antes["bytes"] / 1024 ** 2:.1f} MB → {despues["bytes"] / 1024 ** 2:.1f} MB\n'
+                f'   🗑️  Páginas libres: {antes["paginas_libres"]} → {despues["paginas_libres"]}\n'
+                f'   📝 WAL: {copiadas}/{paginas_wal} páginas copiadas a la base\n'
+                f'   ⏱️  Tiempo: {time.monotonic() - inicio:.1f}s\n'
+            )
+        )
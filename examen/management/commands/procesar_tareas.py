@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from examen.models import TareaDiferida
+from examen.services.tareas import procesar_lote
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de tareas diferidas (alertas, recálculos de estadísticas y reportes Excel)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Vacía la cola disponible y termina (para cron)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando la cola está vacía (por defecto: 2)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Tareas tomadas por lote (por defecto: 500)'
+        )
+
+    def handle(self, *args, **options):
+        una_vez = options['una_vez']
+        intervalo = options['intervalo']
+        lote = options['lote']
+
+        self.stdout.write('⚙️  Procesando tareas diferidas...\n')
+
+        total_procesadas = total_fallidas = 0
+        try:
+            while True:
+                procesadas, fallidas = procesar_lote(lote)
+                total_procesadas += procesadas
+                total_fallidas += fallidas
+
+                if procesadas or fallidas:
+                    self.stdout.write(f'   ✅ {procesadas} procesadas, ❌ {fallidas} con error')
+                    continue
+
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            self.stdout.write('\n⏹️  Detenido')
+
+        fallidas_definitivas = TareaDiferida.objects.filter(estado='FALLIDA').count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n🎉 Tareas procesadas: {total_procesadas} | Con error: {total_fallidas}\n'
+            )
+        )
+        if fallidas_definitivas:
+            self.stdout.write(
+                self.style.WARNING(f'⚠️  Tareas FALLIDAS (sin más reintentos): {fallidas_definitivas}\n')
+            )
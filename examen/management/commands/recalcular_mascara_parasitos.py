@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from examen.models import Muestra
+from examen.services.mascara_parasitos import recalcular_mascaras
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la máscara de parásitos de todas las muestras (backfill)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Recalculando máscara de parásitos...\n')
+        
+        total = Muestra.objects.count()
+        con_parasitos = recalcular_mascaras()
+        
+        # Muestras cuyo resultado guardado no coincide con la máscara
+        inconsistentes = (
+            Muestra.objects.filter(resultado='POS', mascara_parasitos=0).count() +
+            Muestra.objects.filter(resultado='NEG', mascara_parasitos__gt=0).count()
+        )
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n✅ ¡Máscaras recalculadas!\n'
+                f'   📊 Muestras: {total}\n'
+                f'   🦠 Con parásitos: {con_parasitos}\n'
+            )
+        )
+        
+        if inconsistentes:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'⚠️  {inconsistentes} muestras tienen un resultado que no coincide con sus parásitos\n'
+                )
+            )
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from examen.models import SemanaEpidemiologica
+from examen.services.estadisticas import reconciliar_estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Verifica los contadores semanales (nacionales y por centro) contra las muestras y repara las diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-verificar',
+            action='store_true',
+            help='Solo informa las diferencias, sin repararlas'
+        )
+        parser.add_argument(
+            '--año',
+            type=int,
+            help='Limita la revisión a un año epidemiológico'
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=52,
+            help='Semanas revisadas por consulta (por defecto: 52)'
+        )
+        parser.add_argument(
+            '--mostrar',
+            type=int,
+            default=20,
+            help='Diferencias a mostrar en detalle (por defecto: 20)'
+        )
+
+    def handle(self, *args, **options):
+        reparar = not options['solo_verificar']
+
+        semanas = SemanaEpidemiologica.objects.all()
+        if options['año']:
+            semanas = semanas.filter(año=options['año'])
+
+        self.stdout.write('🔍 Revisando estadísticas semanales...\n')
+
+        def progreso(parcial):
+            self.stdout.write(
+                f"   🗓️  {parcial['semanas']} semanas revisadas, "
+                f"⚠️  {len(parcial['diferencias'])} diferencias"
+            )
+
+        resultado = reconciliar_estadisticas(
+            semanas,
+            tamano_bloque=options['bloque'],
+            reparar=reparar,
+            al_procesar_bloque=progreso,
+        )
+        diferencias = resultado['diferencias']
+
+        for semana_id, centro_id, guardado, calculado in diferencias[:options['mostrar']]:
+            ambito = f'centro {centro_id}' if centro_id else 'nacional'
+            self.stdout.write(
+                f'   ❌ Semana {semana_id} ({ambito}): guardado {guardado or "sin fila"}, calculado {calculado}'
+            )
+        if len(diferencias) > options['mostrar']:
+            self.stdout.write(f'   ... y {len(diferencias) - options["mostrar"]} más')
+
+        if not diferencias:
+            mensaje = '✅ Los contadores coinciden con las muestras'
+        elif reparar:
+            mensaje = f'🔧 Diferencias reparadas: {len(diferencias)}'
+        else:
+            mensaje = f'⚠️  Diferencias encontradas: {len(diferencias)} (use sin --solo-verificar para repararlas)'
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n{mensaje}\n'
+                f"   🗓️  Semanas revisadas: {resultado['semanas']}\n"
+                f"   🏥 Pares semana x centro: {resultado['pares']}\n"
+            )
+        )
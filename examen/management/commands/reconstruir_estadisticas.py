@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from examen.services.reconstruccion import reconstruir_en_paralelo, TIPOS_PARTICION
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye las estadísticas semanales cacheadas (nacionales y por centro) '
+        'y el resumen diario, por particiones en paralelo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--particion',
+            choices=TIPOS_PARTICION,
+            default='semana',
+            help='Divide el trabajo por bloques de semanas o por centro (por defecto: semana)'
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=13,
+            help='Semanas por partición con --particion semana (por defecto: 13)'
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            help='Procesos en paralelo (por defecto: uno por CPU; 1 = sin pool)'
+        )
+        parser.add_argument(
+            '--verify', '--verificar',
+            dest='verificar',
+            action='store_true',
+            help='No escribe nada: solo informa las diferencias con las muestras'
+        )
+        parser.add_argument(
+            '--mostrar',
+            type=int,
+            default=20,
+            help='Diferencias a mostrar en detalle con --verify (por defecto: 20)'
+        )
+
+    def handle(self, *args, **options):
+        verificar = options['verificar']
+        accion = 'Verificando' if verificar else 'Reconstruyendo'
+        self.stdout.write(f'🔄 {accion} estadísticas semanales y resumen diario...\n')
+
+        def progreso(parcial):
+            velocidad = parcial['muestras'] / parcial['segundos'] if parcial['segundos'] else 0
+            self.stdout.write(
+                f"   ⏳ {parcial['completadas']}/{parcial['particiones']} particiones | "
+                f"{parcial['muestras']} muestras | {velocidad:,.0f} muestras/s"
+            )
+
+        resultado = reconstruir_en_paralelo(
+            tipo=options['particion'],
+            procesos=options['procesos'],
+            tamano_bloque=options['bloque'],
+            verificar=verificar,
+            al_terminar_particion=progreso,
+        )
+        velocidad = resultado['muestras'] / resultado['segundos'] if resultado['segundos'] else 0
+        resumen = (
+            f"   🧩 Particiones: {resultado['particiones']}\n"
+            f"   🧪 Muestras: {resultado['muestras']}\n"
+            f"   ⏱️  Tiempo: {resultado['segundos']:.1f}s ({velocidad:,.0f} muestras/s)\n"
+        )
+
+        if not verificar:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'\n✅ ¡Estadísticas reconstruidas!\n'
+                    f"   📊 Filas escritas: {resultado['filas']}\n"
+                    f'{resumen}'
+                )
+            )
+            return
+
+        diferencias = resultado['diferencias']
+        for tipo, clave, guardado, calculado in diferencias[:options['mostrar']]:
+            clave = ' / '.join(map(str, clave)) if isinstance(clave, tuple) else clave
+            self.stdout.write(f'   ❌ {tipo} {clave}: guardado {guardado}, calculado {calculado}')
+        if len(diferencias) > options['mostrar']:
+            self.stdout.write(f'   ... y {len(diferencias) - options["mostrar"]} más')
+
+        if diferencias:
+            mensaje = self.style.WARNING(f'\n⚠️  Diferencias encontradas: {len(diferencias)}\n{resumen}')
+        else:
+            mensaje = self.style.SUCCESS(f'\n✅ Los contadores coinciden con las muestras\n{resumen}')
+        self.stdout.write(mensaje)
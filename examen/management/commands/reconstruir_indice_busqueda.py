@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from examen.services.busqueda import reconstruir_indice, indice_disponible
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenera el índice de búsqueda de expedientes y muestras (nombres, DNI y '
+        'número de examen) y crea el índice de texto del motor si falta'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔎 Reconstruyendo índice de búsqueda...\n')
+        inicio = time.monotonic()
+
+        resultado = reconstruir_indice()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n✅ ¡Índice reconstruido!\n'
+                f'   🧑 Expedientes: {resultado["expedientes"]}\n'
+                f'   🧪 Muestras: {resultado["muestras"]}\n'
+                f'   🗑️  Entradas eliminadas: {resultado["eliminadas"]}\n'
+                f'   ⏱️  Tiempo: {time.monotonic() - inicio:.1f}s\n'
+            )
+        )
+        if not indice_disponible():
+            self.stdout.write(self.style.WARNING(
+                '⚠️  El motor de base de datos no tiene índice de texto: se buscará con LIKE'
+            ))
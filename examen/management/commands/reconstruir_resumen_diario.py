@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from examen.models import ResumenDiarioParasito
+from examen.services.resumen_diario import reconstruir_resumen_diario
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el resumen diario (fecha x centro x parásito x estadio)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Reconstruyendo resumen diario de parásitos...\n')
+        
+        anteriores = ResumenDiarioParasito.objects.count()
+        creadas = reconstruir_resumen_diario()
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n✅ ¡Resumen reconstruido!\n'
+                f'   🗑️  Filas anteriores: {anteriores}\n'
+                f'   📊 Filas creadas: {creadas}\n'
+            )
+        )
@@ -0,0 +1,459 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:24
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+import smart_selects.db_fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CentroAtencion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=200, verbose_name='Nombre del Establecimiento')),
+                ('codigo', models.CharField(help_text='Código único del establecimiento', max_length=20, unique=True, verbose_name='Código')),
+                ('direccion', models.TextField(verbose_name='Dirección')),
+                ('telefono', models.CharField(blank=True, max_length=15, verbose_name='Teléfono')),
+                ('es_regional', models.BooleanField(default=False, help_text='Indica si este centro tiene responsabilidad regional', verbose_name='¿Es Centro Regional?')),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Centro de Atención',
+                'verbose_name_plural': 'Centros de Atención',
+                'ordering': ['region', 'nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Departamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre del Departamento')),
+                ('codigo', models.CharField(help_text='Código de 2 dígitos (01-18)', max_length=2, unique=True, verbose_name='Código Administrativo')),
+                ('extension_territorial', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Extensión Territorial (km²)')),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Departamento',
+                'verbose_name_plural': 'Departamentos',
+                'ordering': ['codigo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Rol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True, verbose_name='Nombre del Rol')),
+                ('nivel', models.CharField(choices=[('LNP', 'Laboratorio Nacional de Parasitología'), ('REG', 'Regional'), ('CAT', 'Centro de Atención')], max_length=3, verbose_name='Nivel de Acceso')),
+                ('descripcion', models.TextField(blank=True, verbose_name='Descripción')),
+                ('puede_crear_usuarios', models.BooleanField(default=False, verbose_name='¿Puede crear usuarios?')),
+                ('puede_ver_todas_regiones', models.BooleanField(default=False, verbose_name='¿Puede ver todas las regiones?')),
+                ('puede_generar_reportes_nacionales', models.BooleanField(default=False, verbose_name='¿Puede generar reportes nacionales?')),
+                ('puede_editar_configuracion', models.BooleanField(default=False, verbose_name='¿Puede editar configuración del sistema?')),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Rol',
+                'verbose_name_plural': 'Roles',
+                'ordering': ['nivel', 'nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VersionDashboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=50, unique=True, verbose_name='Alcance')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Versión')),
+            ],
+            options={
+                'verbose_name': 'Versión de Dashboard',
+                'verbose_name_plural': 'Versiones de Dashboard',
+            },
+        ),
+        migrations.CreateModel(
+            name='ConfiguracionAlerta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parasito_campo', models.CharField(choices=[('entamoeba_histolytica', 'Entamoeba histolytica'), ('entamoeba_coli', 'Entamoeba coli'), ('entamoeba_hartmanni', 'Entamoeba hartmanni'), ('endolimax_nana', 'Endolimax nana'), ('iodamoeba_butschlii', 'Iodamoeba bütschlii'), ('giardia_intestinalis', 'Giardia intestinalis'), ('pentatrichomonas_hominis', 'Pentatrichomonas hominis'), ('chilomastix_mesnili', 'Chilomastix mesnili'), ('balantidium_coli', 'Balantidium coli'), ('blastocystis_sp', 'Blastocystis sp'), ('cystoisospora_belli', 'Cystoisospora belli'), ('cyclospora_cayetanensis', 'Cyclospora cayetanensis'), ('cryptosporidium_spp', 'Cryptosporidium spp'), ('ascaris_lumbricoides', 'Ascaris lumbricoides'), ('trichuris_trichiura', 'Trichuris trichiura'), ('necator_americanus', 'Necator americanus'), ('strongyloides_stercoralis', 'Strongyloides stercoralis'), ('enterobius_vermicularis', 'Enterobius vermicularis'), ('taenia_spp', 'Taenia spp'), ('hymenolepis_diminuta', 'Hymenolepis diminuta'), ('rodentolepis_nana', 'Rodentolepis nana')], help_text='Seleccione el parásito de la lista', max_length=100, unique=True, verbose_name='Parásito a Monitorear')),
+                ('activo', models.BooleanField(default=True, help_text='Desactivar para detener el monitoreo de este parásito', verbose_name='¿Alerta Activa?')),
+                ('umbral_precaucion', models.IntegerField(default=10, help_text='Número de casos para alerta amarilla. Para parásitos comunes: valor bajo (ej: 10)', verbose_name='Umbral Precaución (🟡)')),
+                ('umbral_alerta', models.IntegerField(default=20, help_text='Número de casos para alerta naranja. Para parásitos comunes: valor medio (ej: 20)', verbose_name='Umbral Alerta (🟠)')),
+                ('umbral_emergencia', models.IntegerField(default=1, help_text='Número de casos para alerta roja. Para parásitos críticos usar 1, para comunes usar valor alto (ej: 50)', verbose_name='Umbral Emergencia (🔴)')),
+                ('ventana_tiempo_dias', models.IntegerField(default=7, help_text='Período para contar casos (7=semana, 30=mes)', verbose_name='Ventana de Tiempo (días)')),
+                ('notificar_centro', models.BooleanField(default=True, help_text='Usuario CAT que registró la muestra', verbose_name='Notificar a Centro de Atención')),
+                ('notificar_regional', models.BooleanField(default=True, help_text='Microbiólogo/usuario REG de la región', verbose_name='Notificar a Regional')),
+                ('notificar_nacional', models.BooleanField(default=True, help_text='Usuarios LNP a nivel nacional', verbose_name='Notificar a Nacional (LNP)')),
+                ('descripcion', models.TextField(blank=True, help_text='Información sobre por qué este parásito requiere monitoreo especial', verbose_name='Descripción')),
+                ('medidas_recomendadas', models.TextField(blank=True, help_text='Acciones a tomar cuando se detecta esta alerta', verbose_name='Medidas Recomendadas')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True)),
+                ('creado_por', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='configuraciones_alertas_creadas', to=settings.AUTH_USER_MODEL, verbose_name='Creado por')),
+            ],
+            options={
+                'verbose_name': 'Configuración de Alerta',
+                'verbose_name_plural': 'Configuraciones de Alertas',
+                'ordering': ['parasito_campo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Expediente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dni', models.CharField(help_text='Formato: 0801-1990-12345', max_length=15, unique=True, validators=[django.core.validators.RegexValidator(message='El DNI debe tener el formato: 0801-1990-12345', regex='^\\d{4}-\\d{4}-\\d{5}$')], verbose_name='DNI')),
+                ('primer_nombre', models.CharField(max_length=50, verbose_name='Primer Nombre')),
+                ('segundo_nombre', models.CharField(blank=True, max_length=50, verbose_name='Segundo Nombre')),
+                ('primer_apellido', models.CharField(max_length=50, verbose_name='Primer Apellido')),
+                ('segundo_apellido', models.CharField(blank=True, max_length=50, verbose_name='Segundo Apellido')),
+                ('sexo', models.CharField(choices=[('M', 'Masculino'), ('F', 'Femenino')], max_length=1, verbose_name='Sexo')),
+                ('fecha_nacimiento', models.DateField(verbose_name='Fecha de Nacimiento')),
+                ('departamento_old', models.CharField(blank=True, db_column='departamento_old', editable=False, max_length=100, null=True, verbose_name='Departamento (antiguo)')),
+                ('municipio_old', models.CharField(blank=True, db_column='municipio_old', editable=False, max_length=100, null=True, verbose_name='Municipio (antiguo)')),
+                ('direccion', models.TextField(verbose_name='Dirección Completa')),
+                ('telefono', models.CharField(blank=True, max_length=15, verbose_name='Teléfono')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Última Modificación')),
+                ('activo', models.BooleanField(default=True, verbose_name='¿Activo?')),
+                ('centro_atencion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='expedientes', to='examen.centroatencion', verbose_name='Establecimiento de Salud')),
+                ('departamento', models.ForeignKey(blank=True, db_column='departamento_id', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='expedientes', to='examen.departamento', verbose_name='Departamento')),
+                ('usuario_creacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='expedientes_creados', to=settings.AUTH_USER_MODEL, verbose_name='Usuario que Creó el Expediente')),
+            ],
+            options={
+                'verbose_name': 'Expediente',
+                'verbose_name_plural': 'Expedientes',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Muestra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_examen', models.CharField(help_text='Código único del examen', max_length=20, unique=True, verbose_name='Número de Examen')),
+                ('fecha_examen', models.DateField(verbose_name='Fecha del Examen')),
+                ('semana_numero', models.IntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Número de Semana')),
+                ('año_epidemiologico', models.IntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Año Epidemiológico')),
+                ('responsable_analisis', models.CharField(blank=True, max_length=200, verbose_name='Responsable del Análisis')),
+                ('consistencia', models.CharField(choices=[('FOR', 'Formada'), ('BLA', 'Blanda'), ('LIQ', 'Líquida/Diarreica')], max_length=3, verbose_name='Consistencia de la Muestra')),
+                ('moco', models.CharField(choices=[('N', 'No se observa'), ('E', 'Escaso'), ('M', 'Moderado'), ('A', 'Abundante')], default='N', max_length=1, verbose_name='Moco')),
+                ('sangre_macroscopica', models.CharField(choices=[('NO', 'No'), ('SI', 'Sí')], default='NO', max_length=2, verbose_name='Sangre Macroscópica')),
+                ('resultado', models.CharField(choices=[('NEG', 'Negativo'), ('POS', 'Positivo')], default='NEG', editable=False, max_length=3, verbose_name='Resultado')),
+                ('mascara_parasitos', models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Máscara de Parásitos')),
+                ('entamoeba_histolytica', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Entamoeba histolytica')),
+                ('entamoeba_coli', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Entamoeba coli')),
+                ('entamoeba_hartmanni', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Entamoeba hartmanni')),
+                ('endolimax_nana', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Endolimax nana')),
+                ('iodamoeba_butschlii', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Iodamoeba bütschlii')),
+                ('giardia_intestinalis', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Giardia intestinalis')),
+                ('pentatrichomonas_hominis', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Pentatrichomonas hominis')),
+                ('chilomastix_mesnili', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Chilomastix mesnili')),
+                ('balantidium_coli', models.CharField(blank=True, choices=[('', 'No se observa'), ('T', 'Trofozoíto'), ('Q', 'Quiste'), ('TQ', 'Trofozoíto y Quiste')], max_length=2, verbose_name='Balantidium coli')),
+                ('blastocystis_sp', models.CharField(blank=True, choices=[('', 'No se observa'), ('O', 'Ooquiste')], max_length=1, verbose_name='Blastocystis sp')),
+                ('cystoisospora_belli', models.CharField(blank=True, choices=[('', 'No se observa'), ('O', 'Ooquiste')], max_length=1, verbose_name='Cystoisospora belli')),
+                ('cyclospora_cayetanensis', models.CharField(blank=True, choices=[('', 'No se observa'), ('O', 'Ooquiste')], max_length=1, verbose_name='Cyclospora cayetanensis')),
+                ('cryptosporidium_spp', models.CharField(blank=True, choices=[('', 'No se observa'), ('O', 'Ooquiste')], max_length=1, verbose_name='Cryptosporidium spp')),
+                ('ascaris_lumbricoides', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('L', 'Larva'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Ascaris lumbricoides')),
+                ('ascaris_intensidad', models.CharField(blank=True, choices=[('', 'No aplica'), ('L', 'Leve'), ('M', 'Moderada'), ('S', 'Severa')], help_text='Solo aplica para A. lumbricoides', max_length=1, verbose_name='Intensidad de Infección (Kato-Katz)')),
+                ('trichuris_trichiura', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('L', 'Larva'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Trichuris trichiura')),
+                ('necator_americanus', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('L', 'Larva'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Necator americanus')),
+                ('strongyloides_stercoralis', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('L', 'Larva'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Strongyloides stercoralis')),
+                ('enterobius_vermicularis', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('L', 'Larva'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Enterobius vermicularis')),
+                ('taenia_spp', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('P', 'Proglótidos'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Taenia spp')),
+                ('hymenolepis_diminuta', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('L', 'Larva'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Hymenolepis diminuta')),
+                ('rodentolepis_nana', models.CharField(blank=True, choices=[('', 'No se observa'), ('H', 'Huevos'), ('L', 'Larva'), ('G', 'Gusano Adulto')], max_length=1, verbose_name='Rodentolepis nana')),
+                ('observaciones', models.TextField(blank=True, verbose_name='Observaciones')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Última Modificación')),
+                ('activo', models.BooleanField(default=True, verbose_name='¿Activo?')),
+                ('centro_atencion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='muestras', to='examen.centroatencion', verbose_name='Establecimiento de Salud')),
+                ('expediente', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='muestras', to='examen.expediente', verbose_name='Expediente del Paciente')),
+                ('usuario_creacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='muestras_creadas', to=settings.AUTH_USER_MODEL, verbose_name='Usuario que Creó la Muestra')),
+            ],
+            options={
+                'verbose_name': 'Muestra',
+                'verbose_name_plural': 'Muestras',
+                'ordering': ['-fecha_examen'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Municipio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Nombre del Municipio')),
+                ('codigo', models.CharField(help_text='Código de 4 dígitos (XXYY)', max_length=4, unique=True, verbose_name='Código Administrativo')),
+                ('es_cabecera', models.BooleanField(default=False, help_text='Marca si este municipio es la cabecera del departamento', verbose_name='¿Es Cabecera Departamental?')),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('departamento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='municipios', to='examen.departamento', verbose_name='Departamento')),
+            ],
+            options={
+                'verbose_name': 'Municipio',
+                'verbose_name_plural': 'Municipios',
+                'ordering': ['departamento', 'codigo'],
+                'unique_together': {('departamento', 'nombre')},
+            },
+        ),
+        migrations.AddField(
+            model_name='expediente',
+            name='municipio',
+            field=smart_selects.db_fields.ChainedForeignKey(auto_choose=True, blank=True, chained_field='departamento', chained_model_field='departamento', db_column='municipio_id', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='expedientes', to='examen.municipio', verbose_name='Municipio'),
+        ),
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre de la Región')),
+                ('numero_region', models.IntegerField(unique=True, verbose_name='Número de Región')),
+                ('es_metropolitana', models.BooleanField(default=False, help_text='Regiones 19 y 20 son metropolitanas (Tegucigalpa y San Pedro Sula)', verbose_name='¿Es Región Metropolitana?')),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('departamento', models.ForeignKey(blank=True, help_text='Solo para regiones departamentales (1-18). Regiones metropolitanas no tienen.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='regiones', to='examen.departamento', verbose_name='Departamento')),
+            ],
+            options={
+                'verbose_name': 'Región Sanitaria',
+                'verbose_name_plural': 'Regiones Sanitarias',
+                'ordering': ['numero_region'],
+            },
+        ),
+        migrations.AddField(
+            model_name='centroatencion',
+            name='region',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='centros_atencion', to='examen.region', verbose_name='Región Sanitaria'),
+        ),
+        migrations.CreateModel(
+            name='Alerta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nivel', models.CharField(choices=[('VERDE', '🟢 Normal'), ('AMARILLO', '🟡 Precaución'), ('NARANJA', '🟠 Alerta'), ('ROJO', '🔴 Emergencia')], max_length=10, verbose_name='Nivel de Alerta')),
+                ('estado', models.CharField(choices=[('ACTIVA', 'Activa'), ('EN_PROCESO', 'En Proceso'), ('RESUELTA', 'Resuelta'), ('FALSA_ALARMA', 'Falsa Alarma')], default='ACTIVA', max_length=15, verbose_name='Estado de la Alerta')),
+                ('numero_casos', models.IntegerField(default=1, help_text='Casos en la ventana de tiempo configurada', verbose_name='Número de Casos Detectados')),
+                ('numero_casos_dia', models.IntegerField(default=1, help_text='Casos detectados en las últimas 24 horas', verbose_name='Casos en el Día')),
+                ('fecha_generacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Generación')),
+                ('fecha_ultima_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Última Actualización')),
+                ('fecha_resolucion', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Resolución')),
+                ('observaciones', models.TextField(blank=True, help_text='Notas sobre el manejo de la alerta', verbose_name='Observaciones')),
+                ('resuelto_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='alertas_resueltas', to=settings.AUTH_USER_MODEL, verbose_name='Resuelto por')),
+                ('usuarios_notificados', models.ManyToManyField(blank=True, help_text='Usuarios que han sido notificados de esta alerta', related_name='alertas_recibidas', to=settings.AUTH_USER_MODEL, verbose_name='Usuarios Notificados')),
+                ('centro_atencion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='alertas', to='examen.centroatencion', verbose_name='Centro de Atención')),
+                ('configuracion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='alertas_generadas', to='examen.configuracionalerta', verbose_name='Configuración de Alerta')),
+                ('muestra_origen', models.ForeignKey(help_text='Primera muestra que generó esta alerta', on_delete=django.db.models.deletion.PROTECT, related_name='alertas', to='examen.muestra', verbose_name='Muestra que Disparó la Alerta')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='alertas', to='examen.region', verbose_name='Región Sanitaria')),
+            ],
+            options={
+                'verbose_name': 'Alerta Epidemiológica',
+                'verbose_name_plural': 'Alertas Epidemiológicas',
+                'ordering': ['-fecha_generacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenDiarioParasito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_examen', models.DateField(verbose_name='Fecha del Examen')),
+                ('parasito_campo', models.CharField(choices=[('entamoeba_histolytica', 'Entamoeba histolytica'), ('entamoeba_coli', 'Entamoeba coli'), ('entamoeba_hartmanni', 'Entamoeba hartmanni'), ('endolimax_nana', 'Endolimax nana'), ('iodamoeba_butschlii', 'Iodamoeba bütschlii'), ('giardia_intestinalis', 'Giardia intestinalis'), ('pentatrichomonas_hominis', 'Pentatrichomonas hominis'), ('chilomastix_mesnili', 'Chilomastix mesnili'), ('balantidium_coli', 'Balantidium coli'), ('blastocystis_sp', 'Blastocystis sp'), ('cystoisospora_belli', 'Cystoisospora belli'), ('cyclospora_cayetanensis', 'Cyclospora cayetanensis'), ('cryptosporidium_spp', 'Cryptosporidium spp'), ('ascaris_lumbricoides', 'Ascaris lumbricoides'), ('trichuris_trichiura', 'Trichuris trichiura'), ('necator_americanus', 'Necator americanus'), ('strongyloides_stercoralis', 'Strongyloides stercoralis'), ('enterobius_vermicularis', 'Enterobius vermicularis'), ('taenia_spp', 'Taenia spp'), ('hymenolepis_diminuta', 'Hymenolepis diminuta'), ('rodentolepis_nana', 'Rodentolepis nana')], max_length=100, verbose_name='Parásito')),
+                ('estadio', models.CharField(max_length=2, verbose_name='Estadio')),
+                ('total_muestras', models.IntegerField(default=0, verbose_name='Total de Muestras')),
+                ('centro_atencion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='examen.centroatencion', verbose_name='Establecimiento de Salud')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario por Parásito',
+                'verbose_name_plural': 'Resúmenes Diarios por Parásito',
+                'ordering': ['-fecha_examen'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telefono', models.CharField(blank=True, max_length=15, verbose_name='Teléfono')),
+                ('cargo', models.CharField(blank=True, max_length=100, verbose_name='Cargo')),
+                ('activo', models.BooleanField(default=True, verbose_name='¿Activo?')),
+                ('ultimo_acceso', models.DateTimeField(blank=True, null=True, verbose_name='Último Acceso')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True, verbose_name='Última Modificación')),
+                ('centro_atencion', smart_selects.db_fields.ChainedForeignKey(auto_choose=True, blank=True, chained_field='region', chained_model_field='region', help_text='Solo para usuarios CAT (Centro de Atención)', null=True, on_delete=django.db.models.deletion.CASCADE, to='examen.centroatencion', verbose_name='Centro de Atención Asignado')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+                ('region', models.ForeignKey(blank=True, help_text='Solo para usuarios REG (Regional)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='usuarios', to='examen.region', verbose_name='Región Asignada')),
+                ('rol', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='usuarios', to='examen.rol', verbose_name='Rol')),
+            ],
+            options={
+                'verbose_name': 'Perfil de Usuario',
+                'verbose_name_plural': 'Perfiles de Usuario',
+                'ordering': ['user__username'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SemanaEpidemiologica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('año', models.IntegerField(verbose_name='Año')),
+                ('semana', models.IntegerField(help_text='Semana según ISO 8601', verbose_name='Número de Semana (1-53)')),
+                ('fecha_inicio', models.DateField(verbose_name='Fecha de Inicio (Lunes)')),
+                ('fecha_fin', models.DateField(verbose_name='Fecha de Fin (Domingo)')),
+                ('total_muestras', models.IntegerField(default=0, verbose_name='Total de Muestras')),
+                ('total_positivas', models.IntegerField(default=0, verbose_name='Total Positivas')),
+                ('total_negativas', models.IntegerField(default=0, verbose_name='Total Negativas')),
+                ('alerta_activa', models.BooleanField(default=False, verbose_name='¿Alerta Epidemiológica Activa?')),
+                ('notas', models.TextField(blank=True, verbose_name='Notas o Observaciones')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Semana Epidemiológica',
+                'verbose_name_plural': 'Semanas Epidemiológicas',
+                'ordering': ['-año', '-semana'],
+                'indexes': [models.Index(fields=['año', 'semana'], name='examen_sema_año_2a17d9_idx'), models.Index(fields=['-año', '-semana'], name='examen_sema_año_97bd7e_idx')],
+                'unique_together': {('año', 'semana')},
+            },
+        ),
+        migrations.AddField(
+            model_name='muestra',
+            name='semana_epidemiologica',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='muestras', to='examen.semanaepidemiologica', verbose_name='Semana Epidemiológica'),
+        ),
+        migrations.CreateModel(
+            name='EstadisticaSemanalCentro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_muestras', models.IntegerField(default=0, verbose_name='Total de Muestras')),
+                ('total_positivas', models.IntegerField(default=0, verbose_name='Total Positivas')),
+                ('total_negativas', models.IntegerField(default=0, verbose_name='Total Negativas')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('centro_atencion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_semanales', to='examen.centroatencion', verbose_name='Establecimiento de Salud')),
+                ('semana', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_centros', to='examen.semanaepidemiologica', verbose_name='Semana Epidemiológica')),
+            ],
+            options={
+                'verbose_name': 'Estadística Semanal por Centro',
+                'verbose_name_plural': 'Estadísticas Semanales por Centro',
+                'ordering': ['-semana__año', '-semana__semana'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TareaDiferida',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50, verbose_name='Tipo de Tarea')),
+                ('clave', models.CharField(help_text='Identifica el trabajo para agrupar tareas repetidas', max_length=200, verbose_name='Clave')),
+                ('parametros', models.JSONField(default=dict, verbose_name='Parámetros')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En Proceso'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=15, verbose_name='Estado')),
+                ('intentos', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último Error')),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, help_text='No se procesa antes de esta fecha (reintentos con espera)', verbose_name='Disponible Desde')),
+                ('fecha_inicio_proceso', models.DateTimeField(blank=True, null=True, verbose_name='Inicio del Proceso')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+            ],
+            options={
+                'verbose_name': 'Tarea Diferida',
+                'verbose_name_plural': 'Tareas Diferidas',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'disponible_desde'], name='examen_tare_estado_623033_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'PENDIENTE')), fields=('clave',), name='tarea_pendiente_clave_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EntradaBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('E', 'Expediente'), ('M', 'Muestra')], max_length=1, verbose_name='Tipo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='ID del Objeto')),
+                ('clave', models.CharField(help_text='DNI (solo dígitos) o número de examen normalizado, para búsquedas por prefijo', max_length=30, verbose_name='Clave')),
+                ('texto', models.TextField(verbose_name='Texto Normalizado')),
+                ('etiqueta', models.CharField(max_length=255, verbose_name='Etiqueta')),
+                ('fecha', models.DateField(help_text='Fecha de examen o de creación del expediente (desempata por recientes)', verbose_name='Fecha')),
+                ('centro_atencion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='examen.centroatencion', verbose_name='Establecimiento de Salud')),
+            ],
+            options={
+                'verbose_name': 'Entrada de Búsqueda',
+                'verbose_name_plural': 'Entradas de Búsqueda',
+                'indexes': [models.Index(fields=['tipo', 'clave'], name='examen_entr_tipo_fd6c3f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='entrada_busqueda_objeto_unica')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expediente',
+            index=models.Index(fields=['dni'], name='examen_expe_dni_a9983b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expediente',
+            index=models.Index(fields=['centro_atencion', '-fecha_creacion'], name='examen_expe_centro__0b77f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expediente',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='examen_expe_fecha_c_63028d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(fields=['estado', '-fecha_generacion'], name='examen_aler_estado_88b16f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(fields=['nivel', 'estado'], name='examen_aler_nivel_5774eb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(fields=['centro_atencion', '-fecha_generacion'], name='examen_aler_centro__aa5098_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(fields=['region', '-fecha_generacion'], name='examen_aler_region__5f9875_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(condition=models.Q(('estado__in', ['ACTIVA', 'EN_PROCESO'])), fields=['configuracion', 'centro_atencion'], name='alerta_abierta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumendiarioparasito',
+            index=models.Index(fields=['parasito_campo', 'fecha_examen'], name='examen_resu_parasit_1443c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumendiarioparasito',
+            index=models.Index(fields=['centro_atencion', 'parasito_campo', 'fecha_examen'], name='examen_resu_centro__7a74ce_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumendiarioparasito',
+            unique_together={('fecha_examen', 'centro_atencion', 'parasito_campo', 'estadio')},
+        ),
+        migrations.AddIndex(
+            model_name='muestra',
+            index=models.Index(fields=['numero_examen'], name='examen_mues_numero__d3feb6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='muestra',
+            index=models.Index(fields=['expediente', '-fecha_examen'], name='examen_mues_expedie_5e5cbc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='muestra',
+            index=models.Index(fields=['centro_atencion', '-fecha_examen'], name='examen_mues_centro__59275e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='muestra',
+            index=models.Index(fields=['resultado', '-fecha_examen'], name='examen_mues_resulta_233d35_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='muestra',
+            index=models.Index(fields=['fecha_modificacion'], name='examen_mues_fecha_m_82d11f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='muestra',
+            index=models.Index(fields=['-fecha_examen', '-id'], name='examen_mues_fecha_e_c3990b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estadisticasemanalcentro',
+            index=models.Index(fields=['centro_atencion', 'semana'], name='examen_esta_centro__aaa81c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='estadisticasemanalcentro',
+            unique_together={('semana', 'centro_atencion')},
+        ),
+    ]
@@ -1,8 +1,23 @@
 # examen/models.py
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.lookups import Exact, GreaterThan
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 from smart_selects.db_fields import ChainedForeignKey  # <-- IMPORTAR
+from .parasitos import (
+    ESTADIOS_PROTOZOO,
+    ESTADIOS_COCCIDIO,
+    ESTADIOS_HELMINTO,
+    ESTADIOS_CESTODO,
+    CAMPOS as CAMPOS_PARASITOS,
+    CHOICES as CHOICES_PARASITOS,
+    mascara_de_campos,
+    mascara_de_valores,
+    obtener_valores,
+    presentes,
+)
 
 # NECESITAS AGREGAR ESTOS DOS MODELOS:
 
@@ -470,6 +485,8 @@ class Expediente(models.Model):
         indexes = [
             models.Index(fields=['dni']),
             models.Index(fields=['centro_atencion', '-fecha_creacion']),
+            # Paginación por cursor del admin (ADMIN_TABLAS_GRANDES)
+            models.Index(fields=['-fecha_creacion', '-id']),
         ]
     
     def __str__(self):
@@ -535,35 +552,8 @@ MOCO_CHOICES = [
     ('A', 'Abundante'),
 ]
 
-# Estadios de PROTOZOOS (Amebas y Flagelados)
-ESTADIOS_PROTOZOO = [
-    ('', 'No se observa'),
-    ('T', 'Trofozoíto'),
-    ('Q', 'Quiste'),
-    ('TQ', 'Trofozoíto y Quiste'),
-]
-
-# Estadios de COCCIDIOS
-ESTADIOS_COCCIDIO = [
-    ('', 'No se observa'),
-    ('O', 'Ooquiste'),
-]
-
-# Estadios de HELMINTOS - Nematodos
-ESTADIOS_HELMINTO = [
-    ('', 'No se observa'),
-    ('H', 'Huevos'),
-    ('L', 'Larva'),
-    ('G', 'Gusano Adulto'),
-]
-
-# Estadios de CESTODOS (incluye proglótidos)
-ESTADIOS_CESTODO = [
-    ('', 'No se observa'),
-    ('H', 'Huevos'),
-    ('P', 'Proglótidos'),
-    ('G', 'Gusano Adulto'),
-]
+# Estadios de cada grupo de parásitos (definidos en el registro de parásitos)
+# ESTADIOS_PROTOZOO, ESTADIOS_COCCIDIO, ESTADIOS_HELMINTO, ESTADIOS_CESTODO
 
 # Intensidad de infección (método Kato-Katz)
 INTENSIDAD_CHOICES = [
@@ -652,28 +642,102 @@ class SemanaEpidemiologica(models.Model):
     def obtener_o_crear_desde_fecha(cls, fecha):
         """
         Obtiene o crea una SemanaEpidemiologica a partir de una fecha.
-        Calcula automáticamente inicio y fin de semana.
+        La semana se calcula con el calendario ISO y el id sale de la cache
+        de semanas (examen.services.semanas); solo consulta la BD si falta.
         """
-        from datetime import timedelta
+        from examen.services.semanas import semana_iso, asegurar_año
         
-        # Calcular semana según ISO 8601
-        año, semana, dia_semana = fecha.isocalendar()
-        
-        # Calcular inicio (lunes) y fin (domingo)
-        inicio_semana = fecha - timedelta(days=dia_semana - 1)
-        fin_semana = inicio_semana + timedelta(days=6)
-        
-        # Obtener o crear
-        semana_obj, created = cls.objects.get_or_create(
-            año=año,
-            semana=semana,
-            defaults={
-                'fecha_inicio': inicio_semana,
-                'fecha_fin': fin_semana
-            }
-        )
-        
-        return semana_obj, created
+        año, semana, _, _ = semana_iso(fecha)
+        ids, creadas = asegurar_año(año)
+        return cls.objects.get(pk=ids[(año, semana)]), (año, semana) in creadas
+
+
+class EstadisticaSemanalCentro(models.Model):
+    """
+    Estadísticas cacheadas por (semana epidemiológica, centro de atención).
+    Los totales regionales se obtienen sumando los centros de la región.
+    Se actualizan con los mismos signals que SemanaEpidemiologica.
+    """
+    semana = models.ForeignKey(
+        SemanaEpidemiologica,
+        on_delete=models.CASCADE,
+        related_name='estadisticas_centros',
+        verbose_name="Semana Epidemiológica"
+    )
+    centro_atencion = models.ForeignKey(
+        CentroAtencion,
+        on_delete=models.CASCADE,
+        related_name='estadisticas_semanales',
+        verbose_name="Establecimiento de Salud"
+    )
+
+    # === ESTADÍSTICAS CACHEADAS ===
+    total_muestras = models.IntegerField(
+        default=0,
+        verbose_name="Total de Muestras"
+    )
+    total_positivas = models.IntegerField(
+        default=0,
+        verbose_name="Total Positivas"
+    )
+    total_negativas = models.IntegerField(
+        default=0,
+        verbose_name="Total Negativas"
+    )
+
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Estadística Semanal por Centro'
+        verbose_name_plural = 'Estadísticas Semanales por Centro'
+        ordering = ['-semana__año', '-semana__semana']
+        unique_together = ('semana', 'centro_atencion')
+        indexes = [
+            models.Index(fields=['centro_atencion', 'semana']),
+        ]
+
+    def __str__(self):
+        return f"{self.semana} - {self.centro_atencion_id}: {self.total_muestras}"
+
+    @property
+    def tasa_positividad(self):
+        """Calcula el porcentaje de positividad"""
+        if self.total_muestras > 0:
+            return round((self.total_positivas / self.total_muestras) * 100, 2)
+        return 0.0
+
+# ==================== MÁSCARA DE PARÁSITOS ====================
+
+class MuestraQuerySet(models.QuerySet):
+    """Consultas sobre la máscara de parásitos (un entero en lugar de 21 columnas)"""
+
+    def con_parasitos(self, alguno=None, todos=None):
+        """
+        Muestras con al menos uno de los parásitos de `alguno` y con
+        todos los parásitos de `todos`. Ambos son listas de campos.
+        Ejemplo: Muestra.objects.con_parasitos(todos=['ascaris_lumbricoides', 'trichuris_trichiura'])
+        """
+        queryset = self
+        if alguno:
+            mascara = mascara_de_campos(alguno)
+            queryset = queryset.filter(
+                GreaterThan(F('mascara_parasitos').bitand(mascara), 0)
+            )
+        if todos:
+            mascara = mascara_de_campos(todos)
+            queryset = queryset.filter(
+                Exact(F('mascara_parasitos').bitand(mascara), mascara)
+            )
+        return queryset
+
+    def with_parasites(self, any=None, all=None):
+        """Alias de con_parasitos(alguno=any, todos=all)"""
+        return self.con_parasitos(alguno=any, todos=all)
+
+    def sin_parasitos(self):
+        """Muestras sin ningún parásito"""
+        return self.filter(mascara_parasitos=0)
+
 
 # ==================== MODELO MUESTRA ====================
 
@@ -774,6 +838,14 @@ class Muestra(models.Model):
         editable=False  # No se puede editar manualmente
     )
     
+    # Un bit por parásito presente (ver examen.parasitos), calculado al guardar
+    mascara_parasitos = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name="Máscara de Parásitos",
+        editable=False
+    )
+    
     # ========== PROTOZOOS - AMEBAS ==========
     entamoeba_histolytica = models.CharField(
         max_length=2,
@@ -947,6 +1019,8 @@ class Muestra(models.Model):
         verbose_name="¿Activo?"
     )
     
+    objects = MuestraQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Muestra'
         verbose_name_plural = 'Muestras'
@@ -956,36 +1030,47 @@ class Muestra(models.Model):
             models.Index(fields=['expediente', '-fecha_examen']),
             models.Index(fields=['centro_atencion', '-fecha_examen']),
             models.Index(fields=['resultado', '-fecha_examen']),
+            # Exportación analítica incremental
+            models.Index(fields=['fecha_modificacion']),
+            # Paginación por cursor del admin (ADMIN_TABLAS_GRANDES)
+            models.Index(fields=['-fecha_examen', '-id']),
         ]
     
     def __str__(self):
         return f"{self.numero_examen} - {self.expediente.dni} - {self.get_resultado_display()}"
-    
+
+    # Campos que determinan a qué contadores/resúmenes aporta la muestra
+    CAMPOS_RASTREADOS = (
+        'fecha_examen',
+        'centro_atencion_id',
+        'semana_epidemiologica_id',
+        'resultado',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda el estado leído de la BD para calcular deltas al guardar/eliminar"""
+        instance = super().from_db(db, field_names, values)
+        instance._estado_anterior = instance.capturar_estado()
+        return instance
+
+    def capturar_estado(self):
+        """
+        Foto de los campos rastreados y de los parásitos presentes.
+        Devuelve None si algún campo está diferido (no se cargó de la BD).
+        """
+        campos = self.CAMPOS_RASTREADOS + CAMPOS_PARASITOS
+        if any(campo not in self.__dict__ for campo in campos):
+            return None
+        return {campo: self.__dict__[campo] for campo in campos}
+
     def _get_lista_parasitos(self):
         """Devuelve lista de todos los campos de parásitos con sus valores"""
-        return [
-            self.entamoeba_histolytica,
-            self.entamoeba_coli,
-            self.entamoeba_hartmanni,
-            self.endolimax_nana,
-            self.iodamoeba_butschlii,
-            self.giardia_intestinalis,
-            self.pentatrichomonas_hominis,
-            self.chilomastix_mesnili,
-            self.balantidium_coli,
-            self.blastocystis_sp,
-            self.cystoisospora_belli,
-            self.cyclospora_cayetanensis,
-            self.cryptosporidium_spp,
-            self.ascaris_lumbricoides,
-            self.trichuris_trichiura,
-            self.necator_americanus,
-            self.strongyloides_stercoralis,
-            self.enterobius_vermicularis,
-            self.taenia_spp,
-            self.hymenolepis_diminuta,
-            self.rodentolepis_nana,
-        ]
+        return list(obtener_valores(self))
+    
+    def calcular_mascara_parasitos(self):
+        """Máscara de bits de los parásitos con valor (ver examen.parasitos)"""
+        return mascara_de_valores(obtener_valores(self))
     
     def calcular_resultado(self):
         """
@@ -993,55 +1078,19 @@ class Muestra(models.Model):
         Positivo = al menos un parásito encontrado
         Negativo = ningún parásito encontrado
         """
-        parasitos = self._get_lista_parasitos()
-        # Si al menos un parásito tiene valor (no vacío) → Positivo
-        tiene_parasitos = any(p for p in parasitos if p)
-        return 'POS' if tiene_parasitos else 'NEG'
+        return 'POS' if self.calcular_mascara_parasitos() else 'NEG'
     
     def get_parasitos_encontrados(self):
         """
         Devuelve un diccionario con los parásitos encontrados y sus estadios.
         Útil para reportes y visualización.
+        Lee los valores actuales de los campos (no la máscara guardada, que
+        solo se recalcula al guardar).
         """
-        encontrados = {}
-        
-        campos_parasitos = {
-            'entamoeba_histolytica': 'Entamoeba histolytica',
-            'entamoeba_coli': 'Entamoeba coli',
-            'entamoeba_hartmanni': 'Entamoeba hartmanni',
-            'endolimax_nana': 'Endolimax nana',
-            'iodamoeba_butschlii': 'Iodamoeba bütschlii',
-            'giardia_intestinalis': 'Giardia intestinalis',
-            'pentatrichomonas_hominis': 'Pentatrichomonas hominis',
-            'chilomastix_mesnili': 'Chilomastix mesnili',
-            'balantidium_coli': 'Balantidium coli',
-            'blastocystis_sp': 'Blastocystis sp',
-            'cystoisospora_belli': 'Cystoisospora belli',
-            'cyclospora_cayetanensis': 'Cyclospora cayetanensis',
-            'cryptosporidium_spp': 'Cryptosporidium spp',
-            'ascaris_lumbricoides': 'Ascaris lumbricoides',
-            'trichuris_trichiura': 'Trichuris trichiura',
-            'necator_americanus': 'Necator americanus',
-            'strongyloides_stercoralis': 'Strongyloides stercoralis',
-            'enterobius_vermicularis': 'Enterobius vermicularis',
-            'taenia_spp': 'Taenia spp',
-            'hymenolepis_diminuta': 'Hymenolepis diminuta',
-            'rodentolepis_nana': 'Rodentolepis nana',
+        return {
+            parasito.nombre: parasito.nombre_estadio(estadio)
+            for parasito, estadio in presentes(self)
         }
-        
-        for campo, nombre in campos_parasitos.items():
-            valor = getattr(self, campo)
-            if valor:  # Si tiene algún valor
-                # Obtener el display name del choice
-                display_method = f'get_{campo}_display'
-                if hasattr(self, display_method):
-                    estadio = getattr(self, display_method)()
-                else:
-                    estadio = valor
-                
-                encontrados[nombre] = estadio
-        
-        return encontrados
 
 #def get_semana_epidemiologica_display(self):
 #    """Formato legible de semana epidemiológica"""
@@ -1051,28 +1100,51 @@ class Muestra(models.Model):
 #        return f"Semana {self.semana_numero}/{self.año_epidemiologico}"
 #    return "Sin calcular"
 
-def save(self, *args, **kwargs):
-    """Calcular resultado y asignar semana epidemiológica antes de guardar"""
-    # Calcular resultado (POS/NEG)
-    self.resultado = self.calcular_resultado()
+    def _asignar_semana(self):
+        if self.fecha_examen:
+            from examen.services.semanas import resolver
+            
+            semana_id, año, semana = resolver(self.fecha_examen)
+            
+            # Asignar relación
+            self.semana_epidemiologica_id = semana_id
+            
+            # Campos denormalizados para queries rápidas
+            self.semana_numero = semana
+            self.año_epidemiologico = año
     
-    # Asignar semana epidemiológica
-    if self.fecha_examen:
-        # Obtener o crear SemanaEpidemiologica
-        semana_obj, created = SemanaEpidemiologica.obtener_o_crear_desde_fecha(
-            self.fecha_examen
-        )
+    def save(self, *args, **kwargs):
+        """Calcular resultado y asignar semana epidemiológica antes de guardar"""
+        # Calcular máscara de parásitos y resultado (POS/NEG)
+        self.mascara_parasitos = self.calcular_mascara_parasitos()
+        self.resultado = 'POS' if self.mascara_parasitos else 'NEG'
         
-        # Asignar relación
-        self.semana_epidemiologica = semana_obj
+        # Asignar semana epidemiológica (calculada; el id sale de la cache de semanas)
+        self._asignar_semana()
         
-        # Campos denormalizados para queries rápidas
-        self.semana_numero = semana_obj.semana
-        self.año_epidemiologico = semana_obj.año
-    
-    super().save(*args, **kwargs)
+        if transaction.get_connection(kwargs.get('using')).in_atomic_block:
+            # Dentro de una transacción la FK se verifica al confirmarla
+            super().save(*args, **kwargs)
+        else:
+            pk, nueva = self.pk, self._state.adding
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    super().save(*args, **kwargs)
+            except IntegrityError:
+                # Otro proceso pudo borrar la semana cacheada: se resuelve de nuevo
+                from examen.services.semanas import descartar
+                
+                if not descartar(self.semana_epidemiologica_id):
+                    raise
+                # El INSERT revertido ya había asignado el id
+                self.pk, self._state.adding = pk, nueva
+                self._asignar_semana()
+                super().save(*args, **kwargs)
+        
+        # Nuevo punto de partida para los deltas del próximo guardado
+        self._estado_anterior = self.capturar_estado()
     
-def to_export_json(self):
+    def to_export_json(self):
         """
         Genera un JSON completo con todos los datos de la muestra.
         Útil para exports, PowerBI, y reportes.
@@ -1151,42 +1223,7 @@ class ConfiguracionAlerta(models.Model):
     """
     
     # === CHOICES DE PARÁSITOS (21 total) ===
-    PARASITO_CHOICES = [
-        # PROTOZOOS - AMEBAS
-        ('entamoeba_histolytica', 'Entamoeba histolytica'),
-        ('entamoeba_coli', 'Entamoeba coli'),
-        ('entamoeba_hartmanni', 'Entamoeba hartmanni'),
-        ('endolimax_nana', 'Endolimax nana'),
-        ('iodamoeba_butschlii', 'Iodamoeba bütschlii'),
-        
-        # PROTOZOOS - FLAGELADOS
-        ('giardia_intestinalis', 'Giardia intestinalis'),
-        ('pentatrichomonas_hominis', 'Pentatrichomonas hominis'),
-        ('chilomastix_mesnili', 'Chilomastix mesnili'),
-        
-        # PROTOZOOS - CILIADOS
-        ('balantidium_coli', 'Balantidium coli'),
-        
-        # BLASTOCYSTIS
-        ('blastocystis_sp', 'Blastocystis sp'),
-        
-        # COCCIDIOS
-        ('cystoisospora_belli', 'Cystoisospora belli'),
-        ('cyclospora_cayetanensis', 'Cyclospora cayetanensis'),
-        ('cryptosporidium_spp', 'Cryptosporidium spp'),
-        
-        # HELMINTOS - NEMATODOS
-        ('ascaris_lumbricoides', 'Ascaris lumbricoides'),
-        ('trichuris_trichiura', 'Trichuris trichiura'),
-        ('necator_americanus', 'Necator americanus'),
-        ('strongyloides_stercoralis', 'Strongyloides stercoralis'),
-        ('enterobius_vermicularis', 'Enterobius vermicularis'),
-        
-        # HELMINTOS - CESTODOS
-        ('taenia_spp', 'Taenia spp'),
-        ('hymenolepis_diminuta', 'Hymenolepis diminuta'),
-        ('rodentolepis_nana', 'Rodentolepis nana'),
-    ]
+    PARASITO_CHOICES = list(CHOICES_PARASITOS)
     
     # === IDENTIFICACIÓN DEL PARÁSITO ===
     parasito_campo = models.CharField(
@@ -1433,6 +1470,13 @@ class Alerta(models.Model):
             models.Index(fields=['nivel', 'estado']),
             models.Index(fields=['centro_atencion', '-fecha_generacion']),
             models.Index(fields=['region', '-fecha_generacion']),
+            # Índice parcial: solo las alertas abiertas, que son las que busca
+            # el motor de alertas por cada (configuración, centro) evaluado
+            models.Index(
+                fields=['configuracion', 'centro_atencion'],
+                condition=models.Q(estado__in=['ACTIVA', 'EN_PROCESO']),
+                name='alerta_abierta_idx',
+            ),
         ]
     
     def __str__(self):
@@ -1476,37 +1520,243 @@ class Alerta(models.Model):
         Actualiza el número de casos en la ventana de tiempo.
         Se llama cuando se registra una nueva muestra del mismo parásito.
         """
-        from datetime import timedelta
+        from .services.alertas import casos_en_ventana, calcular_nivel
         
         config = self.configuracion
-        fecha_inicio = self.muestra_origen.fecha_examen - timedelta(days=config.ventana_tiempo_dias)
-        
-        # Contar casos en ventana de tiempo
-        casos_ventana = Muestra.objects.filter(
-            centro_atencion=self.centro_atencion,
-            fecha_examen__gte=fecha_inicio,
-            fecha_examen__lte=self.muestra_origen.fecha_examen,
-            resultado='POS',
-            **{f'{config.parasito_campo}__isnull': False}
-        ).exclude(**{config.parasito_campo: ''}).count()
         
-        # Contar casos en el día
-        casos_dia = Muestra.objects.filter(
-            centro_atencion=self.centro_atencion,
-            fecha_examen=self.muestra_origen.fecha_examen,
-            resultado='POS',
-            **{f'{config.parasito_campo}__isnull': False}
-        ).exclude(**{config.parasito_campo: ''}).count()
+        # Contar casos en ventana de tiempo y en el día (desde el resumen diario)
+        casos_ventana, casos_dia = casos_en_ventana(
+            config,
+            self.centro_atencion_id,
+            self.muestra_origen.fecha_examen
+        )
         
         self.numero_casos = casos_ventana
         self.numero_casos_dia = casos_dia
         
         # Recalcular nivel si es necesario
-        if casos_ventana >= config.umbral_emergencia:
-            self.nivel = 'ROJO'
-        elif casos_ventana >= config.umbral_alerta:
-            self.nivel = 'NARANJA'
-        elif casos_ventana >= config.umbral_precaucion:
-            self.nivel = 'AMARILLO'
+        nivel = calcular_nivel(config, casos_ventana)
+        if nivel:
+            self.nivel = nivel
         
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+# ==================== RESÚMENES PRE-AGREGADOS ====================
+
+class ResumenDiarioParasito(models.Model):
+    """
+    Tabla de hechos diaria: número de muestras por
+    (fecha de examen, centro de atención, parásito, estadio).
+    Se actualiza por deltas con signals al crear, modificar o eliminar una
+    Muestra y puede reconstruirse con `manage.py reconstruir_resumen_diario`.
+    """
+    fecha_examen = models.DateField(
+        verbose_name="Fecha del Examen"
+    )
+    centro_atencion = models.ForeignKey(
+        CentroAtencion,
+        on_delete=models.CASCADE,
+        related_name='resumenes_diarios',
+        verbose_name="Establecimiento de Salud"
+    )
+    parasito_campo = models.CharField(
+        max_length=100,
+        choices=ConfiguracionAlerta.PARASITO_CHOICES,
+        verbose_name="Parásito"
+    )
+    estadio = models.CharField(
+        max_length=2,
+        verbose_name="Estadio"
+    )
+    total_muestras = models.IntegerField(
+        default=0,
+        verbose_name="Total de Muestras"
+    )
+    
+    class Meta:
+        verbose_name = 'Resumen Diario por Parásito'
+        verbose_name_plural = 'Resúmenes Diarios por Parásito'
+        ordering = ['-fecha_examen']
+        unique_together = ('fecha_examen', 'centro_atencion', 'parasito_campo', 'estadio')
+        indexes = [
+            models.Index(fields=['parasito_campo', 'fecha_examen']),
+            models.Index(fields=['centro_atencion', 'parasito_campo', 'fecha_examen']),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha_examen} - {self.centro_atencion_id} - {self.parasito_campo} ({self.estadio}): {self.total_muestras}"
+
+
+# ==================== COLA DE TAREAS DIFERIDAS ====================
+
+class TareaDiferida(models.Model):
+    """
+    Trabajo pendiente que se ejecuta fuera de la petición que lo generó
+    (recalcular estadísticas, evaluar alertas). Lo procesa el comando
+    `manage.py procesar_tareas`; ver examen.services.tareas.
+    
+    La `clave` identifica el trabajo: solo puede haber una tarea PENDIENTE
+    por clave, así varios guardados sobre la misma semana y centro se
+    convierten en un solo recálculo.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En Proceso'),
+        ('FALLIDA', 'Fallida'),
+    ]
+    
+    tipo = models.CharField(
+        max_length=50,
+        verbose_name="Tipo de Tarea"
+    )
+    clave = models.CharField(
+        max_length=200,
+        verbose_name="Clave",
+        help_text="Identifica el trabajo para agrupar tareas repetidas"
+    )
+    parametros = models.JSONField(
+        default=dict,
+        verbose_name="Parámetros"
+    )
+    estado = models.CharField(
+        max_length=15,
+        choices=ESTADO_CHOICES,
+        default='PENDIENTE',
+        verbose_name="Estado"
+    )
+    intentos = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Intentos"
+    )
+    ultimo_error = models.TextField(
+        blank=True,
+        verbose_name="Último Error"
+    )
+    disponible_desde = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Disponible Desde",
+        help_text="No se procesa antes de esta fecha (reintentos con espera)"
+    )
+    fecha_inicio_proceso = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Inicio del Proceso"
+    )
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Fecha de Creación"
+    )
+    
+    class Meta:
+        verbose_name = 'Tarea Diferida'
+        verbose_name_plural = 'Tareas Diferidas'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['clave'],
+                condition=models.Q(estado='PENDIENTE'),
+                name='tarea_pendiente_clave_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),
+        ]
+    
+    def __str__(self):
+        return f"{self.clave} ({self.get_estado_display()})"
+
+
+# ==================== ÍNDICE DE BÚSQUEDA ====================
+
+class EntradaBusqueda(models.Model):
+    """
+    Texto de búsqueda normalizado (sin tildes, en minúsculas) de un
+    expediente o de una muestra. Se mantiene al guardar y eliminar (ver
+    signals.py y examen.services.busqueda) y lo usan la búsqueda del admin
+    y el autocompletar de la API.
+    
+    Sobre `texto` se crea el índice de texto completo del motor: una tabla
+    FTS5 en SQLite o una columna tsvector generada con índice GIN en
+    PostgreSQL (ver examen.services.busqueda).
+    """
+    TIPO_CHOICES = [
+        ('E', 'Expediente'),
+        ('M', 'Muestra'),
+    ]
+    
+    tipo = models.CharField(
+        max_length=1,
+        choices=TIPO_CHOICES,
+        verbose_name="Tipo"
+    )
+    objeto_id = models.BigIntegerField(
+        verbose_name="ID del Objeto"
+    )
+    centro_atencion = models.ForeignKey(
+        CentroAtencion,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Establecimiento de Salud"
+    )
+    clave = models.CharField(
+        max_length=30,
+        verbose_name="Clave",
+        help_text="DNI (solo dígitos) o número de examen normalizado, para búsquedas por prefijo"
+    )
+    texto = models.TextField(
+        verbose_name="Texto Normalizado"
+    )
+    etiqueta = models.CharField(
+        max_length=255,
+        verbose_name="Etiqueta"
+    )
+    fecha = models.DateField(
+        verbose_name="Fecha",
+        help_text="Fecha de examen o de creación del expediente (desempata por recientes)"
+    )
+    
+    class Meta:
+        verbose_name = 'Entrada de Búsqueda'
+        verbose_name_plural = 'Entradas de Búsqueda'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo', 'objeto_id'],
+                name='entrada_busqueda_objeto_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'clave']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.etiqueta}"
+
+
+# ==================== VERSIONES DE LA CACHE DE DASHBOARDS ====================
+
+class VersionDashboard(models.Model):
+    """
+    Versión de los snapshots de dashboard de un alcance ('nacional',
+    'region:5', 'centro:12'); ver examen.services.cache_dashboard.
+    
+    Vive en la BD y no en la cache: una cache con límite de entradas puede
+    descartar la clave de versión, y un snapshot viejo volvería a parecer
+    vigente.
+    """
+    clave = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name="Alcance"
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Versión"
+    )
+    
+    class Meta:
+        verbose_name = 'Versión de Dashboard'
+        verbose_name_plural = 'Versiones de Dashboard'
+    
+    def __str__(self):
+        return f"{self.clave} v{self.version}"
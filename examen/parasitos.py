@@ -0,0 +1,182 @@
+# examen/parasitos.py
+"""
+Registro central de los 21 parásitos del examen coproparasitológico.
+
+Se construye una sola vez al importar el módulo y es inmutable. Cada
+parásito guarda:
+- campo: nombre del campo en Muestra
+- nombre: nombre legible
+- grupo: grupo taxonómico
+- estadios: choices de estadio del campo
+- bit / mascara: posición y valor en Muestra.mascara_parasitos
+- nombres_estadio: {código: nombre legible} del estadio
+
+No importa modelos: models.py toma de aquí los choices de estadios y la
+lista de parásitos.
+"""
+from functools import lru_cache
+from operator import attrgetter
+from types import MappingProxyType
+from typing import NamedTuple
+
+
+# ==================== ESTADIOS ====================
+
+# Estadios de PROTOZOOS (Amebas y Flagelados)
+ESTADIOS_PROTOZOO = [
+    ('', 'No se observa'),
+    ('T', 'Trofozoíto'),
+    ('Q', 'Quiste'),
+    ('TQ', 'Trofozoíto y Quiste'),
+]
+
+# Estadios de COCCIDIOS
+ESTADIOS_COCCIDIO = [
+    ('', 'No se observa'),
+    ('O', 'Ooquiste'),
+]
+
+# Estadios de HELMINTOS - Nematodos
+ESTADIOS_HELMINTO = [
+    ('', 'No se observa'),
+    ('H', 'Huevos'),
+    ('L', 'Larva'),
+    ('G', 'Gusano Adulto'),
+]
+
+# Estadios de CESTODOS (incluye proglótidos)
+ESTADIOS_CESTODO = [
+    ('', 'No se observa'),
+    ('H', 'Huevos'),
+    ('P', 'Proglótidos'),
+    ('G', 'Gusano Adulto'),
+]
+
+
+# ==================== GRUPOS TAXONÓMICOS ====================
+
+GRUPO_AMEBAS = 'Protozoos - Amebas'
+GRUPO_FLAGELADOS = 'Protozoos - Flagelados'
+GRUPO_CILIADOS = 'Protozoos - Ciliados'
+GRUPO_BLASTOCYSTIS = 'Blastocystis'
+GRUPO_COCCIDIOS = 'Coccidios'
+GRUPO_NEMATODOS = 'Helmintos - Nematodos'
+GRUPO_CESTODOS = 'Helmintos - Cestodos'
+
+
+# ==================== REGISTRO ====================
+
+class Parasito(NamedTuple):
+    campo: str
+    nombre: str
+    grupo: str
+    estadios: tuple
+    bit: int
+    mascara: int
+    nombres_estadio: MappingProxyType
+
+    def nombre_estadio(self, codigo):
+        """Nombre legible de un código de estadio"""
+        return self.nombres_estadio.get(codigo, codigo)
+
+
+# (campo, nombre, grupo, estadios) en el orden de los bits de la máscara.
+# No reordenar: la posición es el bit guardado en Muestra.mascara_parasitos.
+_DEFINICION = (
+    # PROTOZOOS - AMEBAS
+    ('entamoeba_histolytica', 'Entamoeba histolytica', GRUPO_AMEBAS, ESTADIOS_PROTOZOO),
+    ('entamoeba_coli', 'Entamoeba coli', GRUPO_AMEBAS, ESTADIOS_PROTOZOO),
+    ('entamoeba_hartmanni', 'Entamoeba hartmanni', GRUPO_AMEBAS, ESTADIOS_PROTOZOO),
+    ('endolimax_nana', 'Endolimax nana', GRUPO_AMEBAS, ESTADIOS_PROTOZOO),
+    ('iodamoeba_butschlii', 'Iodamoeba bütschlii', GRUPO_AMEBAS, ESTADIOS_PROTOZOO),
+
+    # PROTOZOOS - FLAGELADOS
+    ('giardia_intestinalis', 'Giardia intestinalis', GRUPO_FLAGELADOS, ESTADIOS_PROTOZOO),
+    ('pentatrichomonas_hominis', 'Pentatrichomonas hominis', GRUPO_FLAGELADOS, ESTADIOS_PROTOZOO),
+    ('chilomastix_mesnili', 'Chilomastix mesnili', GRUPO_FLAGELADOS, ESTADIOS_PROTOZOO),
+
+    # PROTOZOOS - CILIADOS
+    ('balantidium_coli', 'Balantidium coli', GRUPO_CILIADOS, ESTADIOS_PROTOZOO),
+
+    # BLASTOCYSTIS
+    ('blastocystis_sp', 'Blastocystis sp', GRUPO_BLASTOCYSTIS, ESTADIOS_COCCIDIO),
+
+    # COCCIDIOS
+    ('cystoisospora_belli', 'Cystoisospora belli', GRUPO_COCCIDIOS, ESTADIOS_COCCIDIO),
+    ('cyclospora_cayetanensis', 'Cyclospora cayetanensis', GRUPO_COCCIDIOS, ESTADIOS_COCCIDIO),
+    ('cryptosporidium_spp', 'Cryptosporidium spp', GRUPO_COCCIDIOS, ESTADIOS_COCCIDIO),
+
+    # HELMINTOS - NEMATODOS
+    ('ascaris_lumbricoides', 'Ascaris lumbricoides', GRUPO_NEMATODOS, ESTADIOS_HELMINTO),
+    ('trichuris_trichiura', 'Trichuris trichiura', GRUPO_NEMATODOS, ESTADIOS_HELMINTO),
+    ('necator_americanus', 'Necator americanus', GRUPO_NEMATODOS, ESTADIOS_HELMINTO),
+    ('strongyloides_stercoralis', 'Strongyloides stercoralis', GRUPO_NEMATODOS, ESTADIOS_HELMINTO),
+    ('enterobius_vermicularis', 'Enterobius vermicularis', GRUPO_NEMATODOS, ESTADIOS_HELMINTO),
+
+    # HELMINTOS - CESTODOS
+    ('taenia_spp', 'Taenia spp', GRUPO_CESTODOS, ESTADIOS_CESTODO),
+    ('hymenolepis_diminuta', 'Hymenolepis diminuta', GRUPO_CESTODOS, ESTADIOS_HELMINTO),
+    ('rodentolepis_nana', 'Rodentolepis nana', GRUPO_CESTODOS, ESTADIOS_HELMINTO),
+)
+
+PARASITOS = tuple(
+    Parasito(
+        campo=campo,
+        nombre=nombre,
+        grupo=grupo,
+        estadios=tuple(estadios),
+        bit=bit,
+        mascara=1 << bit,
+        nombres_estadio=MappingProxyType(dict(estadios)),
+    )
+    for bit, (campo, nombre, grupo, estadios) in enumerate(_DEFINICION)
+)
+
+CAMPOS = tuple(parasito.campo for parasito in PARASITOS)
+
+# (campo, nombre) para choices de Django
+CHOICES = tuple((parasito.campo, parasito.nombre) for parasito in PARASITOS)
+
+POR_CAMPO = MappingProxyType({parasito.campo: parasito for parasito in PARASITOS})
+POR_NOMBRE = MappingProxyType({parasito.nombre: parasito for parasito in PARASITOS})
+
+# Lee los 21 campos de una muestra en una sola llamada: devuelve una tupla
+# en el orden de PARASITOS
+obtener_valores = attrgetter(*CAMPOS)
+
+
+# ==================== FUNCIONES ====================
+
+def mascara_de_campos(campos):
+    """Máscara con los bits de los parásitos indicados (campos de Muestra)"""
+    mascara = 0
+    for campo in campos:
+        parasito = POR_CAMPO.get(campo)
+        if parasito is None:
+            raise ValueError(f"Parásito desconocido: {campo}")
+        mascara |= parasito.mascara
+    return mascara
+
+
+def mascara_de_valores(valores):
+    """Máscara a partir de los 21 valores en el orden de PARASITOS"""
+    mascara = 0
+    for parasito, valor in zip(PARASITOS, valores):
+        if valor:
+            mascara |= parasito.mascara
+    return mascara
+
+
+@lru_cache(maxsize=4096)
+def en_mascara(mascara):
+    """Tupla de los parásitos presentes en una máscara"""
+    return tuple(parasito for parasito in PARASITOS if mascara & parasito.mascara)
+
+
+def presentes(muestra):
+    """[(Parasito, estadio)] de los parásitos con valor en una muestra"""
+    return [
+        (parasito, valor)
+        for parasito, valor in zip(PARASITOS, obtener_valores(muestra))
+        if valor
+    ]
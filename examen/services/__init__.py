@@ -0,0 +1,89 @@
+from .dashboard import (
+    contexto_nacional,
+    contexto_regional,
+    contexto_centro,
+    series_semanales_por_centros,
+    top_parasitos,
+    coocurrencia_parasitos,
+)
+from .mascara_parasitos import recalcular_mascaras
+from .resumen_diario import aplicar_delta, aplicar_deltas, aplicar_estados, reconstruir_resumen_diario, contar_casos
+from .alertas import evaluar_cambio, evaluar_lote, configuraciones_activas, invalidar_configuraciones
+from .estadisticas import (
+    recalcular_semana,
+    recalcular_semana_centro,
+    recalcular_pares,
+    aplicar_delta_estadisticas,
+    aplicar_deltas_estadisticas,
+    reconciliar_estadisticas,
+    estadisticas_por_region,
+)
+from .widgets import WIDGETS
+from .cache_dashboard import (
+    obtener_contexto,
+    recalcular_contexto,
+    obtener_widget,
+    recalcular_widget,
+    invalidar,
+    invalidar_por_centros,
+)
+from .tareas import encolar, procesar_lote
+from .reconstruccion import reconstruir_en_paralelo
+from .importacion import importar_muestras
+from .reportes_excel import generar_reporte as generar_reporte_excel, reporte_en_cache
+from .boletines import generar_boletines, obtener_boletin
+from .geografia import obtener_resolutor, normalizar_nombre
+from .busqueda import buscar, filtrar as filtrar_busqueda, reconstruir_indice as reconstruir_indice_busqueda
+from .semanas import resolver as resolver_semana, resolver_fechas, prellenar as prellenar_semanas
+from .sqlite import optimizar as optimizar_sqlite, medir_escritura as medir_escritura_sqlite
+
+__all__ = [
+    'contexto_nacional',
+    'contexto_regional',
+    'contexto_centro',
+    'series_semanales_por_centros',
+    'top_parasitos',
+    'coocurrencia_parasitos',
+    'recalcular_mascaras',
+    'aplicar_delta',
+    'aplicar_deltas',
+    'aplicar_estados',
+    'reconstruir_resumen_diario',
+    'contar_casos',
+    'evaluar_cambio',
+    'evaluar_lote',
+    'configuraciones_activas',
+    'invalidar_configuraciones',
+    'recalcular_semana',
+    'recalcular_semana_centro',
+    'recalcular_pares',
+    'aplicar_delta_estadisticas',
+    'aplicar_deltas_estadisticas',
+    'reconciliar_estadisticas',
+    'estadisticas_por_region',
+    'WIDGETS',
+    'obtener_contexto',
+    'recalcular_contexto',
+    'obtener_widget',
+    'recalcular_widget',
+    'invalidar',
+    'invalidar_por_centros',
+    'reconstruir_en_paralelo',
+    'encolar',
+    'procesar_lote',
+    'importar_muestras',
+    'generar_reporte_excel',
+    'reporte_en_cache',
+    'generar_boletines',
+    'obtener_boletin',
+    'obtener_resolutor',
+    'normalizar_nombre',
+    'buscar',
+    'filtrar_busqueda',
+    'reconstruir_indice_busqueda',
+    'resolver_semana',
+    'resolver_fechas',
+    'prellenar_semanas',
+    'optimizar_sqlite',
+    'medir_escritura_sqlite',
+]
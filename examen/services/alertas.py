@@ -0,0 +1,255 @@
+# examen/services/alertas.py
+"""
+Motor de evaluación de alertas epidemiológicas.
+
+- Los casos de la ventana salen de ResumenDiarioParasito (contadores por
+  centro, parásito y día): sumar una ventana cuesta lo mismo sin importar
+  cuántas muestras tenga la tabla.
+- Las configuraciones activas se cachean en memoria del proceso. Los
+  signals de ConfiguracionAlerta invalidan la cache; además expira a los
+  CONFIG_CACHE_SEGUNDOS para recoger cambios hechos en otros procesos.
+- Al guardar o eliminar una muestra solo se evalúan los pares
+  (centro, parásito, fecha) que cambiaron. Los que la muestra deja de
+  aportar actualizan (descuentan) la alerta abierta.
+- Una alerta abierta siempre se reevalúa en su fecha de referencia (la
+  fecha más reciente con casos, o la de su muestra de origen): editar,
+  eliminar o cargar tarde una muestra antigua nunca reemplaza sus
+  contadores con los de una ventana anterior.
+"""
+import time
+from bisect import bisect_right
+from datetime import timedelta
+from itertools import accumulate
+from types import MappingProxyType
+
+from django.conf import settings
+
+from examen.models import ConfiguracionAlerta, Alerta, CentroAtencion
+from examen.parasitos import CAMPOS
+from .resumen_diario import contar_casos, serie_diaria, ultima_fecha_con_casos
+
+
+CONFIG_CACHE_SEGUNDOS = getattr(settings, 'ALERTAS_CONFIG_CACHE_SEGUNDOS', 60)
+
+# Estados en los que una alerta sigue abierta y se actualiza
+ESTADOS_ABIERTOS = ('ACTIVA', 'EN_PROCESO')
+
+_configuraciones = {'datos': None, 'expira': 0.0}
+
+
+# ==================== CONFIGURACIONES ====================
+
+def configuraciones_activas():
+    """{parasito_campo: ConfiguracionAlerta} de las configuraciones activas (cacheado)"""
+    datos = _configuraciones['datos']
+    if datos is None or time.monotonic() >= _configuraciones['expira']:
+        datos = MappingProxyType({
+            config.parasito_campo: config
+            for config in ConfiguracionAlerta.objects.filter(activo=True)
+        })
+        _configuraciones['datos'] = datos
+        _configuraciones['expira'] = time.monotonic() + CONFIG_CACHE_SEGUNDOS
+    return datos
+
+
+def invalidar_configuraciones():
+    """Descarta la cache de configuraciones activas de este proceso"""
+    _configuraciones['datos'] = None
+
+
+# ==================== EVALUACIÓN ====================
+
+def calcular_nivel(config, casos):
+    """Nivel de alerta para un número de casos (None si no alcanza ningún umbral)"""
+    # Evaluar de mayor a menor gravedad
+    if casos >= config.umbral_emergencia:
+        return 'ROJO'
+    if casos >= config.umbral_alerta:
+        return 'NARANJA'
+    if casos >= config.umbral_precaucion:
+        return 'AMARILLO'
+    return None
+
+
+def casos_en_ventana(config, centro_id, fecha):
+    """(casos en la ventana que termina en `fecha`, casos del día `fecha`)"""
+    fecha_inicio = fecha - timedelta(days=config.ventana_tiempo_dias)
+    return contar_casos(centro_id, config.parasito_campo, fecha_inicio, fecha)
+
+
+def evaluar(config, centro_id, fecha, muestra=None):
+    """
+    Evalúa un parásito en un centro con la ventana que termina en `fecha`.
+
+    Si hay una alerta abierta se actualizan sus contadores y su nivel (VERDE
+    si ya no alcanza ningún umbral) con la ventana de su fecha de referencia
+    en lugar de la de `fecha`. Si no hay alerta abierta y se alcanza un
+    umbral, se crea con `muestra` como origen; sin muestra no se crea.
+    """
+    alerta = _alerta_abierta(config, centro_id)
+    if alerta:
+        fecha = _fecha_referencia(config, centro_id, alerta)
+    casos_ventana, casos_dia = casos_en_ventana(config, centro_id, fecha)
+    return _aplicar(config, centro_id, alerta, casos_ventana, casos_dia, muestra)
+
+
+def _alerta_abierta(config, centro_id):
+    return Alerta.objects.filter(
+        configuracion=config,
+        centro_atencion_id=centro_id,
+        estado__in=ESTADOS_ABIERTOS
+    ).select_related('muestra_origen').first()
+
+
+def _fecha_referencia(config, centro_id, alerta):
+    """
+    Fecha en la que termina la ventana de una alerta abierta: la más reciente
+    con casos del parásito en el centro, nunca anterior a la de su muestra de
+    origen (si ya no queda ningún caso, la ventana del origen queda en cero).
+    """
+    origen = alerta.muestra_origen.fecha_examen
+    ultima = ultima_fecha_con_casos(centro_id, config.parasito_campo)
+    return max(ultima, origen) if ultima else origen
+
+
+def _contadores(alerta):
+    return alerta and (alerta.numero_casos, alerta.numero_casos_dia, alerta.nivel)
+
+
+def _guardar_contadores(alerta):
+    alerta.save(update_fields=['numero_casos', 'numero_casos_dia', 'nivel', 'fecha_ultima_actualizacion'])
+
+
+def _aplicar(config, centro_id, alerta, casos_ventana, casos_dia, muestra=None, guardar=True):
+    """
+    Actualiza la alerta abierta o crea una nueva según los casos (ver evaluar).
+    Con guardar=False la alerta abierta solo se actualiza en memoria.
+    """
+    nivel = calcular_nivel(config, casos_ventana)
+
+    if alerta:
+        nivel = nivel or 'VERDE'
+        if _contadores(alerta) != (casos_ventana, casos_dia, nivel):
+            alerta.numero_casos = casos_ventana
+            alerta.numero_casos_dia = casos_dia
+            alerta.nivel = nivel
+            if guardar:
+                _guardar_contadores(alerta)
+        return alerta
+
+    if nivel is None or muestra is None:
+        return None
+
+    region_id = CentroAtencion.objects.filter(pk=centro_id).values_list('region_id', flat=True).first()
+    return Alerta.objects.create(
+        configuracion=config,
+        muestra_origen=muestra,
+        nivel=nivel,
+        estado='ACTIVA',
+        centro_atencion_id=centro_id,
+        region_id=region_id,
+        numero_casos=casos_ventana,
+        numero_casos_dia=casos_dia
+    )
+
+
+def evaluar_lote(claves):
+    """
+    Evalúa muchas claves (centro_id, parasito_campo, fecha, muestra o None).
+
+    Agrupa por (centro, parásito): una consulta de la serie diaria y una de
+    la alerta abierta por grupo, y las ventanas se suman en memoria. Las
+    fechas de cada grupo se evalúan en orden, igual que si las muestras se
+    hubieran guardado una por una; la alerta se guarda al final del grupo.
+    Si el grupo ya tiene una alerta abierta solo se evalúa su fecha de
+    referencia (ver evaluar).
+    """
+    configuraciones = configuraciones_activas()
+
+    grupos = {}
+    for centro_id, campo, fecha, muestra in claves:
+        if campo not in configuraciones:
+            continue
+        fechas = grupos.setdefault((centro_id, campo), {})
+        fechas[fecha] = fechas.get(fecha) or muestra
+
+    for (centro_id, campo), fechas in grupos.items():
+        config = configuraciones[campo]
+        ventana = timedelta(days=config.ventana_tiempo_dias)
+
+        alerta = _alerta_abierta(config, centro_id)
+        if alerta:
+            fechas = {_fecha_referencia(config, centro_id, alerta): None}
+
+        serie = serie_diaria(centro_id, campo, min(fechas) - ventana, max(fechas))
+
+        # Casos acumulados hasta cada fecha de la serie
+        dias = sorted(serie)
+        acumulados = list(accumulate(serie[dia] for dia in dias))
+
+        def hasta(fecha):
+            i = bisect_right(dias, fecha)
+            return acumulados[i - 1] if i else 0
+
+        # La alerta se actualiza en memoria y se guarda una vez por grupo
+        guardado = _contadores(alerta)
+        for fecha in sorted(fechas):
+            casos_ventana = hasta(fecha) - hasta(fecha - ventana - timedelta(days=1))
+            anterior = alerta
+            alerta = _aplicar(
+                config, centro_id, alerta, casos_ventana, serie.get(fecha, 0), fechas[fecha], guardar=False
+            )
+            if alerta is not anterior:
+                guardado = _contadores(alerta)
+        if alerta and _contadores(alerta) != guardado:
+            _guardar_contadores(alerta)
+
+
+def _claves(estado, configuraciones):
+    """(centro_id, parasito_campo, fecha) monitoreados a los que aporta un estado de muestra"""
+    if not estado:
+        return set()
+    return {
+        (estado['centro_atencion_id'], campo, estado['fecha_examen'])
+        for campo in CAMPOS
+        if estado[campo] and campo in configuraciones
+    }
+
+
+def claves_cambio(anterior, actual):
+    """
+    Pares monitoreados afectados por el cambio de una muestra entre dos
+    estados (Muestra.capturar_estado): (claves nuevas, claves que dejó de aportar).
+    Para una muestra nueva `anterior` es None; para una eliminada `actual` es None.
+    """
+    configuraciones = configuraciones_activas()
+    if not configuraciones:
+        return set(), set()
+
+    claves_anteriores = _claves(anterior, configuraciones)
+    claves_actuales = _claves(actual, configuraciones)
+    return claves_actuales - claves_anteriores, claves_anteriores - claves_actuales
+
+
+def evaluar_clave(centro_id, parasito_campo, fecha, muestra=None):
+    """Evalúa un par (centro, parásito) si su configuración sigue activa"""
+    config = configuraciones_activas().get(parasito_campo)
+    if config is None:
+        return None
+    return evaluar(config, centro_id, fecha, muestra)
+
+
+def evaluar_cambio(anterior, actual, muestra=None):
+    """
+    Evalúa en el momento las alertas afectadas por el cambio de una muestra.
+    Debe llamarse después de actualizar ResumenDiarioParasito.
+    """
+    nuevas, quitadas = claves_cambio(anterior, actual)
+
+    # Casos nuevos: pueden crear o escalar una alerta
+    for centro_id, campo, fecha in nuevas:
+        evaluar_clave(centro_id, campo, fecha, muestra)
+
+    # Casos que la muestra dejó de aportar: solo se actualiza la alerta abierta
+    for centro_id, campo, fecha in quitadas:
+        evaluar_clave(centro_id, campo, fecha)
@@ -0,0 +1,270 @@
+# examen/services/analitica.py
+"""
+Exportación columnar (Parquet o Feather) de la tabla de hechos de muestras
+para pandas y PowerBI.
+
+- Una fila por muestra con la demografía del expediente (sexo, edad al
+  examen, departamento, municipio), centro, región y semana epidemiológica.
+  No incluye nombres ni DNI: se identifica al paciente por expediente_id.
+- Los datos se leen por bloques de ids (una consulta por bloque) y cada
+  bloque se escribe como un row group / record batch: la memoria no depende
+  del número de muestras.
+- Las columnas de códigos (choices, estadios de parásitos, centro, región,
+  departamento, municipio) son categóricas con categorías fijas, así que se
+  guardan codificadas por diccionario; las 21 columnas de parásitos casi
+  vacías ocupan muy poco.
+- Exportación incremental: el directorio destino guarda en _estado.json la
+  marca de fecha_modificacion exportada; cada corrida agrega una partición
+  nueva con las muestras creadas o modificadas desde entonces. Una muestra
+  modificada aparece en varias particiones: quedarse con la fila de mayor
+  fecha_modificacion por muestra_id.
+
+Requiere pyarrow (se importa solo al exportar).
+"""
+import json
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from examen.models import (
+    CentroAtencion,
+    Departamento,
+    Expediente,
+    Municipio,
+    Muestra,
+    Region,
+    CONSISTENCIA_CHOICES,
+    MOCO_CHOICES,
+    PRESENCIA_CHOICES,
+    INTENSIDAD_CHOICES,
+    RESULTADO_CHOICES,
+)
+from examen.parasitos import PARASITOS
+
+
+TAMANO_BLOQUE = 50000
+
+EXTENSIONES = {
+    'parquet': 'parquet',
+    'feather': 'feather',
+}
+
+ARCHIVO_ESTADO = '_estado.json'
+
+# Las muestras modificadas poco antes de la marca se vuelven a exportar:
+# cubre transacciones que se confirmaron después de leer la marca
+MARGEN_INCREMENTAL = timedelta(minutes=5)
+
+# (nombre de columna, campo de la consulta)
+COLUMNAS = (
+    ('muestra_id', 'id'),
+    ('numero_examen', 'numero_examen'),
+    ('fecha_examen', 'fecha_examen'),
+    ('año_epidemiologico', 'año_epidemiologico'),
+    ('semana_epidemiologica', 'semana_numero'),
+    ('resultado', 'resultado'),
+    ('consistencia', 'consistencia'),
+    ('moco', 'moco'),
+    ('sangre_macroscopica', 'sangre_macroscopica'),
+    ('ascaris_intensidad', 'ascaris_intensidad'),
+    ('expediente_id', 'expediente_id'),
+    ('sexo', 'expediente__sexo'),
+    ('fecha_nacimiento', 'expediente__fecha_nacimiento'),
+    ('departamento', 'expediente__departamento__nombre'),
+    ('municipio', 'expediente__municipio__nombre'),
+    ('centro_codigo', 'centro_atencion__codigo'),
+    ('centro_nombre', 'centro_atencion__nombre'),
+    ('region_numero', 'centro_atencion__region__numero_region'),
+    ('region_nombre', 'centro_atencion__region__nombre'),
+    ('activo', 'activo'),
+    ('fecha_modificacion', 'fecha_modificacion'),
+    *((parasito.campo, parasito.campo) for parasito in PARASITOS),
+)
+
+# Columnas de códigos que se traducen a su texto
+_ETIQUETAS = {
+    'resultado': dict(RESULTADO_CHOICES),
+    'consistencia': dict(CONSISTENCIA_CHOICES),
+    'moco': dict(MOCO_CHOICES),
+    'sangre_macroscopica': dict(PRESENCIA_CHOICES),
+    'ascaris_intensidad': dict(INTENSIDAD_CHOICES),
+    'sexo': dict(Expediente.SEXO_CHOICES),
+    **{parasito.campo: dict(parasito.nombres_estadio) for parasito in PARASITOS},
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            'La exportación Parquet/Feather necesita pyarrow (pip install pyarrow)'
+        ) from e
+    return pyarrow
+
+
+# ==================== BLOQUES ====================
+
+def _categorias():
+    """Categorías fijas de cada columna categórica (iguales en todos los bloques)"""
+    categorias = {
+        columna: list(dict.fromkeys(etiquetas.values()))
+        for columna, etiquetas in _ETIQUETAS.items()
+    }
+    categorias.update({
+        'departamento': list(Departamento.objects.order_by('nombre').values_list('nombre', flat=True)),
+        'municipio': sorted(set(Municipio.objects.values_list('nombre', flat=True))),
+        'centro_codigo': list(CentroAtencion.objects.order_by('codigo').values_list('codigo', flat=True)),
+        'centro_nombre': sorted(set(CentroAtencion.objects.values_list('nombre', flat=True))),
+        'region_nombre': list(Region.objects.order_by('numero_region').values_list('nombre', flat=True)),
+    })
+    return categorias
+
+
+def _tabla(filas, categorias):
+    """DataFrame tipado de un bloque de filas de values_list"""
+    datos = pd.DataFrame.from_records(filas, columns=[columna for columna, _ in COLUMNAS])
+
+    for columna, etiquetas in _ETIQUETAS.items():
+        datos[columna] = datos[columna].map(etiquetas)
+    for columna, valores in categorias.items():
+        datos[columna] = pd.Categorical(datos[columna], categories=valores)
+
+    examen = pd.to_datetime(datos['fecha_examen'])
+    nacimiento = pd.to_datetime(datos['fecha_nacimiento'])
+    cumplidos = (examen.dt.month * 100 + examen.dt.day) >= (nacimiento.dt.month * 100 + nacimiento.dt.day)
+    datos['edad_al_examen'] = (examen.dt.year - nacimiento.dt.year - (~cumplidos).astype(int)).astype('Int16')
+
+    datos['fecha_examen'] = examen
+    datos['fecha_nacimiento'] = nacimiento
+    datos['fecha_modificacion'] = pd.to_datetime(datos['fecha_modificacion'], utc=True)
+    for columna, tipo in (
+        ('muestra_id', 'int64'),
+        ('expediente_id', 'int64'),
+        ('año_epidemiologico', 'Int16'),
+        ('semana_epidemiologica', 'Int8'),
+        ('region_numero', 'Int8'),
+    ):
+        datos[columna] = datos[columna].astype(tipo)
+    datos['numero_examen'] = datos['numero_examen'].astype('string')
+    # Un bloque vacío no tiene valores de los que inferir el tipo
+    datos['activo'] = datos['activo'].astype('bool')
+    return datos
+
+
+def bloques(muestras, tamano_bloque=TAMANO_BLOQUE):
+    """DataFrames de `tamano_bloque` muestras, leídos por rango de ids"""
+    categorias = _categorias()
+    campos = [campo for _, campo in COLUMNAS]
+    ultimo_id = 0
+    while True:
+        filas = list(
+            muestras.filter(id__gt=ultimo_id).order_by('id').values_list(*campos)[:tamano_bloque]
+        )
+        if not filas:
+            return
+        ultimo_id = filas[-1][0]
+        yield _tabla(filas, categorias)
+
+
+# ==================== ESCRITURA ====================
+
+def _abrir_escritor(pa, ruta, esquema, formato):
+    if formato == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(str(ruta), esquema, compression='zstd')
+    return pa.ipc.new_file(str(ruta), esquema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+
+
+def escribir_hechos(ruta, muestras, formato='parquet', tamano_bloque=TAMANO_BLOQUE, al_escribir_bloque=None,
+                    vacio=False):
+    """
+    Escribe las muestras en un archivo Parquet o Feather, un bloque a la vez.
+    Devuelve el número de filas escritas. Si no había muestras no se crea el
+    archivo, salvo con `vacio`: se escribe uno sin filas con todas las columnas.
+    """
+    if formato not in EXTENSIONES:
+        raise ValueError(f'Formato no soportado: {formato} (use {", ".join(EXTENSIONES)})')
+    pa = _pyarrow()
+
+    escritor = None
+    filas = 0
+    try:
+        for datos in bloques(muestras, tamano_bloque):
+            tabla = pa.Table.from_pandas(datos, preserve_index=False)
+            if escritor is None:
+                escritor = _abrir_escritor(pa, ruta, tabla.schema, formato)
+            escritor.write_table(tabla)
+            filas += len(datos)
+            if al_escribir_bloque:
+                al_escribir_bloque(filas)
+        if escritor is None and vacio:
+            tabla = pa.Table.from_pandas(_tabla([], _categorias()), preserve_index=False)
+            escritor = _abrir_escritor(pa, ruta, tabla.schema, formato)
+            escritor.write_table(tabla)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
+
+
+def _leer_estado(directorio):
+    ruta = directorio / ARCHIVO_ESTADO
+    if not ruta.exists():
+        return {'particiones': []}
+    return json.loads(ruta.read_text(encoding='utf-8'))
+
+
+def exportar_hechos(destino, formato='parquet', muestras=None, incremental=False,
+                    tamano_bloque=TAMANO_BLOQUE, al_escribir_bloque=None):
+    """
+    Exporta la tabla de hechos al directorio `destino`.
+
+    Sin `incremental` escribe una exportación completa y reemplaza las
+    particiones anteriores. Con `incremental` agrega una partición con las
+    muestras modificadas desde la última exportación.
+    Devuelve {'archivo', 'filas', 'marca', 'particiones'}.
+    """
+    directorio = Path(destino)
+    directorio.mkdir(parents=True, exist_ok=True)
+    estado = _leer_estado(directorio)
+
+    if muestras is None:
+        muestras = Muestra.objects.all()
+
+    inicio = timezone.now()
+    marca_anterior = parse_datetime(estado['marca']) if incremental and estado.get('marca') else None
+    if marca_anterior:
+        if estado.get('formato') != formato:
+            raise ValueError(f'El destino tiene particiones {estado.get("formato")}; use el mismo formato')
+        muestras = muestras.filter(fecha_modificacion__gt=marca_anterior - MARGEN_INCREMENTAL)
+    muestras = muestras.filter(fecha_modificacion__lte=inicio)
+
+    tipo = 'incremental' if marca_anterior else 'completo'
+    archivo = directorio / f'muestras-{tipo}-{inicio:%Y%m%dT%H%M%S}.{EXTENSIONES[formato]}'
+    filas = escribir_hechos(archivo, muestras, formato, tamano_bloque, al_escribir_bloque)
+
+    particiones = estado['particiones'] if marca_anterior else []
+    if not marca_anterior:
+        # Exportación completa: las particiones anteriores quedan reemplazadas
+        for nombre in estado['particiones']:
+            (directorio / nombre).unlink(missing_ok=True)
+    if filas:
+        particiones.append(archivo.name)
+
+    (directorio / ARCHIVO_ESTADO).write_text(json.dumps({
+        'formato': formato,
+        'marca': inicio.isoformat(),
+        'particiones': particiones,
+    }, indent=2), encoding='utf-8')
+
+    return {
+        'archivo': archivo if filas else None,
+        'filas': filas,
+        'marca': inicio,
+        'particiones': len(particiones),
+    }
@@ -0,0 +1,457 @@
+# examen/services/boletines.py
+"""
+Boletín epidemiológico semanal en PDF (reportlab): uno nacional y uno por
+región sanitaria.
+
+- Los datos de todos los boletines de una semana salen de pocas consultas
+  agrupadas compartidas (datos_boletines): semanas y estadísticas por centro
+  para la tendencia, resumen diario para los parásitos, muestras agrupadas
+  por región, sexo y año de nacimiento, y alertas. Se reparten por región
+  en memoria.
+- Los PDF se dibujan en paralelo en un pool de procesos. El dibujo no
+  consulta la BD: cada proceso recibe el diccionario de datos de su boletín.
+- Cada boletín se guarda en BOLETINES_DIR por (alcance, semana). Una semana
+  cerrada (su domingo ya pasó) no se vuelve a dibujar; el boletín de la
+  semana en curso lleva en el nombre la versión del alcance en la cache de
+  los dashboards y se rehace cuando cambian los datos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractYear
+
+from examen.models import (
+    Alerta,
+    CentroAtencion,
+    EstadisticaSemanalCentro,
+    Expediente,
+    Muestra,
+    Region,
+    ResumenDiarioParasito,
+    SemanaEpidemiologica,
+)
+from examen.parasitos import POR_CAMPO
+from .cache_dashboard import clave_alcance, _version
+from .semanas import semana_iso
+
+
+BOLETINES_DIR = Path(getattr(settings, 'BOLETINES_DIR', settings.BASE_DIR / 'boletines'))
+
+# Semanas anteriores a la actual que se dibujan aunque no tengan fila en
+# SemanaEpidemiologica (las más antiguas sin fila no tienen datos)
+SEMANAS_HISTORIAL = getattr(settings, 'BOLETINES_SEMANAS_HISTORIAL', 104)
+
+# Semanas de la tabla y el gráfico de tendencia (incluye la del boletín)
+SEMANAS_TENDENCIA = 8
+
+TOP_PARASITOS = 10
+
+# (etiqueta, edad mínima, edad máxima) con la edad aproximada por año de nacimiento
+GRUPOS_EDAD = (
+    ('0-4', 0, 4),
+    ('5-14', 5, 14),
+    ('15-49', 15, 49),
+    ('50 y más', 50, 200),
+)
+
+# Los niveles de Alerta.NIVEL_CHOICES empiezan con un emoji que Helvetica no tiene
+_NIVELES = {codigo: etiqueta.split(' ', 1)[-1] for codigo, etiqueta in Alerta.NIVEL_CHOICES}
+_ESTADOS = dict(Alerta.ESTADO_CHOICES)
+_SEXO = dict(Expediente.SEXO_CHOICES)
+
+
+# ==================== SEMANA Y ALCANCES ====================
+
+def ultima_semana_cerrada(hoy=None):
+    """(año, semana) de la última semana ISO cuyo domingo ya pasó"""
+    año, semana, _, _ = semana_iso((hoy or date.today()) - timedelta(days=7))
+    return año, semana
+
+
+def semana_cerrada(año, semana):
+    return date.fromisocalendar(año, semana, 7) < date.today()
+
+
+def semana_futura(año, semana, hoy=None):
+    """True si la semana empieza después de la semana ISO en curso"""
+    return date.fromisocalendar(año, semana, 1) > semana_iso(hoy or date.today())[2]
+
+
+def semana_con_boletin(año, semana, hoy=None):
+    """
+    True si se puede pedir el boletín de una semana pasada o en curso: está
+    dentro de las últimas SEMANAS_HISTORIAL semanas o tiene fila en
+    SemanaEpidemiologica (se registraron muestras en su año; ver semanas.py).
+    """
+    lunes_actual = semana_iso(hoy or date.today())[2]
+    if date.fromisocalendar(año, semana, 1) >= lunes_actual - timedelta(weeks=SEMANAS_HISTORIAL):
+        return True
+    return SemanaEpidemiologica.objects.filter(año=año, semana=semana).exists()
+
+
+def alcances_boletin():
+    """[('nacional', None), ('region', id), ...] de las regiones activas"""
+    return [('nacional', None)] + [
+        ('region', region_id)
+        for region_id in Region.objects.filter(activo=True).order_by('numero_region').values_list('id', flat=True)
+    ]
+
+
+def ruta_boletin(alcance, objeto_id, año, semana):
+    """Ruta del boletín; la de una semana abierta incluye la versión de los datos"""
+    nombre = _base(alcance, objeto_id, año, semana)
+    if not semana_cerrada(año, semana):
+        nombre += f'_v{_version(clave_alcance(alcance, objeto_id))}'
+    return BOLETINES_DIR / f'{nombre}.pdf'
+
+
+def _base(alcance, objeto_id, año, semana):
+    """'boletin_region-5_2025-S07'"""
+    return f'boletin_{clave_alcance(alcance, objeto_id).replace(":", "-")}_{año}-S{semana:02d}'
+
+
+# ==================== DATOS ====================
+
+def _vacio(titulo, alcance, objeto_id, semana, tendencia):
+    return {
+        'titulo': titulo,
+        'alcance': alcance,
+        'objeto_id': objeto_id,
+        'año': semana.año,
+        'semana': semana.semana,
+        'inicio': semana.fecha_inicio,
+        'fin': semana.fecha_fin,
+        'tendencia': {etiqueta: [0, 0] for etiqueta in tendencia},
+        'parasitos': {},
+        'por_sexo': {},
+        'por_edad': {etiqueta: [0, 0] for etiqueta, _, _ in GRUPOS_EDAD},
+        'filas': {},
+        'alertas': [],
+        'alertas_activas': 0,
+    }
+
+
+def _grupo_edad(edad):
+    for etiqueta, minima, maxima in GRUPOS_EDAD:
+        if minima <= edad <= maxima:
+            return etiqueta
+    return None
+
+
+def datos_boletines(año, semana, alcances):
+    """
+    {(alcance, objeto_id): datos} de los boletines pedidos de una semana.
+    Los datos son estructuras simples (se envían a otros procesos).
+    """
+    # Últimas SEMANAS_TENDENCIA semanas del calendario. Solo lectura: las
+    # semanas sin fila (sin muestras registradas) se informan en cero, sin crearlas
+    inicio = date.fromisocalendar(año, semana, 1)
+    tendencia = [
+        'S{1:02d}/{0}'.format(*semana_iso(inicio - timedelta(weeks=atras)))
+        for atras in reversed(range(SEMANAS_TENDENCIA))
+    ]
+    semanas = list(
+        SemanaEpidemiologica.objects.filter(
+            fecha_inicio__range=(inicio - timedelta(weeks=SEMANAS_TENDENCIA - 1), inicio)
+        ).values_list('id', 'año', 'semana', 'total_muestras', 'total_positivas')
+    )
+    etiqueta_semana = {semana_id: f'S{numero:02d}/{año_semana}' for semana_id, año_semana, numero, _, _ in semanas}
+    actual = SemanaEpidemiologica(
+        id=next((semana_id for semana_id, *clave, _, _ in semanas if clave == [año, semana]), None),
+        año=año, semana=semana, fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=6),
+    )
+
+    regiones = {
+        region_id: (numero, nombre)
+        for region_id, numero, nombre in Region.objects.values_list('id', 'numero_region', 'nombre')
+    }
+    centros = {
+        centro_id: (region_id, codigo, nombre)
+        for centro_id, region_id, codigo, nombre in CentroAtencion.objects.values_list('id', 'region_id', 'codigo', 'nombre')
+    }
+
+    datos = {}
+    for alcance, objeto_id in alcances:
+        if alcance == 'nacional':
+            titulo = 'Nacional'
+        else:
+            titulo = 'Región Sanitaria {} - {}'.format(*regiones[objeto_id])
+        datos[(alcance, objeto_id)] = _vacio(titulo, alcance, objeto_id, actual, tendencia)
+    nacional = datos.get(('nacional', None))
+
+    def destinos(region_id):
+        """Boletines a los que aporta una fila de esa región"""
+        region = datos.get(('region', region_id))
+        return [boletin for boletin in (nacional, region) if boletin]
+
+    # Tendencia nacional: totales cacheados de SemanaEpidemiologica
+    if nacional:
+        for semana_id, _, _, total, positivas in semanas:
+            nacional['tendencia'][etiqueta_semana[semana_id]] = [total, positivas]
+        for region_id, (numero, nombre) in sorted(regiones.items(), key=lambda item: item[1][0]):
+            nacional['filas'][f'{numero} - {nombre}'] = [0, 0]
+
+    # Tendencia regional y tabla por centro / región: estadísticas por centro
+    for centro_id, semana_id, total, positivas in EstadisticaSemanalCentro.objects.filter(
+        semana_id__in=etiqueta_semana
+    ).values_list('centro_atencion_id', 'semana_id', 'total_muestras', 'total_positivas'):
+        region_id, codigo, nombre = centros[centro_id]
+        region = datos.get(('region', region_id))
+        if region:
+            fila = region['tendencia'][etiqueta_semana[semana_id]]
+            fila[0] += total
+            fila[1] += positivas
+        if semana_id != actual.id:
+            continue
+        if region:
+            region['filas'][f'{codigo} - {nombre}'] = [total, positivas]
+        if nacional:
+            fila = nacional['filas']['{} - {}'.format(*regiones[region_id])]
+            fila[0] += total
+            fila[1] += positivas
+
+    # Parásitos de la semana: resumen diario
+    for region_id, campo, total in ResumenDiarioParasito.objects.filter(
+        fecha_examen__range=(actual.fecha_inicio, actual.fecha_fin)
+    ).values_list('centro_atencion__region_id', 'parasito_campo').annotate(total=Sum('total_muestras')):
+        for boletin in destinos(region_id):
+            boletin['parasitos'][campo] = boletin['parasitos'].get(campo, 0) + total
+
+    # Sexo y grupo de edad de la semana: muestras agrupadas
+    muestras_semana = Muestra.objects.filter(semana_epidemiologica=actual) if actual.pk else Muestra.objects.none()
+    for region_id, sexo, nacimiento, resultado, total in muestras_semana.values_list(
+        'centro_atencion__region_id', 'expediente__sexo',
+        ExtractYear('expediente__fecha_nacimiento'), 'resultado',
+    ).annotate(total=Count('id')):
+        grupo = _grupo_edad(año - nacimiento) if nacimiento else None
+        positivas = total if resultado == 'POS' else 0
+        for boletin in destinos(region_id):
+            fila = boletin['por_sexo'].setdefault(_SEXO.get(sexo, sexo), [0, 0])
+            fila[0] += total
+            fila[1] += positivas
+            if grupo:
+                boletin['por_edad'][grupo][0] += total
+                boletin['por_edad'][grupo][1] += positivas
+
+    # Alertas generadas en la semana y activas al cierre
+    for region_id, generada, nivel, estado, campo, centro, casos in Alerta.objects.filter(
+        fecha_generacion__date__lte=actual.fecha_fin,
+    ).filter(
+        Q(fecha_generacion__date__gte=actual.fecha_inicio) | Q(estado__in=('ACTIVA', 'EN_PROCESO'))
+    ).order_by('fecha_generacion').values_list(
+        'region_id', 'fecha_generacion', 'nivel', 'estado', 'configuracion__parasito_campo',
+        'centro_atencion__nombre', 'numero_casos',
+    ):
+        parasito = POR_CAMPO[campo].nombre if campo in POR_CAMPO else campo
+        for boletin in destinos(region_id):
+            if estado in ('ACTIVA', 'EN_PROCESO'):
+                boletin['alertas_activas'] += 1
+            if generada.date() >= actual.fecha_inicio:
+                boletin['alertas'].append((
+                    generada.date(), _NIVELES.get(nivel, nivel), parasito, centro, casos,
+                    _ESTADOS.get(estado, estado),
+                ))
+
+    return datos
+
+
+# ==================== PDF ====================
+
+def _porcentaje(parte, total):
+    return f'{parte / total * 100:.1f}%' if total else '-'
+
+
+def _tabla(filas, anchos=None):
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+
+    tabla = Table(filas, colWidths=anchos, repeatRows=1, hAlign='LEFT')
+    tabla.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4e79')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#eef3f8')]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#b0b7c3')),
+    ]))
+    return tabla
+
+
+def _grafico_tendencia(tendencia):
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+
+    dibujo = Drawing(480, 150)
+    grafico = VerticalBarChart()
+    grafico.x, grafico.y, grafico.width, grafico.height = 40, 25, 430, 110
+    grafico.data = [
+        [total for total, _ in tendencia.values()],
+        [positivas for _, positivas in tendencia.values()],
+    ]
+    grafico.categoryAxis.categoryNames = list(tendencia)
+    grafico.categoryAxis.labels.fontSize = 7
+    grafico.valueAxis.valueMin = 0
+    grafico.valueAxis.labels.fontSize = 7
+    grafico.bars[0].fillColor = colors.HexColor('#1f4e79')
+    grafico.bars[1].fillColor = colors.HexColor('#c0504d')
+    dibujo.add(grafico)
+    return dibujo
+
+
+def dibujar_boletin(datos, ruta):
+    """Escribe el PDF de un boletín a partir de su diccionario de datos (sin consultar la BD)"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    estilos = getSampleStyleSheet()
+    titulo = f"Boletín Epidemiológico Semanal - Semana {datos['semana']}/{datos['año']}"
+    documento = SimpleDocTemplate(
+        str(ruta), pagesize=letter, title=f"{titulo} - {datos['titulo']}",
+        author='Laboratorio Nacional de Parasitología',
+        leftMargin=1.5 * cm, rightMargin=1.5 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm,
+    )
+
+    etiquetas = list(datos['tendencia'])
+    total, positivas = datos['tendencia'][etiquetas[-1]]
+    anterior = datos['tendencia'][etiquetas[-2]][0] if len(etiquetas) > 1 else 0
+    variacion = _porcentaje(total - anterior, anterior) if anterior else '-'
+
+    contenido = [
+        Paragraph(titulo, estilos['Title']),
+        Paragraph(
+            f"<b>{datos['titulo']}</b> &nbsp; | &nbsp; del {datos['inicio']:%d/%m/%Y} al {datos['fin']:%d/%m/%Y}",
+            estilos['Normal'],
+        ),
+        Spacer(1, 0.4 * cm),
+        _tabla([
+            ['Muestras', 'Positivas', 'Negativas', '% positividad', 'Variación vs. semana anterior', 'Alertas activas'],
+            [total, positivas, total - positivas, _porcentaje(positivas, total), variacion, datos['alertas_activas']],
+        ]),
+        Spacer(1, 0.4 * cm),
+        Paragraph(f'Tendencia de las últimas {len(etiquetas)} semanas', estilos['Heading2']),
+        _grafico_tendencia(datos['tendencia']),
+        _tabla(
+            [['Semana', 'Muestras', 'Positivas', '% positividad']] + [
+                [etiqueta, total_semana, positivas_semana, _porcentaje(positivas_semana, total_semana)]
+                for etiqueta, (total_semana, positivas_semana) in datos['tendencia'].items()
+            ]
+        ),
+        Paragraph('Parásitos más frecuentes', estilos['Heading2']),
+    ]
+
+    parasitos = sorted(datos['parasitos'].items(), key=lambda item: -item[1])[:TOP_PARASITOS]
+    if parasitos:
+        contenido.append(_tabla(
+            [['Parásito', 'Muestras', '% de las muestras']] + [
+                [POR_CAMPO[campo].nombre if campo in POR_CAMPO else campo, casos, _porcentaje(casos, total)]
+                for campo, casos in parasitos
+            ]
+        ))
+    else:
+        contenido.append(Paragraph('Sin parásitos reportados en la semana.', estilos['Normal']))
+
+    contenido += [
+        Paragraph('Positividad por sexo y grupo de edad', estilos['Heading2']),
+        _tabla(
+            [['Grupo', 'Muestras', 'Positivas', '% positividad']] + [
+                [grupo, total_grupo, positivas_grupo, _porcentaje(positivas_grupo, total_grupo)]
+                for grupo, (total_grupo, positivas_grupo) in [
+                    *sorted(datos['por_sexo'].items()),
+                    *((f'Edad {etiqueta}', valores) for etiqueta, valores in datos['por_edad'].items()),
+                ]
+            ]
+        ),
+        Paragraph('Por región sanitaria' if datos['alcance'] == 'nacional' else 'Por establecimiento de salud', estilos['Heading2']),
+        _tabla(
+            [['Región' if datos['alcance'] == 'nacional' else 'Establecimiento', 'Muestras', 'Positivas', '% positividad']] + [
+                [nombre, total_fila, positivas_fila, _porcentaje(positivas_fila, total_fila)]
+                for nombre, (total_fila, positivas_fila) in (
+                    datos['filas'].items() if datos['alcance'] == 'nacional' else sorted(datos['filas'].items())
+                )
+            ]
+        ) if datos['filas'] else Paragraph('Sin muestras en la semana.', estilos['Normal']),
+        Paragraph('Alertas generadas en la semana', estilos['Heading2']),
+    ]
+
+    if datos['alertas']:
+        contenido.append(_tabla(
+            [['Fecha', 'Nivel', 'Parásito', 'Establecimiento', 'Casos', 'Estado']] + [
+                [f'{fecha:%d/%m/%Y}', nivel, parasito, centro, casos, estado]
+                for fecha, nivel, parasito, centro, casos, estado in datos['alertas']
+            ]
+        ))
+    else:
+        contenido.append(Paragraph('No se generaron alertas en la semana.', estilos['Normal']))
+
+    documento.build(contenido)
+
+
+def _dibujar(datos, ruta):
+    """Dibuja en un archivo temporal y lo renombra: nunca se sirve un PDF a medias"""
+    ruta = Path(ruta)
+    temporal = ruta.with_name(f'{ruta.stem}.{os.getpid()}.tmp')
+    try:
+        dibujar_boletin(datos, temporal)
+        os.replace(temporal, ruta)
+    finally:
+        temporal.unlink(missing_ok=True)
+    return str(ruta)
+
+
+# ==================== GENERAR ====================
+
+def generar_boletines(año, semana, alcances=None, procesos=None, forzar=False, al_terminar=None):
+    """
+    Genera los boletines de una semana que no estén ya guardados (con
+    `forzar` todos). Por defecto el nacional y uno por región activa.
+    Los PDF se dibujan en un pool de `procesos` procesos (por defecto uno
+    por CPU; con 1 en este proceso). `al_terminar` se llama con cada ruta.
+    Devuelve {(alcance, objeto_id): ruta}. ValueError si la semana aún no empezó.
+    """
+    if semana_futura(año, semana):
+        raise ValueError(f'La semana {semana}/{año} todavía no empezó')
+    alcances = alcances if alcances is not None else alcances_boletin()
+    rutas = {alcance: ruta_boletin(*alcance, año, semana) for alcance in alcances}
+    pendientes = [alcance for alcance, ruta in rutas.items() if forzar or not ruta.exists()]
+    if not pendientes:
+        return rutas
+
+    BOLETINES_DIR.mkdir(parents=True, exist_ok=True)
+    datos = datos_boletines(año, semana, pendientes)
+
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(pendientes)))
+    if procesos == 1:
+        for alcance in pendientes:
+            _dibujar(datos[alcance], rutas[alcance])
+            if al_terminar:
+                al_terminar(rutas[alcance])
+    else:
+        # Los procesos solo dibujan; no deben heredar la conexión abierta de este proceso
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = [pool.submit(_dibujar, datos[alcance], str(rutas[alcance])) for alcance in pendientes]
+            for futuro in as_completed(futuros):
+                ruta = futuro.result()
+                if al_terminar:
+                    al_terminar(Path(ruta))
+
+    # Versiones anteriores de los boletines de la semana en curso
+    for alcance in pendientes:
+        for anterior in BOLETINES_DIR.glob(f'{_base(*alcance, año, semana)}*.pdf'):
+            if anterior != rutas[alcance]:
+                anterior.unlink(missing_ok=True)
+    return rutas
+
+
+def obtener_boletin(alcance, objeto_id, año, semana):
+    """Ruta del boletín de un alcance; lo genera en esta llamada si no está guardado"""
+    return generar_boletines(año, semana, [(alcance, objeto_id)], procesos=1)[(alcance, objeto_id)]
@@ -0,0 +1,376 @@
+# examen/services/busqueda.py
+"""
+Búsqueda de pacientes y muestras por nombre, DNI o número de examen.
+
+Cada expediente y cada muestra tiene una EntradaBusqueda con su texto
+normalizado (sin tildes, en minúsculas, sin puntuación; ver
+geografia.normalizar_nombre) y una clave compacta (DNI solo con dígitos o
+número de examen sin separadores). Las entradas se actualizan desde los
+signals de Expediente y Muestra y desde la importación masiva; el comando
+`reconstruir_indice_busqueda` las regenera todas.
+
+Sobre el texto, cada motor tiene su índice (se crea al migrar):
+
+- SQLite: tabla virtual FTS5 con contenido externo, sincronizada por
+  triggers con la tabla de entradas
+- PostgreSQL: columna `vector` (tsvector generado de texto, almacenado
+  para no recalcularlo al comprobar y ordenar) con índice GIN
+- Otros motores: sin índice, se busca con LIKE sobre el texto normalizado
+
+Cada palabra buscada coincide con el inicio de una palabra del texto
+('mar lop' encuentra a 'María López'), y una búsqueda con dígitos
+también por prefijo de la clave ('0801199' o '0801-199' encuentran el DNI
+0801-1990-12345). Se ordena por coincidencia exacta de la clave, luego por
+relevancia del texto y luego por fecha (más recientes primero).
+"""
+import re
+
+from django.db import DatabaseError, DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from examen.models import EntradaBusqueda, Expediente, Muestra
+from examen.services.geografia import normalizar_nombre
+
+
+TIPO_EXPEDIENTE = 'E'
+TIPO_MUESTRA = 'M'
+
+TIPOS = {
+    'expediente': TIPO_EXPEDIENTE,
+    'muestra': TIPO_MUESTRA,
+}
+
+# Caracteres mínimos para buscar y resultados del autocompletar
+LONGITUD_MINIMA = 2
+LIMITE_RESULTADOS = 10
+
+# Entradas por inserción al indexar
+TAMANO_LOTE = 2000
+
+TABLA = EntradaBusqueda._meta.db_table
+TABLA_FTS = f'{TABLA}_fts'
+
+_SQL_SQLITE = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+        texto, content='{TABLA}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, texto) VALUES (new.id, new.texto);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, texto) VALUES ('delete', old.id, old.texto);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF texto ON {TABLA} BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, texto) VALUES ('delete', old.id, old.texto);
+        INSERT INTO {TABLA_FTS}(rowid, texto) VALUES (new.id, new.texto);
+    END
+    """,
+]
+
+_SQL_POSTGRESQL = [
+    f"""
+    ALTER TABLE {TABLA} ADD COLUMN IF NOT EXISTS vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', texto)) STORED
+    """,
+    f"CREATE INDEX IF NOT EXISTS {TABLA}_vector ON {TABLA} USING gin (vector)",
+]
+
+# alias de BD -> True si el motor tiene índice de texto
+_indice_texto = {}
+
+
+# ==================== ÍNDICE DE TEXTO ====================
+
+def crear_indice_texto(using=DEFAULT_DB_ALIAS):
+    """
+    Crea el índice de texto del motor si no existe (se llama al migrar).
+    Devuelve False si el motor no lo soporta (p. ej. SQLite sin FTS5).
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        nueva = TABLA_FTS not in connection.introspection.table_names()
+        sentencias = _SQL_SQLITE
+        if nueva:
+            # Indexa las entradas que ya existían
+            sentencias = sentencias + [f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')"]
+    elif connection.vendor == 'postgresql':
+        sentencias = _SQL_POSTGRESQL
+    else:
+        return False
+
+    try:
+        with connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+    except DatabaseError:
+        return False
+    _indice_texto[using] = True
+    return True
+
+
+def indice_disponible(using=DEFAULT_DB_ALIAS):
+    """True si el motor tiene índice de texto sobre las entradas"""
+    if using not in _indice_texto:
+        connection = connections[using]
+        _indice_texto[using] = connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite' and TABLA_FTS in connection.introspection.table_names()
+        )
+    return _indice_texto[using]
+
+
+# ==================== ENTRADAS ====================
+
+def _clave(valor):
+    """'0801-1990-12345' -> '0801199012345'; 'LNP-2024/001' -> 'lnp2024001'"""
+    return re.sub(r'[\W_]+', '', normalizar_nombre(valor))
+
+
+def _texto(*partes):
+    return normalizar_nombre(' '.join(parte for parte in partes if parte))
+
+
+def _nombre(fila, prefijo=''):
+    return ' '.join(
+        fila[prefijo + campo]
+        for campo in ('primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido')
+        if fila[prefijo + campo]
+    )
+
+
+def _entradas_expedientes(expedientes):
+    filas = expedientes.values(
+        'id', 'dni', 'primer_nombre', 'segundo_nombre', 'primer_apellido',
+        'segundo_apellido', 'centro_atencion_id', 'fecha_creacion',
+    )
+    for fila in filas.iterator(chunk_size=TAMANO_LOTE):
+        nombre = _nombre(fila)
+        yield EntradaBusqueda(
+            tipo=TIPO_EXPEDIENTE,
+            objeto_id=fila['id'],
+            centro_atencion_id=fila['centro_atencion_id'],
+            clave=_clave(fila['dni']),
+            texto=_texto(nombre, fila['dni']),
+            etiqueta=f"{fila['dni']} - {nombre}"[:255],
+            fecha=timezone.localtime(fila['fecha_creacion']).date(),
+        )
+
+
+def _entradas_muestras(muestras):
+    filas = muestras.values(
+        'id', 'numero_examen', 'fecha_examen', 'responsable_analisis', 'centro_atencion_id',
+        'expediente__dni', 'expediente__primer_nombre', 'expediente__segundo_nombre',
+        'expediente__primer_apellido', 'expediente__segundo_apellido',
+    )
+    for fila in filas.iterator(chunk_size=TAMANO_LOTE):
+        nombre = _nombre(fila, 'expediente__')
+        yield EntradaBusqueda(
+            tipo=TIPO_MUESTRA,
+            objeto_id=fila['id'],
+            centro_atencion_id=fila['centro_atencion_id'],
+            clave=_clave(fila['numero_examen']),
+            texto=_texto(fila['numero_examen'], fila['expediente__dni'], nombre, fila['responsable_analisis']),
+            etiqueta=f"{fila['numero_examen']} - {fila['expediente__dni']} - {nombre}"[:255],
+            fecha=fila['fecha_examen'],
+        )
+
+
+def _guardar(entradas):
+    """Inserta o actualiza (por tipo y objeto) las entradas en lotes; devuelve cuántas"""
+    total = 0
+    lote = []
+    for entrada in entradas:
+        lote.append(entrada)
+        if len(lote) == TAMANO_LOTE:
+            total += _guardar_lote(lote)
+            lote = []
+    if lote:
+        total += _guardar_lote(lote)
+    return total
+
+
+def _guardar_lote(lote):
+    EntradaBusqueda.objects.bulk_create(
+        lote,
+        update_conflicts=True,
+        unique_fields=['tipo', 'objeto_id'],
+        update_fields=['centro_atencion', 'clave', 'texto', 'etiqueta', 'fecha'],
+    )
+    return len(lote)
+
+
+def indexar_expedientes(expedientes):
+    """Actualiza las entradas de un queryset de expedientes"""
+    return _guardar(_entradas_expedientes(expedientes))
+
+
+def indexar_muestras(muestras):
+    """Actualiza las entradas de un queryset de muestras"""
+    return _guardar(_entradas_muestras(muestras))
+
+
+def desindexar(tipo, ids):
+    """Elimina las entradas de objetos eliminados"""
+    EntradaBusqueda.objects.filter(tipo=tipo, objeto_id__in=ids).delete()
+
+
+def reconstruir_indice():
+    """
+    Regenera todas las entradas y elimina las de objetos que ya no existen.
+    Devuelve {'expedientes', 'muestras', 'eliminadas'}.
+    """
+    crear_indice_texto()
+    resultado = {
+        'expedientes': indexar_expedientes(Expediente.objects.order_by()),
+        'muestras': indexar_muestras(Muestra.objects.order_by()),
+    }
+    resultado['eliminadas'] = (
+        EntradaBusqueda.objects.filter(tipo=TIPO_EXPEDIENTE)
+        .exclude(objeto_id__in=Expediente.objects.values('id')).delete()[0] +
+        EntradaBusqueda.objects.filter(tipo=TIPO_MUESTRA)
+        .exclude(objeto_id__in=Muestra.objects.values('id')).delete()[0]
+    )
+    if connections[DEFAULT_DB_ALIAS].vendor == 'sqlite' and indice_disponible():
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+    return resultado
+
+
+# ==================== CONSULTAS ====================
+
+def _terminos(texto):
+    return normalizar_nombre(texto).split()
+
+
+def _sql_coincidencias(terminos, using):
+    """
+    (sql, params) con columnas (id, puntaje) de las entradas cuyo texto
+    tiene todas las palabras como prefijo; menor puntaje = más relevante.
+    """
+    vendor = connections[using].vendor
+    if vendor == 'sqlite':
+        # Términos entre comillas: solo letras y dígitos, sin operadores de FTS5
+        consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+        return f'SELECT rowid AS id, bm25({TABLA_FTS}) AS puntaje FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta]
+    consulta = ' & '.join(f'{termino}:*' for termino in terminos)
+    return (
+        f"SELECT id, -ts_rank(vector, consulta) AS puntaje "
+        f"FROM {TABLA}, to_tsquery('simple', %s) consulta WHERE vector @@ consulta",
+        [consulta],
+    )
+
+
+def _filtro_texto(terminos, using):
+    """Q de las entradas cuyo texto coincide con todas las palabras"""
+    if indice_disponible(using):
+        sql, params = _sql_coincidencias(terminos, using)
+        return Q(pk__in=RawSQL(f'SELECT id FROM ({sql}) coincidencias', params))
+    filtro = Q()
+    for termino in terminos:
+        filtro &= Q(texto__startswith=termino) | Q(texto__contains=f' {termino}')
+    return filtro
+
+
+def _filtro_clave(texto):
+    """Q de las entradas cuya clave empieza por la del texto (solo si tiene dígitos)"""
+    clave = _clave(texto)
+    if len(clave) < LONGITUD_MINIMA or not any(caracter.isdigit() for caracter in clave):
+        return None
+    # Rango en lugar de LIKE: usa el índice (tipo, clave) en todos los motores
+    return Q(clave__gte=clave, clave__lt=clave + '\uffff'), clave
+
+
+def filtrar(queryset, texto):
+    """
+    Filtra un queryset de Expediente o Muestra por el texto buscado
+    (búsqueda del admin). Sin palabras que buscar se devuelve igual.
+    """
+    terminos = _terminos(texto)
+    if not terminos:
+        return queryset
+    tipo = TIPO_EXPEDIENTE if queryset.model is Expediente else TIPO_MUESTRA
+    coincide = _filtro_texto(terminos, queryset.db)
+    por_clave = _filtro_clave(texto)
+    if por_clave:
+        coincide |= por_clave[0]
+    entradas = EntradaBusqueda.objects.using(queryset.db).filter(coincide, tipo=tipo)
+    return queryset.filter(pk__in=entradas.values('objeto_id'))
+
+
+def _ids_por_relevancia(terminos, tipos, centros, excluir, limite):
+    """
+    Ids de las entradas que coinciden con las palabras, de más a menos
+    relevante. Las coincidencias se materializan primero: si no, SQLite
+    recorre las entradas del alcance y consulta el índice FTS por cada una.
+    """
+    sql, params = _sql_coincidencias(terminos, DEFAULT_DB_ALIAS)
+    condiciones = [f'entrada.tipo IN ({", ".join(["%s"] * len(tipos))})']
+    params += list(tipos)
+    if excluir:
+        condiciones.append(f'entrada.id NOT IN ({", ".join(["%s"] * len(excluir))})')
+        params += list(excluir)
+    if centros is not None:
+        sql_centros, params_centros = centros.values('pk').query.sql_with_params()
+        condiciones.append(f'entrada.centro_atencion_id IN ({sql_centros})')
+        params += list(params_centros)
+
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(
+            f'WITH coincidencias AS MATERIALIZED ({sql}) '
+            f'SELECT coincidencias.id FROM coincidencias '
+            f'JOIN {TABLA} entrada ON entrada.id = coincidencias.id '
+            f'WHERE {" AND ".join(condiciones)} '
+            f'ORDER BY coincidencias.puntaje, entrada.fecha DESC, coincidencias.id DESC LIMIT %s',
+            params + [limite],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def buscar(texto, tipos=(TIPO_EXPEDIENTE, TIPO_MUESTRA), centros=None, limite=LIMITE_RESULTADOS):
+    """
+    Entradas (EntradaBusqueda) más relevantes para el texto, para el
+    autocompletar. `centros` limita los centros de atención (queryset).
+    """
+    terminos = _terminos(texto)
+    tipos = list(tipos)
+    if not terminos or not tipos or len(''.join(terminos)) < LONGITUD_MINIMA:
+        return []
+
+    entradas = EntradaBusqueda.objects.filter(tipo__in=tipos)
+    if centros is not None:
+        entradas = entradas.filter(centro_atencion__in=centros)
+
+    resultados = []
+    por_clave = _filtro_clave(texto)
+    if por_clave:
+        filtro, clave = por_clave
+        resultados = list(
+            entradas.filter(filtro)
+            .annotate(exacta=Case(When(clave=clave, then=Value(0)), default=Value(1), output_field=IntegerField()))
+            .order_by('exacta', '-fecha', '-id')[:limite]
+        )
+
+    faltan = limite - len(resultados)
+    if faltan > 0:
+        vistos = [entrada.pk for entrada in resultados]
+        if indice_disponible():
+            ids = _ids_por_relevancia(terminos, tipos, centros, vistos, faltan)
+            por_id = EntradaBusqueda.objects.in_bulk(ids)
+            resultados += [por_id[pk] for pk in ids if pk in por_id]
+        else:
+            resultados += list(
+                entradas.exclude(pk__in=vistos)
+                .filter(_filtro_texto(terminos, DEFAULT_DB_ALIAS))
+                .order_by('-fecha', '-id')[:faltan]
+            )
+
+    return resultados
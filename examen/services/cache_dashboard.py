@@ -0,0 +1,166 @@
+# examen/services/cache_dashboard.py
+"""
+Cache de snapshots de los dashboards por alcance.
+
+Alcances: 'nacional', 'region' (por id) y 'centro' (por id).
+
+- Cada alcance tiene un número de versión en la BD (VersionDashboard; la
+  cache puede descartar entradas y la versión no debe perderse). Guardar o
+  eliminar una Muestra incrementa la versión de los alcances afectados
+  (invalidar_por_centros).
+- Un snapshot guarda la versión con la que se calculó; si ya no coincide
+  está desactualizado, pero se sigue sirviendo mientras una sola petición
+  lo recalcula (stale-while-revalidate).
+- Si no existe snapshot se calcula en la misma petición.
+
+Los widgets de la API (services.widgets) se cachean igual, un snapshot por
+(widget, alcance), y comparten la versión del alcance.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.query import QuerySet
+
+from examen.models import CentroAtencion, VersionDashboard
+from .dashboard import contexto_nacional, contexto_regional, contexto_centro
+from .widgets import WIDGETS
+
+
+ALIAS_CACHE = getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'dashboard')
+
+# Tiempo máximo (segundos) que una petición puede tener tomado el recálculo
+TIEMPO_BLOQUEO = getattr(settings, 'DASHBOARD_CACHE_TIEMPO_BLOQUEO', 300)
+
+# Si es False el recálculo de un snapshot desactualizado se hace en la misma petición
+REVALIDAR_EN_SEGUNDO_PLANO = getattr(settings, 'DASHBOARD_CACHE_REVALIDAR_EN_SEGUNDO_PLANO', True)
+
+CALCULOS = {
+    'nacional': contexto_nacional,
+    'region': contexto_regional,
+    'centro': contexto_centro,
+}
+
+
+def _cache():
+    return caches[ALIAS_CACHE]
+
+
+def clave_alcance(alcance, objeto_id=None):
+    """'nacional', 'region:5', 'centro:12'"""
+    if alcance == 'nacional':
+        return 'nacional'
+    return f'{alcance}:{objeto_id}'
+
+
+def _version(clave):
+    return VersionDashboard.objects.filter(clave=clave).values_list('version', flat=True).first() or 0
+
+
+def _materializar(context):
+    """Evalúa los querysets del contexto para que el snapshot sea serializable"""
+    return {
+        k: list(v) if isinstance(v, QuerySet) else v
+        for k, v in context.items()
+    }
+
+
+def _recalcular(clave, clave_snapshot, calcular):
+    # La versión se lee ANTES de calcular: si llega una invalidación durante
+    # el cálculo, el snapshot quedará marcado como desactualizado.
+    version = _version(clave)
+    datos = calcular()
+
+    _cache().set(f'dashboard:snapshot:{clave_snapshot}', {'version': version, 'context': datos}, None)
+    _cache().delete(f'dashboard:bloqueo:{clave_snapshot}')
+    return datos
+
+
+def _recalcular_en_hilo(clave, clave_snapshot, calcular):
+    try:
+        _recalcular(clave, clave_snapshot, calcular)
+    finally:
+        connection.close()
+
+
+def _obtener(clave, clave_snapshot, calcular):
+    """Snapshot vigente, o el desactualizado mientras se recalcula (stale-while-revalidate)"""
+    snapshot = _cache().get(f'dashboard:snapshot:{clave_snapshot}')
+
+    if snapshot is None:
+        return _recalcular(clave, clave_snapshot, calcular)
+
+    if snapshot['version'] != _version(clave):
+        # Desactualizado: solo la petición que obtiene el bloqueo recalcula
+        if _cache().add(f'dashboard:bloqueo:{clave_snapshot}', 1, TIEMPO_BLOQUEO):
+            if not REVALIDAR_EN_SEGUNDO_PLANO:
+                return _recalcular(clave, clave_snapshot, calcular)
+            threading.Thread(
+                target=_recalcular_en_hilo, args=(clave, clave_snapshot, calcular), daemon=True
+            ).start()
+
+    return snapshot['context']
+
+
+def _calculo_contexto(alcance, objeto):
+    args = () if alcance == 'nacional' else (objeto,)
+    return lambda: _materializar(CALCULOS[alcance](*args))
+
+
+def recalcular_contexto(alcance, objeto=None):
+    """Calcula y guarda el snapshot de un alcance. Devuelve el contexto."""
+    clave = clave_alcance(alcance, getattr(objeto, 'pk', None))
+    return _recalcular(clave, clave, _calculo_contexto(alcance, objeto))
+
+
+def obtener_contexto(alcance, objeto=None):
+    """
+    Devuelve el contexto del dashboard para un alcance ('nacional',
+    'region' + Region, 'centro' + CentroAtencion) usando el snapshot cacheado.
+    """
+    clave = clave_alcance(alcance, getattr(objeto, 'pk', None))
+    return _obtener(clave, clave, _calculo_contexto(alcance, objeto))
+
+
+def recalcular_widget(widget, alcance, objeto=None):
+    """Calcula y guarda el snapshot de un widget en un alcance. Devuelve sus datos."""
+    clave = clave_alcance(alcance, getattr(objeto, 'pk', None))
+    return _recalcular(clave, f'widget:{widget}:{clave}', lambda: WIDGETS[widget](alcance, objeto))
+
+
+def obtener_widget(widget, alcance, objeto=None):
+    """Datos de un widget (ver services.widgets.WIDGETS) usando el snapshot cacheado"""
+    clave = clave_alcance(alcance, getattr(objeto, 'pk', None))
+    return _obtener(clave, f'widget:{widget}:{clave}', lambda: WIDGETS[widget](alcance, objeto))
+
+
+def invalidar(*claves):
+    """Marca como desactualizados los snapshots de las claves indicadas"""
+    claves = sorted(set(claves))
+    with transaction.atomic():
+        # Crea en 0 las versiones que faltan y después incrementa todas. Las
+        # filas se bloquean en orden de clave: dos invalidaciones simultáneas
+        # no se esperan en círculo
+        VersionDashboard.objects.bulk_create(
+            [VersionDashboard(clave=clave) for clave in claves], ignore_conflicts=True
+        )
+        ids = list(
+            VersionDashboard.objects.select_for_update()
+            .filter(clave__in=claves).order_by('clave').values_list('id', flat=True)
+        )
+        VersionDashboard.objects.filter(id__in=ids).update(version=F('version') + 1)
+
+
+def invalidar_por_centros(centro_ids):
+    """Invalida el alcance nacional y los de los centros y sus regiones"""
+    centro_ids = {centro_id for centro_id in centro_ids if centro_id}
+    regiones_ids = set(
+        CentroAtencion.objects.filter(id__in=centro_ids).values_list('region_id', flat=True)
+    )
+    invalidar(
+        clave_alcance('nacional'),
+        *[clave_alcance('region', region_id) for region_id in regiones_ids],
+        *[clave_alcance('centro', centro_id) for centro_id in centro_ids],
+    )
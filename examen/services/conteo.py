@@ -0,0 +1,84 @@
+# examen/services/conteo.py
+"""
+Conteos aproximados para los listados de tablas grandes (admin de Muestra
+y Expediente con ADMIN_TABLAS_GRANDES).
+
+Un COUNT(*) exacto sobre millones de filas recorre toda la tabla o todo un
+índice en cada página. En su lugar:
+
+- Sin filtros: las filas que el motor guarda en sus estadísticas
+  (pg_class.reltuples en PostgreSQL; sqlite_stat1 en SQLite, si se corrió
+  ANALYZE).
+- Con filtros, en PostgreSQL: la estimación del planificador (EXPLAIN).
+- Si no hay estimación o es menor que CONTEO_MAXIMO se cuenta de verdad,
+  pero como máximo CONTEO_MAXIMO + 1 filas.
+"""
+import json
+
+from django.db import DatabaseError, connections, transaction
+
+
+CONTEO_MAXIMO = 10000
+
+# Tipos de conteo devueltos por conteo_estimado
+EXACTO = 'exacto'
+ESTIMADO = 'estimado'
+MINIMO = 'minimo'
+
+
+def _filas_en_estadisticas(queryset, connection):
+    """Filas de la tabla según las estadísticas del motor, o None"""
+    tabla = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [tabla])
+        elif connection.vendor == 'sqlite':
+            # La primera cifra de `stat` es el número de filas del índice (= de la tabla)
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [tabla])
+        else:
+            return None
+        fila = cursor.fetchone()
+    if not fila or fila[0] is None:
+        return None
+    filas = int(str(fila[0]).split()[0])
+    # reltuples es -1 en una tabla que nunca se analizó
+    return filas if filas >= 0 else None
+
+
+def _filas_segun_planificador(queryset, connection):
+    """Filas que PostgreSQL estima para la consulta, o None"""
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def conteo_estimado(queryset):
+    """
+    (total, tipo) de un queryset. tipo es EXACTO, ESTIMADO (según las
+    estadísticas) o MINIMO (hay más de `total` filas).
+    """
+    connection = connections[queryset.db]
+    try:
+        # Punto de guardado: un error no debe abortar la transacción en curso
+        with transaction.atomic(using=queryset.db):
+            if queryset.query.where:
+                estimado = _filas_segun_planificador(queryset, connection)
+            else:
+                estimado = _filas_en_estadisticas(queryset, connection)
+    except DatabaseError:
+        # Sin permisos sobre el catálogo o sin tabla sqlite_stat1
+        estimado = None
+
+    if estimado is not None and estimado > CONTEO_MAXIMO:
+        return estimado, ESTIMADO
+
+    total = queryset.order_by()[:CONTEO_MAXIMO + 1].count()
+    if total > CONTEO_MAXIMO:
+        return CONTEO_MAXIMO, MINIMO
+    return total, EXACTO
@@ -0,0 +1,428 @@
+# examen/services/dashboard.py
+"""
+Motor de agregación para los dashboards.
+
+Calcula los datos de cada dashboard con pocas consultas agrupadas usando
+conteos condicionales (Count con filter=Q(...)) sobre la máscara de
+parásitos, en lugar de un .count() por región, parásito y departamento.
+"""
+from datetime import date
+from itertools import combinations
+
+from django.db.models import Count, F, Q, Sum
+from django.db.models.lookups import GreaterThan
+
+from examen.models import (
+    Muestra,
+    SemanaEpidemiologica,
+    EstadisticaSemanalCentro,
+    CentroAtencion,
+    Region,
+    Departamento,
+)
+from examen.parasitos import CHOICES, POR_CAMPO, en_mascara
+
+
+# (campo del modelo, nombre legible) de los 21 parásitos
+PARASITOS = CHOICES
+
+
+# ==================== HELPERS ====================
+
+def calcular_tasa(positivas, total):
+    """Porcentaje de positividad redondeado a 2 decimales"""
+    return round((positivas / total * 100), 2) if total > 0 else 0
+
+
+def clasificar_intensidad(tasa):
+    """Devuelve (intensidad, color) para pintar una región en el mapa"""
+    if tasa >= 15:
+        return 'alta', '#dc3545'
+    elif tasa >= 8:
+        return 'media', '#ffc107'
+    elif tasa > 0:
+        return 'baja', '#28a745'
+    return 'sin-datos', '#e9ecef'
+
+
+def filtro_parasito(campo):
+    """Q para muestras que tienen el parásito presente (bit activo en la máscara)"""
+    return Q(GreaterThan(F('mascara_parasitos').bitand(POR_CAMPO[campo].mascara), 0))
+
+
+def _conteos_condicionales():
+    """
+    Anotaciones para contar en una sola pasada: total, positivas, negativas
+    y muestras positivas por cada uno de los 21 parásitos.
+    """
+    conteos = {
+        'total': Count('id'),
+        'positivas': Count('id', filter=Q(resultado='POS')),
+        'negativas': Count('id', filter=Q(resultado='NEG')),
+    }
+    for campo, _ in PARASITOS:
+        conteos[campo] = Count('id', filter=Q(resultado='POS') & filtro_parasito(campo))
+    return conteos
+
+
+def _vacio():
+    """Fila de agregados en cero (región o departamento sin muestras)"""
+    fila = {'total': 0, 'positivas': 0, 'negativas': 0}
+    fila.update({campo: 0 for campo, _ in PARASITOS})
+    return fila
+
+
+# ==================== SECCIONES ====================
+
+def resumen_general(muestras):
+    """
+    Totales generales y conteo por parásito de un queryset de muestras.
+    Una sola consulta.
+    """
+    return muestras.aggregate(**_conteos_condicionales())
+
+
+def agregados_por_region(muestras):
+    """
+    Agregados agrupados por región del centro de atención.
+    Devuelve {region_id: fila}. Una sola consulta.
+    """
+    filas = muestras.order_by().values('centro_atencion__region').annotate(
+        **_conteos_condicionales()
+    )
+    return {fila.pop('centro_atencion__region'): fila for fila in filas}
+
+
+def _ordenar_top(conteos, top):
+    """[(nombre, count)] de mayor a menor, sin ceros, limitado a `top`"""
+    return sorted(
+        ((nombre, count) for nombre, count in conteos.items() if count),
+        key=lambda x: x[1],
+        reverse=True,
+    )[:top]
+
+
+def top_parasitos(muestras, top=5, ultimas=None, semanas=None, desde=None, hasta=None):
+    """
+    Top de parásitos de un queryset de muestras (un alcance) en una ventana:
+
+    - ultimas=N: las últimas N muestras positivas. Lee solo la máscara de
+      parásitos de esas N filas (values_list, sin instanciar modelos).
+    - semanas=K / desde / hasta: muestras positivas de las últimas K semanas
+      epidemiológicas o de un rango de fechas. Se cuenta en la base de datos
+      con una sola consulta de conteos condicionales.
+
+    Devuelve [(nombre, count)] de mayor a menor.
+    """
+    positivas = muestras.filter(resultado='POS')
+
+    if ultimas is not None:
+        mascaras = positivas.order_by('-fecha_examen').values_list(
+            'mascara_parasitos', flat=True
+        )[:ultimas]
+
+        parasitos_count = {}
+        for mascara in mascaras:
+            for parasito in en_mascara(mascara):
+                parasitos_count[parasito.nombre] = parasitos_count.get(parasito.nombre, 0) + 1
+        return _ordenar_top(parasitos_count, top)
+
+    if semanas:
+        inicio = SemanaEpidemiologica.objects.filter(
+            fecha_inicio__lte=hasta or date.today()
+        ).order_by('-fecha_inicio').values_list('fecha_inicio', flat=True)[semanas - 1:semanas].first()
+        if inicio and (desde is None or inicio > desde):
+            desde = inicio
+    if desde:
+        positivas = positivas.filter(fecha_examen__gte=desde)
+    if hasta:
+        positivas = positivas.filter(fecha_examen__lte=hasta)
+
+    conteos = positivas.aggregate(**{
+        campo: Count('id', filter=filtro_parasito(campo)) for campo, _ in PARASITOS
+    })
+    return _ordenar_top({nombre: conteos[campo] for campo, nombre in PARASITOS}, top)
+
+
+def coocurrencia_parasitos(muestras):
+    """
+    Número de muestras en que aparecen juntos cada par de parásitos.
+    Agrupa por máscara (una consulta) y expande los pares en Python.
+    Devuelve {(nombre_a, nombre_b): muestras}.
+    """
+    grupos = muestras.filter(mascara_parasitos__gt=0).order_by().values(
+        'mascara_parasitos'
+    ).annotate(n=Count('id'))
+
+    pares = {}
+    for grupo in grupos:
+        presentes = [parasito.nombre for parasito in en_mascara(grupo['mascara_parasitos'])]
+        for par in combinations(presentes, 2):
+            pares[par] = pares.get(par, 0) + grupo['n']
+    return pares
+
+
+def series_semanales_nacionales(limite=12):
+    """Etiquetas, positivas y negativas de las últimas semanas (orden cronológico)"""
+    semanas = SemanaEpidemiologica.objects.filter(
+        total_muestras__gt=0
+    ).order_by('-año', '-semana')[:limite]
+
+    semanas_labels = []
+    semanas_positivas = []
+    semanas_negativas = []
+
+    for semana in reversed(list(semanas)):
+        semanas_labels.append(f"Sem {semana.semana}")
+        semanas_positivas.append(semana.total_positivas)
+        semanas_negativas.append(semana.total_negativas)
+
+    return semanas_labels, semanas_positivas, semanas_negativas
+
+
+def series_semanales_por_centros(limite=12, **filtro):
+    """
+    Series de las últimas semanas con muestras para un conjunto de centros,
+    desde EstadisticaSemanalCentro. Una sola consulta indexada.
+    Ejemplo: series_semanales_por_centros(centro_atencion__region=region)
+    """
+    filas = EstadisticaSemanalCentro.objects.filter(
+        total_muestras__gt=0, **filtro
+    ).order_by().values('semana__año', 'semana__semana').annotate(
+        positivas=Sum('total_positivas'),
+        negativas=Sum('total_negativas'),
+    ).order_by('-semana__año', '-semana__semana')[:limite]
+
+    semanas_labels = []
+    semanas_positivas = []
+    semanas_negativas = []
+
+    for fila in reversed(list(filas)):
+        semanas_labels.append(f"Sem {fila['semana__semana']}")
+        semanas_positivas.append(fila['positivas'])
+        semanas_negativas.append(fila['negativas'])
+
+    return semanas_labels, semanas_positivas, semanas_negativas
+
+
+# ==================== CONTEXTO NACIONAL ====================
+
+def contexto_nacional():
+    """
+    Calcula el contexto completo de dashboard_nacional.
+    Devuelve las mismas claves que consume dashboard_nacional.html.
+    """
+    muestras = Muestra.objects.all()
+
+    # === ESTADÍSTICAS GENERALES Y CONTEO DE LOS 21 PARÁSITOS (1 consulta) ===
+    general = resumen_general(muestras)
+    total_muestras = general['total']
+    total_positivas = general['positivas']
+    total_negativas = general['negativas']
+    tasa_positividad = calcular_tasa(total_positivas, total_muestras)
+
+    # === TOP 5 PARÁSITOS (últimas 100 muestras positivas) ===
+    top_recientes = top_parasitos(muestras, ultimas=100)
+    top_5_nombres = [p[0] for p in top_recientes] if top_recientes else []
+
+    # === AGREGADOS POR REGIÓN (1 consulta) ===
+    por_region = agregados_por_region(muestras)
+    regiones = list(Region.objects.filter(activo=True).order_by('numero_region'))
+    nombre_a_campo = {nombre: campo for campo, nombre in PARASITOS}
+
+    matriz_region_parasito = []
+    totales_por_parasito = {parasito: 0 for parasito in top_5_nombres}
+    regiones_data = []
+    mapa_regiones_data = []
+
+    for region in regiones:
+        fila_region = por_region.get(region.id) or _vacio()
+        total = fila_region['total']
+        positivas = fila_region['positivas']
+        tasa = calcular_tasa(positivas, total)
+
+        # Matriz región x parásito (top 5)
+        fila = {
+            'region': region,
+            'parasitos': {},
+            'total': positivas,
+        }
+        for parasito in top_5_nombres:
+            count = fila_region[nombre_a_campo[parasito]]
+            fila['parasitos'][parasito] = count
+            totales_por_parasito[parasito] += count
+        matriz_region_parasito.append(fila)
+
+        regiones_data.append({
+            'region': region,
+            'total_muestras': total,
+            'total_positivas': positivas,
+            'tasa_positividad': tasa,
+        })
+
+        intensidad, color = clasificar_intensidad(tasa)
+        mapa_regiones_data.append({
+            'numero': region.numero_region,
+            'nombre': region.nombre,
+            'total_muestras': total,
+            'total_positivas': positivas,
+            'tasa_positividad': tasa,
+            'intensidad': intensidad,
+            'color': color,
+            'es_metropolitana': region.es_metropolitana,
+        })
+
+    # === CONTEO COMPLETO DE LOS 21 PARÁSITOS ===
+    todos_parasitos = []
+    for campo, nombre in PARASITOS:
+        count = general[campo]
+        todos_parasitos.append({
+            'nombre': nombre,
+            'total': count,
+            'porcentaje': calcular_tasa(count, total_positivas),
+        })
+    todos_parasitos = sorted(todos_parasitos, key=lambda x: x['total'], reverse=True)
+
+    # === MAPA POR DEPARTAMENTO (se deriva de los agregados por región) ===
+    por_departamento = {}
+    for region in regiones:
+        if region.departamento_id is None or region.id not in por_region:
+            continue
+        acumulado = por_departamento.setdefault(region.departamento_id, _vacio())
+        for clave, valor in por_region[region.id].items():
+            acumulado[clave] += valor
+
+    mapa_departamentos_data = []
+    for departamento in Departamento.objects.all().order_by('codigo'):
+        fila_depto = por_departamento.get(departamento.id) or _vacio()
+        total = fila_depto['total']
+        positivas = fila_depto['positivas']
+
+        top_parasitos_depto = []
+        if positivas > 0:
+            parasitos_depto = [
+                (nombre, fila_depto[campo])
+                for campo, nombre in PARASITOS
+                if fila_depto[campo] > 0
+            ]
+            top_parasitos_depto = sorted(parasitos_depto, key=lambda x: x[1], reverse=True)[:3]
+
+        mapa_departamentos_data.append({
+            'codigo': departamento.codigo,
+            'nombre': departamento.nombre,
+            'total_muestras': total,
+            'total_positivas': positivas,
+            'tasa_positividad': calcular_tasa(positivas, total),
+            'top_parasitos': top_parasitos_depto,
+        })
+
+    # === ÚLTIMAS 12 SEMANAS EPIDEMIOLÓGICAS ===
+    semanas_labels, semanas_positivas, semanas_negativas = series_semanales_nacionales()
+
+    # === TOP 10 CENTROS MÁS ACTIVOS ===
+    top_centros = CentroAtencion.objects.select_related('region').annotate(
+        num_muestras=Count('muestras')
+    ).filter(num_muestras__gt=0).order_by('-num_muestras')[:10]
+
+    # === ÚLTIMAS 10 MUESTRAS ===
+    ultimas_muestras_list = Muestra.objects.select_related(
+        'expediente', 'centro_atencion', 'semana_epidemiologica'
+    ).order_by('-fecha_examen')[:10]
+
+    return {
+        'total_muestras': total_muestras,
+        'total_positivas': total_positivas,
+        'total_negativas': total_negativas,
+        'tasa_positividad': tasa_positividad,
+        'top_parasitos': top_recientes,
+        'top_5_nombres': top_5_nombres,
+        'matriz_region_parasito': matriz_region_parasito,
+        'totales_por_parasito': totales_por_parasito,
+        'regiones_data': regiones_data,
+        'semanas_labels': semanas_labels,
+        'semanas_positivas': semanas_positivas,
+        'semanas_negativas': semanas_negativas,
+        'top_centros': top_centros,
+        'ultimas_muestras': ultimas_muestras_list,
+        'todos_parasitos': todos_parasitos,
+        'mapa_regiones_data': mapa_regiones_data,
+        'mapa_departamentos_data': mapa_departamentos_data,
+    }
+
+
+# ==================== CONTEXTO REGIONAL Y DE CENTRO ====================
+
+def _resumen_basico(muestras):
+    """total / positivas / negativas / tasa de un queryset en una sola consulta"""
+    totales = muestras.aggregate(
+        total=Count('id'),
+        positivas=Count('id', filter=Q(resultado='POS')),
+        negativas=Count('id', filter=Q(resultado='NEG')),
+    )
+    return {
+        'total_muestras': totales['total'],
+        'total_positivas': totales['positivas'],
+        'total_negativas': totales['negativas'],
+        'tasa_positividad': calcular_tasa(totales['positivas'], totales['total']),
+    }
+
+
+def contexto_regional(region):
+    """Calcula el contexto de dashboard_regional para una región"""
+    muestras_region = Muestra.objects.filter(centro_atencion__region=region)
+
+    # === ESTADÍSTICAS DE LA REGIÓN ===
+    context = {'region': region}
+    context.update(_resumen_basico(muestras_region))
+
+    # === TOP 5 PARÁSITOS DE LA REGIÓN ===
+    context['top_parasitos'] = top_parasitos(muestras_region, ultimas=100)
+
+    # === ÚLTIMAS 12 SEMANAS (desde EstadisticaSemanalCentro) ===
+    semanas_labels, semanas_positivas, semanas_negativas = series_semanales_por_centros(
+        centro_atencion__region=region
+    )
+    context['semanas_labels'] = semanas_labels
+    context['semanas_positivas'] = semanas_positivas
+    context['semanas_negativas'] = semanas_negativas
+
+    # === CENTROS DE LA REGIÓN ===
+    context['centros'] = CentroAtencion.objects.filter(
+        region=region
+    ).annotate(
+        num_muestras=Count('muestras')
+    ).order_by('-num_muestras')
+
+    # === ÚLTIMAS 10 MUESTRAS DE LA REGIÓN ===
+    context['ultimas_muestras'] = muestras_region.select_related(
+        'expediente', 'centro_atencion', 'semana_epidemiologica'
+    ).order_by('-fecha_examen')[:10]
+
+    return context
+
+
+def contexto_centro(centro):
+    """Calcula el contexto de dashboard_centro para un centro de atención"""
+    muestras_centro = Muestra.objects.filter(centro_atencion=centro)
+
+    # === ESTADÍSTICAS DEL CENTRO ===
+    context = {'centro': centro}
+    context.update(_resumen_basico(muestras_centro))
+
+    # === TOP 5 PARÁSITOS DEL CENTRO ===
+    context['top_parasitos'] = top_parasitos(muestras_centro, ultimas=50)
+
+    # === ÚLTIMAS 12 SEMANAS (desde EstadisticaSemanalCentro) ===
+    semanas_labels, semanas_positivas, semanas_negativas = series_semanales_por_centros(
+        centro_atencion=centro
+    )
+    context['semanas_labels'] = semanas_labels
+    context['semanas_positivas'] = semanas_positivas
+    context['semanas_negativas'] = semanas_negativas
+
+    # === ÚLTIMAS 10 MUESTRAS DEL CENTRO ===
+    context['ultimas_muestras'] = muestras_centro.select_related(
+        'expediente', 'semana_epidemiologica'
+    ).order_by('-fecha_examen')[:10]
+
+    return context
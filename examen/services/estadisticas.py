@@ -0,0 +1,325 @@
+# examen/services/estadisticas.py
+"""
+Estadísticas semanales cacheadas.
+
+- SemanaEpidemiologica: totales nacionales por semana.
+- EstadisticaSemanalCentro: totales por (semana, centro); los totales
+  regionales se derivan sumando los centros de la región.
+
+Al guardar o eliminar una muestra solo se suma la diferencia entre su estado
+anterior y el actual (UPDATE ... SET total = total + delta); los recálculos
+completos quedan para reconciliar_estadisticas y services.reconstruccion.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from examen.models import Muestra, SemanaEpidemiologica, EstadisticaSemanalCentro
+
+
+CONTADORES = ('total_muestras', 'total_positivas', 'total_negativas')
+
+# Inserción o actualización por par (INSERT ... ON CONFLICT DO UPDATE en
+# PostgreSQL y SQLite): evita leer las filas existentes y la carrera entre
+# dos transacciones que crean el mismo par
+_UPSERT_PAR = {
+    'update_conflicts': True,
+    'unique_fields': ['semana', 'centro_atencion'],
+    'update_fields': [*CONTADORES, 'fecha_actualizacion'],
+}
+
+# Pares (semana, centro) por sentencia al filtrar con OR
+PARES_POR_CONSULTA = 200
+
+
+# ==================== DELTAS ====================
+
+def claves_estadisticas(estado):
+    """
+    Contadores (semana_id, centro_id, campo) a los que aporta una muestra,
+    a partir de su estado capturado (Muestra.capturar_estado).
+    """
+    if not estado or not estado['semana_epidemiologica_id']:
+        return []
+    par = (estado['semana_epidemiologica_id'], estado['centro_atencion_id'])
+    claves = [(*par, 'total_muestras')]
+    if estado['resultado'] == 'POS':
+        claves.append((*par, 'total_positivas'))
+    elif estado['resultado'] == 'NEG':
+        claves.append((*par, 'total_negativas'))
+    return claves
+
+
+def deltas_estadisticas(anterior, actual):
+    """
+    Counter {(semana_id, centro_id, campo): delta} entre dos estados de una muestra.
+    Para una muestra nueva `anterior` es None; para una eliminada `actual` es None.
+    """
+    deltas = Counter()
+    for clave in claves_estadisticas(anterior):
+        deltas[clave] -= 1
+    for clave in claves_estadisticas(actual):
+        deltas[clave] += 1
+    return deltas
+
+
+def aplicar_delta_estadisticas(anterior, actual):
+    """Aplica la diferencia entre dos estados de una muestra a los contadores semanales"""
+    aplicar_deltas_estadisticas(deltas_estadisticas(anterior, actual))
+
+
+def _incrementos(delta, ahora):
+    return dict(
+        {campo: F(campo) + valor for campo, valor in delta},
+        fecha_actualizacion=ahora,
+    )
+
+
+def aplicar_deltas_estadisticas(deltas):
+    """
+    Suma {(semana_id, centro_id, campo): delta} acumulado de muchas muestras a
+    EstadisticaSemanalCentro y a los totales nacionales de SemanaEpidemiologica.
+
+    Los pares y semanas con los mismos incrementos comparten un UPDATE con F();
+    los pares sin fila se crean con una sola inserción.
+    """
+    por_par = {}
+    por_semana = {}
+    for (semana_id, centro_id, campo), delta in deltas.items():
+        if delta:
+            por_par.setdefault((semana_id, centro_id), Counter())[campo] += delta
+            por_semana.setdefault(semana_id, Counter())[campo] += delta
+
+    if not por_par:
+        return
+
+    ahora = timezone.now()
+
+    grupos_semana = {}
+    for semana_id, delta in por_semana.items():
+        delta = tuple(sorted((campo, valor) for campo, valor in delta.items() if valor))
+        if delta:
+            grupos_semana.setdefault(delta, []).append(semana_id)
+    for delta, semana_ids in grupos_semana.items():
+        SemanaEpidemiologica.objects.filter(id__in=semana_ids).update(**_incrementos(delta, ahora))
+
+    grupos_par = {}
+    for par, delta in por_par.items():
+        delta = tuple(sorted((campo, valor) for campo, valor in delta.items() if valor))
+        if delta:
+            grupos_par.setdefault(delta, []).append(par)
+
+    faltantes = {}
+    for delta, pares in grupos_par.items():
+        for inicio in range(0, len(pares), PARES_POR_CONSULTA):
+            tramo = pares[inicio:inicio + PARES_POR_CONSULTA]
+            filtro = Q()
+            for semana_id, centro_id in tramo:
+                filtro |= Q(semana_id=semana_id, centro_atencion_id=centro_id)
+            actualizadas = EstadisticaSemanalCentro.objects.filter(filtro).update(**_incrementos(delta, ahora))
+            if actualizadas < len(tramo):
+                existentes = set(EstadisticaSemanalCentro.objects.filter(filtro).values_list(
+                    'semana_id', 'centro_atencion_id'
+                ))
+                faltantes.update({par: dict(delta) for par in tramo if par not in existentes})
+
+    # Un par sin fila solo puede recibir altas; las bajas indican deriva y
+    # las corrige `manage.py reconciliar_estadisticas`
+    nuevas = [
+        EstadisticaSemanalCentro(
+            semana_id=semana_id,
+            centro_atencion_id=centro_id,
+            **{campo: max(delta.get(campo, 0), 0) for campo in CONTADORES},
+        )
+        for (semana_id, centro_id), delta in faltantes.items()
+        if any(valor > 0 for valor in delta.values())
+    ]
+    if not nuevas:
+        return
+    try:
+        with transaction.atomic():
+            EstadisticaSemanalCentro.objects.bulk_create(nuevas, batch_size=1000)
+    except IntegrityError:
+        # Otra transacción creó alguno de los pares: se recalculan desde las muestras
+        recalcular_pares((fila.semana_id, fila.centro_atencion_id) for fila in nuevas)
+
+
+# ==================== RECÁLCULO ====================
+
+def totales_por_par(muestras):
+    """{(semana_id, centro_id): (total, positivas, negativas)} de un queryset, en una consulta agrupada"""
+    return {
+        (grupo['semana_epidemiologica_id'], grupo['centro_atencion_id']): tuple(grupo[campo] for campo in CONTADORES)
+        for grupo in muestras.filter(
+            semana_epidemiologica__isnull=False
+        ).order_by().values('semana_epidemiologica_id', 'centro_atencion_id').annotate(
+            total_muestras=Count('id'),
+            total_positivas=Count('id', filter=Q(resultado='POS')),
+            total_negativas=Count('id', filter=Q(resultado='NEG')),
+        )
+    }
+
+
+def _contar(muestras):
+    """total / positivas / negativas de un queryset en una sola consulta"""
+    return muestras.aggregate(
+        total_muestras=Count('id'),
+        total_positivas=Count('id', filter=Q(resultado='POS')),
+        total_negativas=Count('id', filter=Q(resultado='NEG')),
+    )
+
+
+def recalcular_semana(semana_id):
+    """Recalcula los totales nacionales cacheados de una semana"""
+    semana = SemanaEpidemiologica.objects.filter(pk=semana_id).first()
+    if not semana:
+        return
+
+    totales = _contar(Muestra.objects.filter(semana_epidemiologica_id=semana_id))
+    semana.total_muestras = totales['total_muestras']
+    semana.total_positivas = totales['total_positivas']
+    semana.total_negativas = totales['total_negativas']
+    semana.save(update_fields=['total_muestras', 'total_positivas', 'total_negativas', 'fecha_actualizacion'])
+
+
+def recalcular_semana_centro(semana_id, centro_id):
+    """Recalcula (o crea) la fila de EstadisticaSemanalCentro de un par (semana, centro)"""
+    totales = _contar(Muestra.objects.filter(
+        semana_epidemiologica_id=semana_id,
+        centro_atencion_id=centro_id,
+    ))
+    EstadisticaSemanalCentro.objects.bulk_create(
+        [EstadisticaSemanalCentro(semana_id=semana_id, centro_atencion_id=centro_id, **totales)],
+        **_UPSERT_PAR,
+    )
+
+
+def recalcular_pares(claves):
+    """
+    Recalcula varios pares (semana_id, centro_id) y los totales nacionales de
+    sus semanas con una sola consulta agrupada por (semana, centro).
+    """
+    claves = set(claves)
+    if not claves:
+        return
+    semana_ids = {semana_id for semana_id, _ in claves}
+
+    grupos = Muestra.objects.filter(
+        semana_epidemiologica_id__in=semana_ids
+    ).order_by().values('semana_epidemiologica_id', 'centro_atencion_id').annotate(
+        total_muestras=Count('id'),
+        total_positivas=Count('id', filter=Q(resultado='POS')),
+        total_negativas=Count('id', filter=Q(resultado='NEG')),
+    )
+
+    por_par = {}
+    por_semana = {}
+    for grupo in grupos:
+        totales = (grupo['total_muestras'], grupo['total_positivas'], grupo['total_negativas'])
+        por_par[(grupo['semana_epidemiologica_id'], grupo['centro_atencion_id'])] = totales
+        acumulado = por_semana.setdefault(grupo['semana_epidemiologica_id'], [0, 0, 0])
+        for i, valor in enumerate(totales):
+            acumulado[i] += valor
+
+    ahora = timezone.now()
+    campos = ['total_muestras', 'total_positivas', 'total_negativas', 'fecha_actualizacion']
+
+    semanas = list(SemanaEpidemiologica.objects.filter(id__in=semana_ids))
+    for semana in semanas:
+        semana.total_muestras, semana.total_positivas, semana.total_negativas = por_semana.get(semana.id, (0, 0, 0))
+        semana.fecha_actualizacion = ahora
+
+    # En orden: dos transacciones que insertan los mismos pares no se bloquean mutuamente
+    filas = [
+        EstadisticaSemanalCentro(
+            semana_id=semana_id,
+            centro_atencion_id=centro_id,
+            fecha_actualizacion=ahora,
+            **dict(zip(CONTADORES, por_par.get((semana_id, centro_id), (0, 0, 0)))),
+        )
+        for semana_id, centro_id in sorted(claves)
+    ]
+
+    with transaction.atomic():
+        SemanaEpidemiologica.objects.bulk_update(semanas, campos, batch_size=500)
+        EstadisticaSemanalCentro.objects.bulk_create(filas, batch_size=1000, **_UPSERT_PAR)
+
+
+def reconciliar_estadisticas(semanas=None, tamano_bloque=52, reparar=True, al_procesar_bloque=None):
+    """
+    Compara los contadores guardados con los de las muestras, por bloques de
+    `tamano_bloque` semanas (una consulta agrupada por bloque), y con `reparar`
+    recalcula los pares con diferencias.
+
+    `semanas` limita el recorrido (queryset de SemanaEpidemiologica).
+    Devuelve {'semanas', 'pares', 'diferencias'}, donde diferencias es una
+    lista de (semana_id, centro_id o None, guardado, calculado); centro None
+    indica los totales nacionales de la semana.
+    """
+    if semanas is None:
+        semanas = SemanaEpidemiologica.objects.all()
+    semana_ids = list(semanas.order_by('id').values_list('id', flat=True))
+
+    resultado = {'semanas': 0, 'pares': 0, 'diferencias': []}
+    for inicio in range(0, len(semana_ids), tamano_bloque):
+        bloque = semana_ids[inicio:inicio + tamano_bloque]
+
+        calculados = totales_por_par(Muestra.objects.filter(semana_epidemiologica_id__in=bloque))
+        por_semana = {semana_id: (0, 0, 0) for semana_id in bloque}
+        for (semana_id, _), totales in calculados.items():
+            por_semana[semana_id] = tuple(a + b for a, b in zip(por_semana[semana_id], totales))
+
+        guardados = {
+            (fila[0], fila[1]): fila[2:]
+            for fila in EstadisticaSemanalCentro.objects.filter(
+                semana_id__in=bloque
+            ).values_list('semana_id', 'centro_atencion_id', *CONTADORES)
+        }
+
+        diferencias = []
+        for par in calculados.keys() | guardados.keys():
+            guardado = guardados.get(par)
+            calculado = calculados.get(par, (0, 0, 0))
+            if guardado != calculado and not (guardado is None and not any(calculado)):
+                diferencias.append((*par, guardado, calculado))
+
+        for semana_id, *guardado in SemanaEpidemiologica.objects.filter(
+            id__in=bloque
+        ).values_list('id', *CONTADORES):
+            if tuple(guardado) != por_semana[semana_id]:
+                diferencias.append((semana_id, None, tuple(guardado), por_semana[semana_id]))
+
+        if reparar and diferencias:
+            # recalcular_pares también recalcula los totales nacionales de sus semanas
+            nacionales = {semana_id for semana_id, centro_id, _, _ in diferencias if centro_id is None}
+            pares = {(semana_id, centro_id) for semana_id, centro_id, _, _ in diferencias if centro_id}
+            pares |= {par for par in calculados if par[0] in nacionales}
+            recalcular_pares(pares)
+            # Semanas con totales nacionales desfasados y sin muestras
+            for semana_id in nacionales - {semana_id for semana_id, _ in pares}:
+                recalcular_semana(semana_id)
+
+        resultado['semanas'] += len(bloque)
+        resultado['pares'] += len(calculados.keys() | guardados.keys())
+        resultado['diferencias'].extend(diferencias)
+
+        if al_procesar_bloque:
+            al_procesar_bloque(resultado)
+
+    return resultado
+
+
+def estadisticas_por_region(**filtro):
+    """
+    Totales por (semana, región) derivados de EstadisticaSemanalCentro.
+    Ejemplo: estadisticas_por_region(semana__año=2025)
+    """
+    return EstadisticaSemanalCentro.objects.filter(**filtro).order_by().values(
+        'semana_id', 'centro_atencion__region_id'
+    ).annotate(
+        total_muestras=Sum('total_muestras'),
+        total_positivas=Sum('total_positivas'),
+        total_negativas=Sum('total_negativas'),
+    )
@@ -0,0 +1,232 @@
+# examen/services/exportacion.py
+"""
+Exportación de muestras en streaming (NDJSON o CSV) para PowerBI y análisis.
+
+- La consulta se recorre con .iterator(chunk_size=TAMANO_BLOQUE) sobre
+  .values(): expediente, departamento, municipio, centro y región llegan en
+  la misma consulta (JOIN), sin una consulta por fila ni instancias de modelo.
+- Los textos de los choices y de los estadios salen de mapas precalculados.
+- La respuesta es un StreamingHttpResponse: la descarga empieza con el
+  primer bloque y la memoria no depende del número de muestras.
+
+NDJSON: un objeto por línea con la misma estructura que to_export_json (models.py).
+CSV: una fila por muestra con una columna por parásito (código de estadio
+traducido a su nombre), con BOM para que Excel y PowerBI detecten UTF-8.
+"""
+import csv
+import json
+from datetime import date
+
+from django.http import StreamingHttpResponse
+
+from examen.models import (
+    Expediente,
+    CONSISTENCIA_CHOICES,
+    MOCO_CHOICES,
+    PRESENCIA_CHOICES,
+    INTENSIDAD_CHOICES,
+    RESULTADO_CHOICES,
+)
+from examen.parasitos import PARASITOS
+
+
+# Filas leídas de la BD por viaje
+TAMANO_BLOQUE = 2000
+
+# Líneas por fragmento enviado al cliente
+LINEAS_POR_FRAGMENTO = 500
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CAMPOS_CONSULTA = (
+    'id',
+    'numero_examen',
+    'fecha_examen',
+    'responsable_analisis',
+    'expediente__dni',
+    'expediente__primer_nombre',
+    'expediente__segundo_nombre',
+    'expediente__primer_apellido',
+    'expediente__segundo_apellido',
+    'expediente__sexo',
+    'expediente__fecha_nacimiento',
+    'expediente__departamento__nombre',
+    'expediente__municipio__nombre',
+    'centro_atencion__codigo',
+    'centro_atencion__nombre',
+    'centro_atencion__es_regional',
+    'centro_atencion__region__numero_region',
+    'centro_atencion__region__nombre',
+    'consistencia',
+    'moco',
+    'sangre_macroscopica',
+    'resultado',
+    'ascaris_intensidad',
+    'observaciones',
+    *(parasito.campo for parasito in PARASITOS),
+)
+
+ENCABEZADO_CSV = (
+    'muestra_id', 'numero_examen', 'fecha_examen', 'responsable',
+    'dni', 'nombre_completo', 'sexo', 'edad', 'departamento', 'municipio',
+    'centro_codigo', 'centro_nombre', 'centro_es_regional', 'region_numero', 'region_nombre',
+    'consistencia', 'moco', 'sangre_macroscopica', 'resultado', 'ascaris_intensidad',
+    *(parasito.nombre for parasito in PARASITOS),
+    'observaciones',
+)
+
+_SEXO = dict(Expediente.SEXO_CHOICES)
+_CONSISTENCIA = dict(CONSISTENCIA_CHOICES)
+_MOCO = dict(MOCO_CHOICES)
+_PRESENCIA = dict(PRESENCIA_CHOICES)
+_INTENSIDAD = dict(INTENSIDAD_CHOICES)
+_RESULTADO = dict(RESULTADO_CHOICES)
+
+
+# ==================== FILAS ====================
+
+def _edad(nacimiento, hoy):
+    if not nacimiento:
+        return None
+    return hoy.year - nacimiento.year - ((hoy.month, hoy.day) < (nacimiento.month, nacimiento.day))
+
+
+def _nombre_completo(fila):
+    nombres = ' '.join(filter(None, (fila['expediente__primer_nombre'], fila['expediente__segundo_nombre'])))
+    apellidos = ' '.join(filter(None, (fila['expediente__primer_apellido'], fila['expediente__segundo_apellido'])))
+    return f'{nombres} {apellidos}'
+
+
+def registro_muestra(fila, hoy):
+    """Registro anidado de una muestra (fila de .values(*CAMPOS_CONSULTA))"""
+    return {
+        'muestra_id': fila['id'],
+        'numero_examen': fila['numero_examen'],
+        'fecha_examen': fila['fecha_examen'].isoformat(),
+        'responsable': fila['responsable_analisis'],
+        'expediente': {
+            'dni': fila['expediente__dni'],
+            'nombre_completo': _nombre_completo(fila),
+            'sexo': _SEXO.get(fila['expediente__sexo'], fila['expediente__sexo']),
+            'edad': _edad(fila['expediente__fecha_nacimiento'], hoy),
+            'departamento': fila['expediente__departamento__nombre'],
+            'municipio': fila['expediente__municipio__nombre'],
+        },
+        'centro_atencion': {
+            'codigo': fila['centro_atencion__codigo'],
+            'nombre': fila['centro_atencion__nombre'],
+            'es_regional': fila['centro_atencion__es_regional'],
+            'region': {
+                'numero': fila['centro_atencion__region__numero_region'],
+                'nombre': fila['centro_atencion__region__nombre'],
+            },
+        },
+        'examen_fisico': {
+            'consistencia': _CONSISTENCIA.get(fila['consistencia'], fila['consistencia']),
+            'moco': _MOCO.get(fila['moco'], fila['moco']),
+            'sangre_macroscopica': _PRESENCIA.get(fila['sangre_macroscopica'], fila['sangre_macroscopica']),
+        },
+        'resultado': {
+            'codigo': fila['resultado'],
+            'descripcion': _RESULTADO.get(fila['resultado'], fila['resultado']),
+        },
+        'parasitos_encontrados': {
+            parasito.nombre: parasito.nombre_estadio(fila[parasito.campo])
+            for parasito in PARASITOS
+            if fila[parasito.campo]
+        },
+        'kato_katz': {
+            'intensidad': _INTENSIDAD[fila['ascaris_intensidad']] if fila['ascaris_intensidad'] else None,
+        },
+        'observaciones': fila['observaciones'],
+    }
+
+
+def fila_csv(registro):
+    """Fila plana (en el orden de ENCABEZADO_CSV) de un registro de registro_muestra"""
+    expediente = registro['expediente']
+    centro = registro['centro_atencion']
+    examen = registro['examen_fisico']
+    parasitos = registro['parasitos_encontrados']
+    return (
+        registro['muestra_id'],
+        registro['numero_examen'],
+        registro['fecha_examen'],
+        registro['responsable'],
+        expediente['dni'],
+        expediente['nombre_completo'],
+        expediente['sexo'],
+        expediente['edad'],
+        expediente['departamento'] or '',
+        expediente['municipio'] or '',
+        centro['codigo'],
+        centro['nombre'],
+        'SI' if centro['es_regional'] else 'NO',
+        centro['region']['numero'],
+        centro['region']['nombre'],
+        examen['consistencia'],
+        examen['moco'],
+        examen['sangre_macroscopica'],
+        registro['resultado']['descripcion'],
+        registro['kato_katz']['intensidad'] or '',
+        *(parasitos.get(parasito.nombre, '') for parasito in PARASITOS),
+        registro['observaciones'],
+    )
+
+
+def registros(muestras):
+    """Genera los registros de un queryset de muestras sin cargarlo completo en memoria"""
+    hoy = date.today()
+    consulta = muestras.order_by('fecha_examen', 'id').values(*CAMPOS_CONSULTA)
+    for fila in consulta.iterator(chunk_size=TAMANO_BLOQUE):
+        yield registro_muestra(fila, hoy)
+
+
+# ==================== FORMATOS ====================
+
+def _fragmentos(lineas):
+    """Agrupa líneas en fragmentos de LINEAS_POR_FRAGMENTO para no enviar una por una"""
+    fragmento = []
+    for linea in lineas:
+        fragmento.append(linea)
+        if len(fragmento) >= LINEAS_POR_FRAGMENTO:
+            yield ''.join(fragmento)
+            fragmento = []
+    if fragmento:
+        yield ''.join(fragmento)
+
+
+def generar_ndjson(muestras):
+    """Fragmentos de texto NDJSON (una muestra por línea)"""
+    return _fragmentos(
+        json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n'
+        for registro in registros(muestras)
+    )
+
+
+class _Eco:
+    """Archivo para csv.writer que devuelve la línea en lugar de escribirla"""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(muestras):
+    """Fragmentos de texto CSV, empezando por el encabezado"""
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(ENCABEZADO_CSV)
+    yield from _fragmentos(escritor.writerow(fila_csv(registro)) for registro in registros(muestras))
+
+
+def respuesta_exportacion(muestras, formato='csv', nombre='muestras'):
+    """StreamingHttpResponse con la exportación de un queryset de muestras"""
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato no soportado: {formato} (use {", ".join(FORMATOS)})')
+
+    generador = generar_csv(muestras) if formato == 'csv' else generar_ndjson(muestras)
+    respuesta = StreamingHttpResponse(generador, content_type=f'{FORMATOS[formato]}; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    return respuesta
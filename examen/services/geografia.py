@@ -0,0 +1,142 @@
+# examen/services/geografia.py
+"""
+Resolución de departamentos y municipios escritos a mano.
+
+Carga una sola vez los 18 departamentos y 298 municipios en índices en
+memoria con los nombres normalizados (sin tildes, en minúsculas y sin
+puntuación), de modo que 'COPAN', 'Copán' y 'copan ' son el mismo nombre.
+Para un municipio se intenta, en orden:
+
+1. Nombre normalizado o alias conocido dentro del departamento
+2. Único municipio del departamento cuyo nombre contiene el texto o al revés
+3. Coincidencia aproximada (difflib) con similitud mínima SIMILITUD_MINIMA
+
+El índice se descarta al guardar o eliminar un Departamento o Municipio
+(ver signals.py).
+"""
+import re
+import unicodedata
+from difflib import get_close_matches
+
+from examen.models import Departamento, Municipio
+
+
+# Similitud mínima (0-1) para aceptar una coincidencia aproximada
+SIMILITUD_MINIMA = 0.85
+
+# Nombres alternativos (ya normalizados) -> nombre oficial
+ALIAS_DEPARTAMENTOS = {
+    'fco morazan': 'Francisco Morazán',
+    'f morazan': 'Francisco Morazán',
+}
+
+ALIAS_MUNICIPIOS = {
+    'tegucigalpa': 'Tegucigalpa D.C.',
+    'comayaguela': 'Tegucigalpa D.C.',
+    'distrito central': 'Tegucigalpa D.C.',
+    'tegucigalpa mdc': 'Tegucigalpa D.C.',
+    'sps': 'San Pedro Sula',
+}
+
+
+def normalizar_nombre(texto):
+    """'  Santa Rosa de COPÁN ' -> 'santa rosa de copan'; 'Tegucigalpa D.C.' -> 'tegucigalpa dc'"""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    texto = re.sub(r'[.\']', '', texto.casefold())
+    return ' '.join(re.sub(r'[^\w]+', ' ', texto).split())
+
+
+class ResolutorGeografico:
+    """Índice en memoria de departamentos y municipios por nombre normalizado"""
+
+    def __init__(self):
+        self.departamentos = {}
+        self.municipios = {}
+        for depto_id, nombre in Departamento.objects.values_list('id', 'nombre'):
+            self.departamentos[normalizar_nombre(nombre)] = depto_id
+            self.municipios[depto_id] = {}
+        for muni_id, nombre, depto_id in Municipio.objects.values_list('id', 'nombre', 'departamento_id'):
+            self.municipios[depto_id][normalizar_nombre(nombre)] = muni_id
+
+        self.alias_departamentos = {
+            alias: self.departamentos[normalizar_nombre(nombre)]
+            for alias, nombre in ALIAS_DEPARTAMENTOS.items()
+            if normalizar_nombre(nombre) in self.departamentos
+        }
+        self.alias_municipios = {
+            normalizar_nombre(alias): normalizar_nombre(nombre)
+            for alias, nombre in ALIAS_MUNICIPIOS.items()
+        }
+        self._memo = {}
+
+    def departamento(self, texto):
+        """Id del departamento o None"""
+        nombre = normalizar_nombre(texto)
+        if not nombre:
+            return None
+        depto_id = self.departamentos.get(nombre) or self.alias_departamentos.get(nombre)
+        if depto_id:
+            return depto_id
+        parecidos = get_close_matches(nombre, self.departamentos, n=1, cutoff=SIMILITUD_MINIMA)
+        return self.departamentos[parecidos[0]] if parecidos else None
+
+    def municipio(self, departamento_id, texto):
+        """Id del municipio dentro del departamento o None"""
+        nombre = normalizar_nombre(texto)
+        municipios = self.municipios.get(departamento_id)
+        if not nombre or not municipios:
+            return None
+
+        nombre = self.alias_municipios.get(nombre, nombre)
+        if nombre in municipios:
+            return municipios[nombre]
+
+        contenidos = [
+            muni_id for candidato, muni_id in municipios.items()
+            if nombre in candidato or candidato in nombre
+        ]
+        if len(contenidos) == 1:
+            return contenidos[0]
+
+        parecidos = get_close_matches(nombre, municipios, n=1, cutoff=SIMILITUD_MINIMA)
+        return municipios[parecidos[0]] if parecidos else None
+
+    def resolver(self, departamento, municipio):
+        """
+        (departamento_id, municipio_id, error) de un par de textos.
+        error es '' si se resolvieron ambos.
+        """
+        clave = (departamento, municipio)
+        if clave not in self._memo:
+            self._memo[clave] = self._resolver(departamento, municipio)
+        return self._memo[clave]
+
+    def _resolver(self, departamento, municipio):
+        if not normalizar_nombre(departamento) or not normalizar_nombre(municipio):
+            return None, None, 'Datos vacíos'
+        depto_id = self.departamento(departamento)
+        if not depto_id:
+            return None, None, 'Departamento no encontrado'
+        muni_id = self.municipio(depto_id, municipio)
+        if not muni_id:
+            return depto_id, None, 'Municipio no encontrado'
+        return depto_id, muni_id, ''
+
+
+_indice = {'resolutor': None}
+
+
+def obtener_resolutor():
+    """Resolutor compartido por el proceso (se construye en la primera llamada)"""
+    resolutor = _indice['resolutor']
+    if resolutor is None:
+        resolutor = _indice['resolutor'] = ResolutorGeografico()
+    return resolutor
+
+
+def invalidar_resolutor():
+    """Descarta el índice de este proceso; el siguiente uso lo reconstruye desde la BD"""
+    _indice['resolutor'] = None
@@ -0,0 +1,453 @@
+# examen/services/importacion.py
+"""
+Importación masiva de muestras (y pacientes nuevos) desde CSV o XLSX.
+
+- El archivo se lee por bloques (pandas para CSV, openpyxl en modo solo
+  lectura para XLSX): la memoria no depende del tamaño del archivo.
+- Cada bloque se valida con operaciones por columna (formato de DNI,
+  fechas, códigos de estadio, centro, duplicados), sin recorrer fila a fila.
+- Expedientes, centros y semanas epidemiológicas se resuelven con mapas en
+  memoria que se reutilizan entre bloques.
+- Las filas válidas se insertan con bulk_create en una transacción por
+  bloque. bulk_create no dispara signals: el resumen diario y las
+  estadísticas semanales se suman una vez por bloque y las alertas se
+  encolan como tareas diferidas (una por centro/parásito/fecha del bloque).
+  Las entradas del índice de búsqueda también se insertan por bloque.
+
+Columnas obligatorias: dni, numero_examen, fecha_examen, centro (código del
+centro de atención) y consistencia. Opcionales: moco, sangre_macroscopica,
+responsable_analisis, observaciones, ascaris_intensidad y una columna por
+parásito (nombre del campo o nombre del parásito) con el código de estadio.
+Para pacientes que no tienen expediente: primer_nombre, primer_apellido,
+sexo y fecha_nacimiento (además segundo_nombre, segundo_apellido,
+direccion, telefono, departamento y municipio; estos dos por nombre, sin
+importar tildes ni mayúsculas).
+"""
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+from django.db import transaction
+
+from examen.models import (
+    Muestra,
+    Expediente,
+    CentroAtencion,
+    CONSISTENCIA_CHOICES,
+    PRESENCIA_CHOICES,
+    MOCO_CHOICES,
+    INTENSIDAD_CHOICES,
+)
+from examen.parasitos import PARASITOS, CAMPOS as CAMPOS_PARASITOS, mascara_de_valores
+from .resumen_diario import aplicar_estados
+from .estadisticas import claves_estadisticas, aplicar_deltas_estadisticas
+from .alertas import claves_cambio
+from .tareas import encolar, tarea_alertas
+from .cache_dashboard import invalidar_por_centros
+from .semanas import resolver_fechas
+from .geografia import obtener_resolutor
+from .busqueda import indexar_expedientes, indexar_muestras
+
+
+TAMANO_BLOQUE = 5000
+
+# Parámetros por consulta IN (SQLite admite 999)
+_LOTE_CONSULTA = 900
+
+COLUMNAS_MUESTRA = (
+    'dni', 'numero_examen', 'fecha_examen', 'centro', 'consistencia', 'moco',
+    'sangre_macroscopica', 'responsable_analisis', 'observaciones', 'ascaris_intensidad',
+)
+COLUMNAS_PACIENTE = (
+    'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
+    'sexo', 'fecha_nacimiento', 'direccion', 'telefono', 'departamento', 'municipio',
+)
+COLUMNAS = COLUMNAS_MUESTRA + COLUMNAS_PACIENTE + CAMPOS_PARASITOS
+
+OBLIGATORIAS = ('dni', 'numero_examen', 'fecha_examen', 'centro', 'consistencia')
+
+# Columnas con códigos (se comparan en mayúsculas)
+COLUMNAS_CODIGO = ('centro', 'consistencia', 'moco', 'sangre_macroscopica', 'ascaris_intensidad', 'sexo') + CAMPOS_PARASITOS
+
+# Nombres alternativos de columnas (en minúsculas)
+ALIAS = {
+    'codigo_centro': 'centro',
+    'centro_atencion': 'centro',
+    'numero': 'numero_examen',
+    'fecha': 'fecha_examen',
+    'sangre': 'sangre_macroscopica',
+    **{parasito.nombre.lower(): parasito.campo for parasito in PARASITOS},
+}
+
+PATRON_DNI = r'\d{4}-\d{4}-\d{5}'
+PATRON_TELEFONO = r'\d{4}-\d{4}|\d{8}'
+
+# Longitud máxima de las columnas de texto libre
+LONGITUDES = {
+    'responsable_analisis': 200,
+    'primer_nombre': 50,
+    'segundo_nombre': 50,
+    'primer_apellido': 50,
+    'segundo_apellido': 50,
+}
+
+
+# ==================== LECTURA POR BLOQUES ====================
+
+def _formato(archivo, formato=None):
+    """'csv' o 'xlsx' según el parámetro o la extensión del archivo"""
+    if formato:
+        return formato.lower()
+    nombre = getattr(archivo, 'name', archivo)
+    extension = Path(str(nombre)).suffix.lower().lstrip('.')
+    if extension in ('csv', 'txt'):
+        return 'csv'
+    if extension in ('xlsx', 'xlsm'):
+        return 'xlsx'
+    raise ValueError(f'Formato de archivo no soportado: {nombre}')
+
+
+def _celda(valor):
+    """Valor de una celda de Excel como texto"""
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _leer_csv(archivo, tamano):
+    for bloque in pd.read_csv(
+        archivo,
+        dtype=str,
+        keep_default_na=False,
+        skip_blank_lines=False,
+        chunksize=tamano,
+        encoding='utf-8-sig',
+    ):
+        # El índice continúa entre bloques; la fila 1 es el encabezado
+        bloque.index = bloque.index + 2
+        yield bloque
+
+
+def _leer_xlsx(archivo, tamano):
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [_celda(valor) for valor in next(filas, ())]
+        ancho = len(encabezados)
+
+        bloque, numeros = [], []
+        for numero, fila in enumerate(filas, start=2):
+            valores = [_celda(valor) for valor in fila[:ancho]]
+            bloque.append(valores + [''] * (ancho - len(valores)))
+            numeros.append(numero)
+            if len(bloque) >= tamano:
+                yield pd.DataFrame(bloque, columns=encabezados, index=numeros)
+                bloque, numeros = [], []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=encabezados, index=numeros)
+    finally:
+        libro.close()
+
+
+def leer_bloques(archivo, formato=None, tamano=TAMANO_BLOQUE):
+    """
+    DataFrames de hasta `tamano` filas con las columnas normalizadas (texto),
+    sin filas vacías. El índice es el número de fila en el archivo.
+    """
+    lector = _leer_csv if _formato(archivo, formato) == 'csv' else _leer_xlsx
+
+    for bloque in lector(archivo, tamano):
+        bloque = _normalizar(bloque)
+        if not bloque.empty:
+            yield bloque
+
+
+def _nombre_columna(nombre):
+    nombre = str(nombre).strip().lower().replace(' ', '_')
+    return ALIAS.get(nombre.replace('_', ' '), ALIAS.get(nombre, nombre))
+
+
+def _normalizar(bloque):
+    """Renombra columnas, agrega las que faltan, limpia los valores y quita las filas vacías"""
+    bloque = bloque.rename(columns=_nombre_columna)
+
+    faltantes = [columna for columna in OBLIGATORIAS if columna not in bloque.columns]
+    if faltantes:
+        raise ValueError(f'Faltan columnas obligatorias: {", ".join(faltantes)}')
+
+    bloque = bloque.loc[:, ~bloque.columns.duplicated()]
+    bloque = bloque.reindex(columns=COLUMNAS, fill_value='').fillna('').astype(str)
+    bloque = bloque.apply(lambda columna: columna.str.strip())
+    bloque = bloque[(bloque != '').any(axis=1)].copy()
+    for columna in COLUMNAS_CODIGO:
+        bloque[columna] = bloque[columna].str.upper()
+
+    # Valores por defecto del modelo
+    bloque['moco'] = bloque['moco'].replace('', 'N')
+    bloque['sangre_macroscopica'] = bloque['sangre_macroscopica'].replace({'': 'NO', 'SÍ': 'SI'})
+    return bloque
+
+
+def _fechas(columna):
+    """Convierte texto a fechas (ISO o dd/mm/aaaa); NaT si no es válida"""
+    fechas = pd.to_datetime(columna, format='%Y-%m-%d', errors='coerce')
+    return fechas.fillna(pd.to_datetime(columna, format='%d/%m/%Y', errors='coerce'))
+
+
+# ==================== MAPAS EN MEMORIA ====================
+
+def _en_lotes(valores):
+    valores = list(valores)
+    for i in range(0, len(valores), _LOTE_CONSULTA):
+        yield valores[i:i + _LOTE_CONSULTA]
+
+
+def _completar_expedientes(expedientes, dnis):
+    """Agrega al mapa {dni: id} los expedientes existentes de `dnis`"""
+    faltantes = set(dnis) - expedientes.keys()
+    for lote in _en_lotes(faltantes):
+        expedientes.update(Expediente.objects.filter(dni__in=lote).values_list('dni', 'id'))
+
+
+def _examenes_existentes(numeros):
+    """Números de examen que ya están registrados"""
+    existentes = set()
+    for lote in _en_lotes(set(numeros)):
+        existentes.update(
+            Muestra.objects.filter(numero_examen__in=lote).values_list('numero_examen', flat=True)
+        )
+    return existentes
+
+
+# ==================== VALIDACIÓN ====================
+
+def _codigos(choices):
+    return [codigo for codigo, _ in choices]
+
+
+def _ubicaciones(bloque):
+    """
+    Serie {fila: (departamento_id, municipio_id, error)} a partir de los nombres.
+    Cada par distinto se resuelve una sola vez (ver services.geografia).
+    """
+    resolutor = obtener_resolutor()
+    return pd.Series(
+        [
+            resolutor.resolver(depto, muni) if depto or muni else (None, None, '')
+            for depto, muni in zip(bloque['departamento'], bloque['municipio'])
+        ],
+        index=bloque.index,
+        dtype=object,
+    )
+
+
+def validar_bloque(bloque, centros, expedientes):
+    """
+    Valida un bloque completo con operaciones por columna.
+    Devuelve una Serie {fila: 'error; error'} ('' si la fila es válida).
+    """
+    errores = pd.Series('', index=bloque.index, dtype=object)
+
+    def marcar(filas, mensaje):
+        errores[filas] += mensaje + '; '
+
+    # DNI
+    marcar(~bloque['dni'].str.fullmatch(PATRON_DNI), 'DNI con formato inválido (0801-1990-12345)')
+
+    # Número de examen
+    numeros = bloque['numero_examen']
+    marcar(numeros == '', 'Número de examen vacío')
+    marcar(numeros.str.len() > 20, 'Número de examen de más de 20 caracteres')
+    marcar(numeros.duplicated(keep='first') & (numeros != ''), 'Número de examen repetido en el archivo')
+    marcar(numeros.isin(_examenes_existentes(numeros)), 'Número de examen ya registrado')
+
+    # Fechas
+    hoy = pd.Timestamp(date.today())
+    fechas = _fechas(bloque['fecha_examen'])
+    marcar(fechas.isna(), 'Fecha de examen inválida')
+    marcar(fechas > hoy, 'Fecha de examen futura')
+
+    # Centro de atención (solo los permitidos al usuario)
+    marcar(~bloque['centro'].isin(centros.keys()), 'Centro de atención no encontrado o no permitido')
+
+    # Examen físico
+    marcar(~bloque['consistencia'].isin(_codigos(CONSISTENCIA_CHOICES)), 'Consistencia inválida')
+    marcar(~bloque['moco'].isin(_codigos(MOCO_CHOICES)), 'Moco inválido')
+    marcar(~bloque['sangre_macroscopica'].isin(_codigos(PRESENCIA_CHOICES)), 'Sangre macroscópica inválida')
+    marcar(~bloque['ascaris_intensidad'].isin(_codigos(INTENSIDAD_CHOICES)), 'Intensidad de Ascaris inválida')
+
+    # Estadios de cada parásito
+    for parasito in PARASITOS:
+        marcar(
+            ~bloque[parasito.campo].isin(_codigos(parasito.estadios)),
+            f'Estadio inválido para {parasito.nombre}'
+        )
+
+    for columna, longitud in LONGITUDES.items():
+        marcar(bloque[columna].str.len() > longitud, f'{columna} de más de {longitud} caracteres')
+
+    # Pacientes sin expediente: se necesitan sus datos para crearlo
+    _completar_expedientes(expedientes, bloque['dni'])
+    nuevos = ~bloque['dni'].isin(expedientes.keys())
+    nacimiento = _fechas(bloque['fecha_nacimiento'])
+    marcar(nuevos & ((bloque['primer_nombre'] == '') | (bloque['primer_apellido'] == '')),
+           'Paciente nuevo sin primer nombre o primer apellido')
+    marcar(nuevos & ~bloque['sexo'].isin(['M', 'F']), 'Paciente nuevo con sexo inválido (M/F)')
+    marcar(nuevos & (nacimiento.isna() | (nacimiento > hoy)), 'Paciente nuevo con fecha de nacimiento inválida')
+    marcar(nuevos & (bloque['telefono'] != '') & ~bloque['telefono'].str.fullmatch(PATRON_TELEFONO),
+           'Teléfono inválido (9999-9999 o 99999999)')
+
+    # Departamento y municipio (opcionales, pero juntos)
+    ubicacion = _ubicaciones(bloque).str[2].replace('Datos vacíos', 'Departamento y municipio deben indicarse juntos')
+    for mensaje in ubicacion[nuevos & (ubicacion != '')].unique():
+        marcar(nuevos & (ubicacion == mensaje), mensaje)
+
+    return errores.str.rstrip('; ')
+
+
+# ==================== INSERCIÓN ====================
+
+def _crear_expedientes(filas, centros, expedientes, usuario):
+    """Crea en una sola inserción los expedientes de los DNI que aún no existen"""
+    nuevos = filas[~filas['dni'].isin(expedientes.keys())].drop_duplicates('dni')
+    if nuevos.empty:
+        return 0
+
+    nacimientos = _fechas(nuevos['fecha_nacimiento']).dt.date
+    ubicaciones = _ubicaciones(nuevos)
+    Expediente.objects.bulk_create(
+        [
+            Expediente(
+                dni=fila.dni,
+                primer_nombre=fila.primer_nombre,
+                segundo_nombre=fila.segundo_nombre,
+                primer_apellido=fila.primer_apellido,
+                segundo_apellido=fila.segundo_apellido,
+                sexo=fila.sexo,
+                fecha_nacimiento=nacimientos[fila.Index],
+                direccion=fila.direccion,
+                telefono=fila.telefono,
+                departamento_id=ubicaciones[fila.Index][0],
+                municipio_id=ubicaciones[fila.Index][1],
+                centro_atencion_id=centros[fila.centro],
+                usuario_creacion=usuario,
+            )
+            for fila in nuevos.itertuples()
+        ],
+        ignore_conflicts=True,
+    )
+    _completar_expedientes(expedientes, nuevos['dni'])
+    for dnis in _en_lotes(nuevos['dni']):
+        indexar_expedientes(Expediente.objects.filter(dni__in=dnis))
+    return len(nuevos)
+
+
+def _construir_muestras(filas, centros, expedientes, usuario):
+    fechas = _fechas(filas['fecha_examen']).dt.date
+    semanas = resolver_fechas(fechas)
+
+    muestras = []
+    for fila in filas.itertuples():
+        valores = [getattr(fila, campo) for campo in CAMPOS_PARASITOS]
+        mascara = mascara_de_valores(valores)
+        fecha = fechas[fila.Index]
+        semana_id, año, semana_numero = semanas[fecha]
+
+        muestras.append(Muestra(
+            expediente_id=expedientes[fila.dni],
+            numero_examen=fila.numero_examen,
+            fecha_examen=fecha,
+            semana_epidemiologica_id=semana_id,
+            semana_numero=semana_numero,
+            año_epidemiologico=año,
+            responsable_analisis=fila.responsable_analisis,
+            centro_atencion_id=centros[fila.centro],
+            consistencia=fila.consistencia,
+            moco=fila.moco,
+            sangre_macroscopica=fila.sangre_macroscopica,
+            ascaris_intensidad=fila.ascaris_intensidad,
+            observaciones=fila.observaciones,
+            mascara_parasitos=mascara,
+            resultado='POS' if mascara else 'NEG',
+            usuario_creacion=usuario,
+            **dict(zip(CAMPOS_PARASITOS, valores)),
+        ))
+    return muestras
+
+
+def _posprocesar(muestras):
+    """
+    Lo que harían los signals de post_save, una vez por bloque:
+    resumen diario, estadísticas semanales, alertas, índice de búsqueda y
+    cache de dashboards.
+    """
+    estados = [muestra.capturar_estado() for muestra in muestras]
+    aplicar_estados(estados)
+    aplicar_deltas_estadisticas(Counter(clave for estado in estados for clave in claves_estadisticas(estado)))
+
+    tareas = {}
+    for muestra, estado in zip(muestras, estados):
+        nuevas, _ = claves_cambio(None, estado)
+        for centro_id, campo, fecha in nuevas:
+            tarea = tarea_alertas(centro_id, campo, fecha, muestra.pk)
+            tareas.setdefault(tarea.clave, tarea)
+    encolar(tareas.values())
+
+    for ids in _en_lotes(muestra.pk for muestra in muestras):
+        indexar_muestras(Muestra.objects.filter(pk__in=ids))
+
+    centros = {muestra.centro_atencion_id for muestra in muestras}
+    transaction.on_commit(lambda: invalidar_por_centros(centros))
+
+
+def importar_muestras(archivo, usuario, formato=None, tamano_bloque=TAMANO_BLOQUE,
+                      centros=None, simular=False, al_procesar_bloque=None):
+    """
+    Importa muestras desde un archivo CSV o XLSX (ruta o archivo abierto).
+
+    `centros` limita los centros de atención permitidos (queryset); por
+    defecto todos. Con `simular` solo se valida. `al_procesar_bloque` se
+    llama con el resultado parcial después de cada bloque.
+
+    Devuelve {'filas', 'importadas', 'expedientes_creados', 'errores'},
+    donde errores es una lista de (fila, mensaje).
+    """
+    if centros is None:
+        centros = CentroAtencion.objects.all()
+    mapa_centros = {codigo.upper(): pk for pk, codigo in centros.values_list('id', 'codigo')}
+    expedientes = {}
+
+    resultado = {'filas': 0, 'importadas': 0, 'expedientes_creados': 0, 'errores': []}
+
+    for bloque in leer_bloques(archivo, formato, tamano_bloque):
+        errores = validar_bloque(bloque, mapa_centros, expedientes)
+        validas = bloque[errores == '']
+
+        resultado['filas'] += len(bloque)
+        resultado['errores'].extend(errores[errores != ''].items())
+
+        if not simular and not validas.empty:
+            with transaction.atomic():
+                resultado['expedientes_creados'] += _crear_expedientes(
+                    validas, mapa_centros, expedientes, usuario
+                )
+                muestras = Muestra.objects.bulk_create(
+                    _construir_muestras(validas, mapa_centros, expedientes, usuario),
+                    batch_size=1000,
+                )
+                _posprocesar(muestras)
+            resultado['importadas'] += len(muestras)
+
+        if al_procesar_bloque:
+            al_procesar_bloque(resultado)
+
+    return resultado
@@ -0,0 +1,31 @@
+# examen/services/mascara_parasitos.py
+"""
+Backfill de Muestra.mascara_parasitos.
+
+Muestra.save() mantiene la máscara; esto la recalcula para filas escritas
+sin pasar por save() (datos anteriores a la columna, .update(), SQL directo).
+"""
+from django.db import transaction
+from django.db.models import F, Q
+
+from examen.models import Muestra
+from examen.parasitos import PARASITOS
+
+
+def recalcular_mascaras(muestras=None):
+    """
+    Recalcula la máscara con una sentencia UPDATE por parásito (sin leer
+    filas en Python). Devuelve el número de muestras positivas según la máscara.
+    """
+    if muestras is None:
+        muestras = Muestra.objects.all()
+
+    with transaction.atomic():
+        muestras.update(mascara_parasitos=0)
+        for parasito in PARASITOS:
+            campo = parasito.campo
+            muestras.filter(
+                Q(**{f'{campo}__isnull': False}) & ~Q(**{campo: ''})
+            ).update(mascara_parasitos=F('mascara_parasitos').bitor(parasito.mascara))
+
+    return muestras.filter(mascara_parasitos__gt=0).count()
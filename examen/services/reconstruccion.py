@@ -0,0 +1,244 @@
+# examen/services/reconstruccion.py
+"""
+Reconstrucción completa y en paralelo de los contadores cacheados:
+EstadisticaSemanalCentro, totales de SemanaEpidemiologica y
+ResumenDiarioParasito.
+
+- El trabajo se divide en particiones: bloques de semanas consecutivas
+  (por año y semana) o un centro de atención por partición.
+- Cada partición corre en un proceso del pool con su propia conexión:
+  calcula sus filas con consultas agrupadas y las reemplaza en una sola
+  transacción.
+- Los totales nacionales de las semanas se recalculan al final con un solo
+  UPDATE desde EstadisticaSemanalCentro.
+- Con verificar=True no se escribe nada: solo se informan las diferencias.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connections, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from examen.models import (
+    CentroAtencion,
+    EstadisticaSemanalCentro,
+    Muestra,
+    ResumenDiarioParasito,
+    SemanaEpidemiologica,
+)
+from .estadisticas import CONTADORES, totales_por_par
+from .resumen_diario import totales_resumen
+from .cache_dashboard import invalidar_por_centros
+
+
+TIPOS_PARTICION = ('semana', 'centro')
+
+
+# ==================== PARTICIONES ====================
+
+def particiones(tipo='semana', tamano_bloque=13):
+    """
+    Lista de particiones:
+    - ('semana', (semana_ids, desde, hasta)): `tamano_bloque` semanas consecutivas
+    - ('centro', centro_id)
+    """
+    if tipo == 'centro':
+        return [
+            ('centro', centro_id)
+            for centro_id in CentroAtencion.objects.order_by('id').values_list('id', flat=True)
+        ]
+
+    semanas = list(
+        SemanaEpidemiologica.objects.order_by('año', 'semana').values_list('id', 'fecha_inicio', 'fecha_fin')
+    )
+    return [
+        ('semana', ([semana_id for semana_id, _, _ in tramo], tramo[0][1], tramo[-1][2]))
+        for tramo in (
+            semanas[inicio:inicio + tamano_bloque]
+            for inicio in range(0, len(semanas), tamano_bloque)
+        )
+    ]
+
+
+def _filtros(particion):
+    """(filtro de muestras por semana, filtro de EstadisticaSemanalCentro, filtro por fecha/centro)"""
+    tipo, valor = particion
+    if tipo == 'centro':
+        return (
+            {'centro_atencion_id': valor},
+            {'centro_atencion_id': valor},
+            {'centro_atencion_id': valor},
+        )
+    semana_ids, desde, hasta = valor
+    return (
+        {'semana_epidemiologica_id__in': semana_ids},
+        {'semana_id__in': semana_ids},
+        {'fecha_examen__gte': desde, 'fecha_examen__lte': hasta},
+    )
+
+
+def _comparar(tipo, calculados, guardados):
+    """[(tipo, clave, guardado, calculado)] de las claves que no coinciden (ausente = ceros)"""
+    diferencias = []
+    for clave in calculados.keys() | guardados.keys():
+        guardado = guardados.get(clave)
+        calculado = calculados.get(clave)
+        if guardado != calculado and any(valor for valor in (guardado, calculado) if valor):
+            diferencias.append((tipo, clave, guardado, calculado))
+    return diferencias
+
+
+def procesar_particion(particion, verificar=False):
+    """
+    Recalcula (o con `verificar` solo compara) las filas de una partición.
+    Devuelve {'muestras', 'filas', 'diferencias'}.
+    """
+    filtro_semana, filtro_estadisticas, filtro_resumen = _filtros(particion)
+
+    estadisticas = totales_por_par(Muestra.objects.filter(**filtro_semana))
+    resumen = totales_resumen(Muestra.objects.filter(**filtro_resumen))
+    resultado = {
+        'muestras': sum(totales[0] for totales in estadisticas.values()),
+        'filas': len(estadisticas) + len(resumen),
+        'diferencias': [],
+    }
+
+    guardadas = EstadisticaSemanalCentro.objects.filter(**filtro_estadisticas)
+    resumen_guardado = ResumenDiarioParasito.objects.filter(**filtro_resumen)
+
+    if verificar:
+        resultado['diferencias'] = _comparar('estadistica', estadisticas, {
+            (fila[0], fila[1]): fila[2:]
+            for fila in guardadas.values_list('semana_id', 'centro_atencion_id', *CONTADORES)
+            if any(fila[2:])
+        }) + _comparar('resumen', resumen, {
+            (fecha, centro_id, campo, estadio): total
+            for fecha, centro_id, campo, estadio, total in resumen_guardado.values_list(
+                'fecha_examen', 'centro_atencion_id', 'parasito_campo', 'estadio', 'total_muestras'
+            )
+        })
+        return resultado
+
+    with transaction.atomic():
+        guardadas.delete()
+        EstadisticaSemanalCentro.objects.bulk_create(
+            [
+                EstadisticaSemanalCentro(
+                    semana_id=semana_id,
+                    centro_atencion_id=centro_id,
+                    **dict(zip(CONTADORES, totales)),
+                )
+                for (semana_id, centro_id), totales in estadisticas.items()
+            ],
+            batch_size=1000,
+        )
+        resumen_guardado.delete()
+        ResumenDiarioParasito.objects.bulk_create(
+            [
+                ResumenDiarioParasito(
+                    fecha_examen=fecha,
+                    centro_atencion_id=centro_id,
+                    parasito_campo=campo,
+                    estadio=estadio,
+                    total_muestras=total,
+                )
+                for (fecha, centro_id, campo, estadio), total in resumen.items()
+            ],
+            batch_size=1000,
+        )
+    return resultado
+
+
+# ==================== TOTALES NACIONALES ====================
+
+def _actualizar_totales_nacionales():
+    """Un UPDATE de todas las semanas con la suma de sus filas por centro"""
+    por_semana = EstadisticaSemanalCentro.objects.filter(
+        semana_id=OuterRef('pk')
+    ).order_by().values('semana_id')
+    SemanaEpidemiologica.objects.update(
+        fecha_actualizacion=timezone.now(),
+        **{
+            campo: Coalesce(Subquery(por_semana.annotate(total=Sum(campo)).values('total')), 0)
+            for campo in CONTADORES
+        },
+    )
+
+
+def _verificar_totales_nacionales():
+    """Diferencias entre los totales guardados de cada semana y los de las muestras"""
+    calculados = {}
+    for (semana_id, _), totales in totales_por_par(Muestra.objects.all()).items():
+        acumulado = calculados.get(semana_id, (0, 0, 0))
+        calculados[semana_id] = tuple(a + b for a, b in zip(acumulado, totales))
+
+    return _comparar('semana', calculados, {
+        semana_id: tuple(totales)
+        for semana_id, *totales in SemanaEpidemiologica.objects.values_list('id', *CONTADORES)
+        if any(totales)
+    })
+
+
+# ==================== ORQUESTACIÓN ====================
+
+def _iniciar_proceso():
+    """Inicializador de cada proceso del pool: Django listo y conexiones propias"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def reconstruir_en_paralelo(tipo='semana', procesos=None, tamano_bloque=13,
+                            verificar=False, al_terminar_particion=None):
+    """
+    Reconstruye (o con `verificar` compara) estadísticas semanales y resumen
+    diario partición por partición en un pool de `procesos` procesos (por
+    defecto uno por CPU; con 1 todo corre en este proceso).
+
+    `al_terminar_particion` se llama con el resultado acumulado tras cada partición.
+    Devuelve {'particiones', 'completadas', 'muestras', 'filas', 'diferencias', 'segundos'}.
+    """
+    lista = particiones(tipo, tamano_bloque)
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(lista) or 1))
+
+    resultado = {
+        'particiones': len(lista),
+        'completadas': 0,
+        'muestras': 0,
+        'filas': 0,
+        'diferencias': [],
+        'segundos': 0.0,
+    }
+    inicio = time.monotonic()
+
+    def acumular(parcial):
+        resultado['completadas'] += 1
+        resultado['muestras'] += parcial['muestras']
+        resultado['filas'] += parcial['filas']
+        resultado['diferencias'].extend(parcial['diferencias'])
+        resultado['segundos'] = time.monotonic() - inicio
+        if al_terminar_particion:
+            al_terminar_particion(resultado)
+
+    if procesos == 1:
+        for particion in lista:
+            acumular(procesar_particion(particion, verificar))
+    else:
+        # Los procesos hijos no deben compartir la conexión abierta de este proceso
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+            futuros = [pool.submit(procesar_particion, particion, verificar) for particion in lista]
+            for futuro in as_completed(futuros):
+                acumular(futuro.result())
+
+    if verificar:
+        resultado['diferencias'].extend(_verificar_totales_nacionales())
+    else:
+        _actualizar_totales_nacionales()
+        invalidar_por_centros(CentroAtencion.objects.values_list('id', flat=True))
+
+    resultado['segundos'] = time.monotonic() - inicio
+    return resultado
@@ -0,0 +1,322 @@
+# examen/services/reportes_excel.py
+"""
+Reporte semanal en Excel (XLSX) por alcance y rango de semanas
+epidemiológicas, para los coordinadores regionales.
+
+Hojas:
+- Muestras: una fila por muestra (mismas columnas que la exportación CSV)
+- Semanal por centro: muestras y positivas de cada centro por semana
+- Frecuencia parásitos: muestras por parásito y estadio
+- Alertas: alertas generadas en el rango
+
+- El libro se abre en modo write-only de openpyxl: cada fila se escribe al
+  archivo temporal de su hoja en cuanto se agrega, así que la memoria no
+  depende del número de muestras. Las muestras se leen con
+  exportacion.registros (.values() + .iterator por bloques). Con lxml
+  instalado openpyxl escribe el XML varias veces más rápido.
+- Las hojas resumen salen de las tablas cacheadas (EstadisticaSemanalCentro
+  y ResumenDiarioParasito), no de las muestras.
+- Los reportes se generan en segundo plano (tarea 'reporte_excel', ver
+  services.tareas) y quedan guardados en REPORTES_DIR. El nombre del archivo
+  lleva la versión del alcance en la cache de los dashboards y la última
+  actualización de sus alertas: cuando cambian los datos del alcance el
+  archivo deja de coincidir y se genera de nuevo.
+"""
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max, Sum
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Font
+
+from examen.models import (
+    Alerta,
+    CentroAtencion,
+    EstadisticaSemanalCentro,
+    Region,
+    ResumenDiarioParasito,
+)
+from examen.parasitos import PARASITOS, POR_CAMPO
+from .cache_dashboard import clave_alcance, _version
+from .exportacion import ENCABEZADO_CSV, fila_csv, registros
+from .semanas import semana_iso, semanas_del_rango
+from .widgets import centros_del_alcance, muestras_del_alcance
+
+
+REPORTES_DIR = Path(getattr(settings, 'REPORTES_DIR', settings.BASE_DIR / 'reportes'))
+
+# Semanas como máximo en un rango pedido por la API (validar_rango)
+MAX_SEMANAS = getattr(settings, 'REPORTES_MAX_SEMANAS', 53)
+
+# Filas de datos por hoja (Excel admite 1.048.576 contando el encabezado);
+# si hay más muestras se continúa en 'Muestras (2)', 'Muestras (3)', ...
+MAX_FILAS_HOJA = 1048575
+
+# Columnas de ENCABEZADO_CSV con texto libre (pueden traer caracteres de control)
+_TEXTO_LIBRE = tuple(
+    ENCABEZADO_CSV.index(columna) for columna in ('responsable', 'nombre_completo', 'observaciones')
+)
+_FECHA_EXAMEN = ENCABEZADO_CSV.index('fecha_examen')
+
+_NIVELES = dict(Alerta.NIVEL_CHOICES)
+_ESTADOS = dict(Alerta.ESTADO_CHOICES)
+
+
+# ==================== RANGO Y ALCANCE ====================
+
+def parsear_semana(texto):
+    """'2025-07' -> (2025, 7); ValueError si no es una semana ISO válida"""
+    año, _, semana = str(texto).partition('-')
+    año, semana = int(año), int(semana.lstrip('Ss'))
+    date.fromisocalendar(año, semana, 1)
+    return año, semana
+
+
+def fechas_del_rango(desde, hasta):
+    """(lunes de la semana `desde`, domingo de la semana `hasta`)"""
+    inicio = date.fromisocalendar(*desde, 1)
+    fin = date.fromisocalendar(*hasta, 7)
+    if inicio > fin:
+        raise ValueError('La semana inicial es posterior a la final')
+    return inicio, fin
+
+
+def validar_rango(desde, hasta, hoy=None):
+    """
+    fechas_del_rango para un rango pedido por un usuario: además rechaza
+    (ValueError) las semanas futuras y los rangos de más de MAX_SEMANAS.
+    """
+    inicio, fin = fechas_del_rango(desde, hasta)
+    # `fin` es el domingo de la semana final: su lunes no puede pasar del actual
+    if fin - timedelta(days=6) > semana_iso(hoy or date.today())[2]:
+        raise ValueError('El rango incluye semanas futuras')
+    if (fin - inicio).days // 7 + 1 > MAX_SEMANAS:
+        raise ValueError(f'El rango no puede superar {MAX_SEMANAS} semanas')
+    return inicio, fin
+
+
+def objeto_del_alcance(alcance, objeto_id):
+    """Region o CentroAtencion de un alcance guardado por id (None si es nacional)"""
+    if alcance == 'region':
+        return Region.objects.get(pk=objeto_id)
+    if alcance == 'centro':
+        return CentroAtencion.objects.get(pk=objeto_id)
+    return None
+
+
+# ==================== CACHE DE ARCHIVOS ====================
+
+def _base(alcance, objeto_id, desde, hasta):
+    """'reporte_region-5_2025-01_2025-10'"""
+    clave = clave_alcance(alcance, objeto_id).replace(':', '-')
+    return f'reporte_{clave}_{desde[0]}-{desde[1]:02d}_{hasta[0]}-{hasta[1]:02d}'
+
+
+def _firma(alcance, objeto_id):
+    """Versión de los datos del alcance: cambia al guardar muestras o alertas"""
+    alertas = Alerta.objects.filter(
+        centro_atencion__in=centros_del_alcance(alcance, objeto_del_alcance(alcance, objeto_id))
+    ).aggregate(ultima=Max('fecha_ultima_actualizacion'))['ultima']
+    marca = int(alertas.timestamp()) if alertas else 0
+    return f'v{_version(clave_alcance(alcance, objeto_id))}-a{marca}'
+
+
+def ruta_reporte(alcance, objeto_id, desde, hasta):
+    """Ruta del reporte con los datos actuales del alcance (puede no existir todavía)"""
+    return REPORTES_DIR / f'{_base(alcance, objeto_id, desde, hasta)}_{_firma(alcance, objeto_id)}.xlsx'
+
+
+def reporte_en_cache(alcance, objeto_id, desde, hasta):
+    """Ruta del reporte si ya está generado con los datos actuales, si no None"""
+    ruta = ruta_reporte(alcance, objeto_id, desde, hasta)
+    return ruta if ruta.exists() else None
+
+
+# ==================== HOJAS ====================
+
+def _encabezado(hoja, columnas):
+    negrita = Font(bold=True)
+    celdas = []
+    for columna in columnas:
+        celda = WriteOnlyCell(hoja, value=columna)
+        celda.font = negrita
+        celdas.append(celda)
+    hoja.freeze_panes = 'A2'
+    hoja.append(celdas)
+
+
+def _hoja_muestras(libro, muestras):
+    """Una fila por muestra; abre una hoja nueva cada MAX_FILAS_HOJA filas. Devuelve el total"""
+    hoja = None
+    filas = total = 0
+    for registro in registros(muestras):
+        if hoja is None or filas >= MAX_FILAS_HOJA:
+            numero = total // MAX_FILAS_HOJA + 1
+            hoja = libro.create_sheet('Muestras' if numero == 1 else f'Muestras ({numero})')
+            _encabezado(hoja, ENCABEZADO_CSV)
+            filas = 0
+        # Las celdas None no se escriben; la mayoría de las columnas de parásitos van vacías
+        fila = [None if valor == '' else valor for valor in fila_csv(registro)]
+        fila[_FECHA_EXAMEN] = date.fromisoformat(fila[_FECHA_EXAMEN])
+        for indice in _TEXTO_LIBRE:
+            if fila[indice]:
+                fila[indice] = ILLEGAL_CHARACTERS_RE.sub('', fila[indice])
+        hoja.append(fila)
+        filas += 1
+        total += 1
+
+    if hoja is None:
+        _encabezado(libro.create_sheet('Muestras'), ENCABEZADO_CSV)
+    return total
+
+
+def _hoja_semanal(libro, centros, semanas, inicio, fin):
+    """
+    Centros en filas y, por semana, columnas de muestras y positivas.
+    Devuelve el total de muestras del rango.
+    """
+    hoja = libro.create_sheet('Semanal por centro')
+    columnas = ['Región', 'Código', 'Centro']
+    for año, semana, _, _ in semanas:
+        columnas += [f'{año}-S{semana:02d} muestras', f'{año}-S{semana:02d} positivas']
+    _encabezado(hoja, columnas + ['Total muestras', 'Total positivas', '% positividad'])
+
+    posiciones = {(año, semana): indice for indice, (año, semana, _, _) in enumerate(semanas)}
+    valores = {}
+    for centro_id, año, semana, total, positivas in EstadisticaSemanalCentro.objects.filter(
+        centro_atencion__in=centros,
+        semana__fecha_inicio__gte=inicio,
+        semana__fecha_fin__lte=fin,
+    ).values_list(
+        'centro_atencion_id', 'semana__año', 'semana__semana', 'total_muestras', 'total_positivas'
+    ).iterator():
+        valores.setdefault(centro_id, {})[posiciones[(año, semana)]] = (total, positivas)
+
+    total_rango = 0
+    for centro_id, region, codigo, nombre in centros.order_by(
+        'region__numero_region', 'codigo'
+    ).values_list('id', 'region__nombre', 'codigo', 'nombre'):
+        por_semana = valores.get(centro_id, {})
+        fila = [region, codigo, nombre]
+        total = positivas = 0
+        for indice in range(len(semanas)):
+            muestras_semana, positivas_semana = por_semana.get(indice, (0, 0))
+            fila += [muestras_semana, positivas_semana]
+            total += muestras_semana
+            positivas += positivas_semana
+        fila += [total, positivas, round(positivas / total * 100, 2) if total else 0.0]
+        hoja.append(fila)
+        total_rango += total
+    return total_rango
+
+
+def _hoja_parasitos(libro, centros, inicio, fin, total_muestras):
+    """Muestras por parásito y estadio, con el total de cada parásito"""
+    hoja = libro.create_sheet('Frecuencia parásitos')
+    _encabezado(hoja, ['Grupo', 'Parásito', 'Estadio', 'Muestras', '% de las muestras'])
+
+    por_parasito = {}
+    for campo, estadio, total in ResumenDiarioParasito.objects.filter(
+        centro_atencion__in=centros,
+        fecha_examen__range=(inicio, fin),
+    ).values_list('parasito_campo', 'estadio').annotate(total=Sum('total_muestras')):
+        if total:
+            por_parasito.setdefault(campo, {})[estadio] = total
+
+    def porcentaje(valor):
+        return round(valor / total_muestras * 100, 2) if total_muestras else 0.0
+
+    negrita = Font(bold=True)
+    for parasito in PARASITOS:
+        estadios = por_parasito.get(parasito.campo)
+        if not estadios:
+            continue
+        for codigo, nombre in parasito.estadios:
+            if estadios.get(codigo):
+                hoja.append([parasito.grupo, parasito.nombre, nombre, estadios[codigo], porcentaje(estadios[codigo])])
+        total = sum(estadios.values())
+        celdas = []
+        for valor in (parasito.grupo, parasito.nombre, 'Total', total, porcentaje(total)):
+            celda = WriteOnlyCell(hoja, value=valor)
+            celda.font = negrita
+            celdas.append(celda)
+        hoja.append(celdas)
+
+
+def _sin_zona(fecha):
+    # Excel no admite fechas con zona horaria
+    return timezone.localtime(fecha).replace(tzinfo=None) if fecha else None
+
+
+def _hoja_alertas(libro, centros, inicio, fin):
+    hoja = libro.create_sheet('Alertas')
+    _encabezado(hoja, [
+        'Fecha de generación', 'Nivel', 'Estado', 'Parásito', 'Región', 'Código', 'Centro',
+        'Casos en la ventana', 'Casos en el día', 'Última actualización', 'Fecha de resolución',
+    ])
+    alertas = Alerta.objects.filter(
+        centro_atencion__in=centros,
+        fecha_generacion__date__range=(inicio, fin),
+    ).order_by('fecha_generacion', 'id').values_list(
+        'fecha_generacion', 'nivel', 'estado', 'configuracion__parasito_campo',
+        'region__nombre', 'centro_atencion__codigo', 'centro_atencion__nombre',
+        'numero_casos', 'numero_casos_dia', 'fecha_ultima_actualizacion', 'fecha_resolucion',
+    )
+    for (generada, nivel, estado, campo, region, codigo, centro,
+         casos, casos_dia, actualizada, resuelta) in alertas.iterator():
+        parasito = POR_CAMPO.get(campo)
+        hoja.append([
+            _sin_zona(generada), _NIVELES.get(nivel, nivel), _ESTADOS.get(estado, estado),
+            parasito.nombre if parasito else campo, region, codigo, centro,
+            casos, casos_dia, _sin_zona(actualizada), _sin_zona(resuelta),
+        ])
+
+
+# ==================== GENERAR ====================
+
+def escribir_reporte(ruta, alcance, objeto, desde, hasta):
+    """
+    Escribe el reporte XLSX de un alcance y un rango de semanas ((año, semana)).
+    Devuelve {'muestras', 'semanas'}.
+    """
+    inicio, fin = fechas_del_rango(desde, hasta)
+    semanas = semanas_del_rango(inicio, fin)
+    centros = centros_del_alcance(alcance, objeto)
+    muestras = muestras_del_alcance(alcance, objeto).filter(fecha_examen__range=(inicio, fin))
+
+    libro = Workbook(write_only=True)
+    filas = _hoja_muestras(libro, muestras)
+    total_rango = _hoja_semanal(libro, centros, semanas, inicio, fin)
+    _hoja_parasitos(libro, centros, inicio, fin, total_rango)
+    _hoja_alertas(libro, centros, inicio, fin)
+    libro.save(str(ruta))
+    return {'muestras': filas, 'semanas': len(semanas)}
+
+
+def generar_reporte(alcance, objeto_id, desde, hasta):
+    """
+    Genera (si no está ya en cache) el reporte de un alcance y un rango y
+    borra las versiones anteriores del mismo reporte. Devuelve la ruta.
+    """
+    ruta = ruta_reporte(alcance, objeto_id, desde, hasta)
+    if ruta.exists():
+        return ruta
+
+    REPORTES_DIR.mkdir(parents=True, exist_ok=True)
+    # Se escribe con otro nombre y se renombra al terminar: nunca se sirve un archivo a medias
+    temporal = ruta.with_name(f'{ruta.stem}.{os.getpid()}.tmp')
+    try:
+        escribir_reporte(temporal, alcance, objeto_del_alcance(alcance, objeto_id), desde, hasta)
+        os.replace(temporal, ruta)
+    finally:
+        temporal.unlink(missing_ok=True)
+
+    for anterior in REPORTES_DIR.glob(f'{_base(alcance, objeto_id, desde, hasta)}_v*.xlsx'):
+        if anterior != ruta:
+            anterior.unlink(missing_ok=True)
+    return ruta
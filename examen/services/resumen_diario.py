@@ -0,0 +1,214 @@
+# examen/services/resumen_diario.py
+"""
+Mantenimiento y consulta de ResumenDiarioParasito.
+
+Cada muestra aporta +1 a una fila (fecha, centro, parásito, estadio) por cada
+parásito presente. Al guardar o eliminar una muestra se aplica solo la
+diferencia entre su estado anterior y el actual.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum
+
+from examen.models import Muestra, ResumenDiarioParasito
+from examen.parasitos import CAMPOS as CAMPOS_PARASITOS
+
+
+def claves_resumen(estado):
+    """
+    Claves (fecha, centro_id, parasito_campo, estadio) a las que aporta
+    una muestra, a partir de su estado capturado (Muestra.capturar_estado).
+    """
+    if not estado:
+        return []
+    return [
+        (estado['fecha_examen'], estado['centro_atencion_id'], campo, estado[campo])
+        for campo in CAMPOS_PARASITOS
+        if estado[campo]
+    ]
+
+
+def aplicar_delta(anterior, actual):
+    """
+    Aplica la diferencia entre dos estados de una muestra.
+    Para una muestra nueva `anterior` es None; para una eliminada `actual` es None.
+    """
+    deltas = Counter()
+    for clave in claves_resumen(anterior):
+        deltas[clave] -= 1
+    for clave in claves_resumen(actual):
+        deltas[clave] += 1
+
+    for clave, delta in deltas.items():
+        if delta:
+            _sumar(clave, delta)
+
+
+def aplicar_estados(estados):
+    """Suma al resumen un lote de muestras nuevas (estados de Muestra.capturar_estado)"""
+    aplicar_deltas(Counter(clave for estado in estados for clave in claves_resumen(estado)))
+
+
+def aplicar_deltas(deltas):
+    """
+    Aplica {clave: delta} acumulado de muchas muestras.
+    Las filas existentes se actualizan con un UPDATE por valor de delta y las
+    nuevas se crean con una sola inserción.
+    """
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    fechas = [fecha for fecha, _, _, _ in deltas]
+    existentes = {
+        (fila['fecha_examen'], fila['centro_atencion_id'], fila['parasito_campo'], fila['estadio']): fila['id']
+        for fila in ResumenDiarioParasito.objects.filter(
+            fecha_examen__gte=min(fechas),
+            fecha_examen__lte=max(fechas),
+            centro_atencion_id__in={centro_id for _, centro_id, _, _ in deltas},
+        ).values('id', 'fecha_examen', 'centro_atencion_id', 'parasito_campo', 'estadio')
+    }
+
+    por_delta = {}
+    nuevas = {}
+    for clave, delta in deltas.items():
+        if clave in existentes:
+            por_delta.setdefault(delta, []).append(existentes[clave])
+        elif delta > 0:
+            nuevas[clave] = delta
+
+    for delta, ids in por_delta.items():
+        ResumenDiarioParasito.objects.filter(id__in=ids).update(
+            total_muestras=F('total_muestras') + delta
+        )
+        if delta < 0:
+            ResumenDiarioParasito.objects.filter(id__in=ids, total_muestras__lte=0).delete()
+
+    try:
+        with transaction.atomic():
+            ResumenDiarioParasito.objects.bulk_create(
+                [
+                    ResumenDiarioParasito(
+                        fecha_examen=fecha,
+                        centro_atencion_id=centro_id,
+                        parasito_campo=campo,
+                        estadio=estadio,
+                        total_muestras=delta,
+                    )
+                    for (fecha, centro_id, campo, estadio), delta in nuevas.items()
+                ],
+                batch_size=1000,
+            )
+    except IntegrityError:
+        # Otra transacción creó alguna de las filas: se suman una por una
+        for clave, delta in nuevas.items():
+            _sumar(clave, delta)
+
+
+def _sumar(clave, delta):
+    """Suma `delta` a una fila del resumen de forma atómica (F())"""
+    fecha, centro_id, campo, estadio = clave
+    filtro = {
+        'fecha_examen': fecha,
+        'centro_atencion_id': centro_id,
+        'parasito_campo': campo,
+        'estadio': estadio,
+    }
+    filas = ResumenDiarioParasito.objects.filter(**filtro).update(
+        total_muestras=F('total_muestras') + delta
+    )
+
+    if not filas and delta > 0:
+        try:
+            with transaction.atomic():
+                ResumenDiarioParasito.objects.create(total_muestras=delta, **filtro)
+        except IntegrityError:
+            # Otra transacción creó la fila entre el UPDATE y el INSERT
+            ResumenDiarioParasito.objects.filter(**filtro).update(
+                total_muestras=F('total_muestras') + delta
+            )
+    elif delta < 0:
+        ResumenDiarioParasito.objects.filter(total_muestras__lte=0, **filtro).delete()
+
+
+def totales_resumen(muestras):
+    """
+    {(fecha, centro_id, parasito_campo, estadio): total} de un queryset de
+    muestras. Una consulta agrupada por parásito.
+    """
+    totales = {}
+    for campo in CAMPOS_PARASITOS:
+        grupos = muestras.exclude(**{campo: ''}).filter(
+            **{f'{campo}__isnull': False}
+        ).order_by().values('fecha_examen', 'centro_atencion_id', campo).annotate(n=Count('id'))
+
+        for grupo in grupos:
+            totales[(grupo['fecha_examen'], grupo['centro_atencion_id'], campo, grupo[campo])] = grupo['n']
+    return totales
+
+
+def reconstruir_resumen_diario(muestras=None):
+    """
+    Reconstruye el resumen desde cero a partir de Muestra.
+    Una consulta agrupada por parásito; devuelve el número de filas creadas.
+    """
+    if muestras is None:
+        muestras = Muestra.objects.all()
+
+    filas = [
+        ResumenDiarioParasito(
+            fecha_examen=fecha,
+            centro_atencion_id=centro_id,
+            parasito_campo=campo,
+            estadio=estadio,
+            total_muestras=total,
+        )
+        for (fecha, centro_id, campo, estadio), total in totales_resumen(muestras).items()
+    ]
+
+    with transaction.atomic():
+        ResumenDiarioParasito.objects.all().delete()
+        ResumenDiarioParasito.objects.bulk_create(filas, batch_size=1000)
+
+    return len(filas)
+
+
+def serie_diaria(centro_id, parasito_campo, fecha_inicio, fecha_fin):
+    """{fecha: casos} de un parásito en un centro entre dos fechas (una consulta)"""
+    return dict(
+        ResumenDiarioParasito.objects.filter(
+            centro_atencion_id=centro_id,
+            parasito_campo=parasito_campo,
+            fecha_examen__gte=fecha_inicio,
+            fecha_examen__lte=fecha_fin,
+        ).order_by().values('fecha_examen').annotate(
+            casos=Sum('total_muestras')
+        ).values_list('fecha_examen', 'casos')
+    )
+
+
+def contar_casos(centro_id, parasito_campo, fecha_inicio, fecha_fin):
+    """
+    Casos de un parásito en un centro: (casos en la ventana [fecha_inicio, fecha_fin],
+    casos del día fecha_fin). Una sola consulta sobre el resumen.
+    """
+    totales = ResumenDiarioParasito.objects.filter(
+        centro_atencion_id=centro_id,
+        parasito_campo=parasito_campo,
+        fecha_examen__gte=fecha_inicio,
+        fecha_examen__lte=fecha_fin,
+    ).aggregate(
+        ventana=Sum('total_muestras'),
+        dia=Sum('total_muestras', filter=Q(fecha_examen=fecha_fin)),
+    )
+    return totales['ventana'] or 0, totales['dia'] or 0
+
+
+def ultima_fecha_con_casos(centro_id, parasito_campo):
+    """Fecha más reciente con casos de un parásito en un centro (None si no hay)"""
+    return ResumenDiarioParasito.objects.filter(
+        centro_atencion_id=centro_id,
+        parasito_campo=parasito_campo,
+        total_muestras__gt=0,
+    ).aggregate(fecha=Max('fecha_examen'))['fecha']
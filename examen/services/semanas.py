@@ -0,0 +1,192 @@
+# examen/services/semanas.py
+"""
+Resolución de semanas epidemiológicas (ISO 8601).
+
+- El año, la semana y las fechas de inicio (lunes) y fin (domingo) se
+  calculan con aritmética de calendario, sin consultar la BD.
+- El id de SemanaEpidemiologica sale de una cache en memoria del proceso
+  {(año, semana): id}. Ante una semana desconocida se asegura su año
+  completo: una lectura y, si faltan semanas, un solo
+  bulk_create(ignore_conflicts=True). Los guardados de un año entero
+  cuestan a lo sumo una escritura.
+- Las semanas creadas dentro de una transacción se cachean al confirmarla:
+  si se revierte, la cache no queda con ids que no existen (y las claves
+  pendientes se olvidan).
+- Borrar o editar una semana vacía la cache del proceso (signals.py). Un
+  id cacheado no se vuelve a verificar al resolver: si otro proceso borró
+  la semana, el guardado de la muestra falla con IntegrityError y
+  Muestra.save llama a descartar() antes de reintentar.
+"""
+import threading
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from examen.models import SemanaEpidemiologica
+
+
+_cache = {}
+
+# Semanas creadas en transacciones aún sin confirmar (no se cachean), por
+# hilo como las conexiones: {(año, semana): callback de on_commit}
+_local = threading.local()
+
+
+# ==================== CALENDARIO ====================
+
+def semana_iso(fecha):
+    """(año, semana, inicio, fin) ISO de una fecha"""
+    año, semana, dia = fecha.isocalendar()
+    inicio = fecha - timedelta(days=dia - 1)
+    return año, semana, inicio, inicio + timedelta(days=6)
+
+
+def semanas_del_año(año):
+    """Número de semanas ISO del año (52 o 53)"""
+    # El 28 de diciembre siempre cae en la última semana del año
+    return date(año, 12, 28).isocalendar()[1]
+
+
+def semanas_del_rango(desde, hasta):
+    """[(año, semana, inicio, fin)] de todas las semanas que tocan el rango"""
+    semanas = []
+    lunes = semana_iso(desde)[2]
+    while lunes <= hasta:
+        semanas.append(semana_iso(lunes))
+        lunes += timedelta(days=7)
+    return semanas
+
+
+def semanas_de_años(años):
+    """[(año, semana, inicio, fin)] de todas las semanas de los años ISO indicados"""
+    semanas = []
+    for año in sorted(años):
+        semanas.extend(semanas_del_rango(
+            date.fromisocalendar(año, 1, 1),
+            date.fromisocalendar(año, semanas_del_año(año), 7),
+        ))
+    return semanas
+
+
+# ==================== CACHE Y CREACIÓN ====================
+
+def _leer(años):
+    """{(año, semana): id} de las semanas guardadas de esos años"""
+    return {
+        (año, semana): semana_id
+        for semana_id, año, semana in SemanaEpidemiologica.objects.filter(
+            año__gte=min(años), año__lte=max(años)
+        ).values_list('id', 'año', 'semana')
+    }
+
+
+def _sin_confirmar():
+    """
+    Claves creadas en la transacción en curso y aún sin confirmar. Si la
+    transacción (o el savepoint) se revirtió, Django descartó su callback
+    de on_commit: esas claves se olvidan.
+    """
+    pendientes = getattr(_local, 'pendientes', None)
+    if pendientes is None:
+        pendientes = _local.pendientes = {}
+    if pendientes:
+        vigentes = {id(funcion) for _, funcion, _ in transaction.get_connection().run_on_commit}
+        for clave in [clave for clave, al_confirmar in pendientes.items() if id(al_confirmar) not in vigentes]:
+            del pendientes[clave]
+    return pendientes
+
+
+def _recordar(ids, creadas):
+    """Agrega ids a la cache; las creadas dentro de una transacción, al confirmarla"""
+    sin_confirmar = _sin_confirmar()
+    if creadas and transaction.get_connection().in_atomic_block:
+        pendientes = {clave: ids[clave] for clave in creadas}
+
+        def al_confirmar():
+            for clave in pendientes:
+                sin_confirmar.pop(clave, None)
+            _cache.update(pendientes)
+
+        sin_confirmar.update(dict.fromkeys(pendientes, al_confirmar))
+        transaction.on_commit(al_confirmar)
+
+    _cache.update({clave: semana_id for clave, semana_id in ids.items() if clave not in sin_confirmar})
+
+
+def descartar(semana_id):
+    """
+    Si la semana `semana_id` ya no existe (otro proceso la borró), olvida su
+    año de la cache y devuelve True; el próximo resolver() lo vuelve a leer.
+    """
+    if semana_id is None or SemanaEpidemiologica.objects.filter(pk=semana_id).exists():
+        return False
+    años = {año for (año, _), cacheado in _cache.items() if cacheado == semana_id}
+    for clave in [clave for clave in _cache if clave[0] in años]:
+        del _cache[clave]
+    return True
+
+
+def _asegurar(semanas):
+    """
+    Garantiza que existan las semanas [(año, semana, inicio, fin)].
+    Devuelve ({(año, semana): id}, {(año, semana) creadas}).
+    """
+    claves = {(año, semana) for año, semana, _, _ in semanas}
+    if claves <= _cache.keys():
+        return {clave: _cache[clave] for clave in claves}, set()
+
+    años = {año for año, _ in claves}
+    ids = _leer(años)
+    faltantes = [
+        SemanaEpidemiologica(año=año, semana=semana, fecha_inicio=inicio, fecha_fin=fin)
+        for año, semana, inicio, fin in semanas
+        if (año, semana) not in ids
+    ]
+
+    creadas = set()
+    if faltantes:
+        SemanaEpidemiologica.objects.bulk_create(faltantes, ignore_conflicts=True, batch_size=500)
+        anteriores = ids
+        ids = _leer(años)
+        creadas = ids.keys() - anteriores.keys()
+
+    _recordar(ids, creadas)
+    return {clave: ids[clave] for clave in claves}, creadas
+
+
+def prellenar(desde, hasta):
+    """
+    Crea todas las semanas que faltan entre dos fechas con una sola inserción.
+    Devuelve el número de semanas creadas.
+    """
+    return len(_asegurar(semanas_del_rango(desde, hasta))[1])
+
+
+def asegurar_año(año):
+    """({(año, semana): id} del año ISO, {(año, semana) creadas})"""
+    return _asegurar(semanas_de_años({año}))
+
+
+def resolver(fecha):
+    """(semana_id, año, semana) de una fecha; crea la semana si no existe"""
+    año, semana, _, _ = semana_iso(fecha)
+    semana_id = _cache.get((año, semana))
+    if semana_id is None:
+        # Se asegura el año completo: el resto de sus semanas queda en cache
+        semana_id = asegurar_año(año)[0][(año, semana)]
+    return semana_id, año, semana
+
+
+def resolver_fechas(fechas):
+    """{fecha: (semana_id, año, semana)} de muchas fechas, creando en bloque las semanas que falten"""
+    iso = {fecha: semana_iso(fecha)[:2] for fecha in set(fechas)}
+    if not iso:
+        return {}
+    ids, _ = _asegurar(semanas_de_años({año for año, _ in iso.values()}))
+    return {fecha: (ids[clave], *clave) for fecha, clave in iso.items()}
+
+
+def limpiar_cache():
+    """Vacía la cache de semanas de este proceso"""
+    _cache.clear()
+    _sin_confirmar().clear()
@@ -0,0 +1,268 @@
+# examen/services/sqlite.py
+"""
+SQLite afinado para laboratorios regionales de un solo servidor.
+
+Cada conexión nueva a SQLite recibe los pragmas de settings.SQLITE_PRAGMAS
+(ver el receiver de connection_created en signals.py):
+
+- journal_mode=wal: los lectores no bloquean al escritor ni al revés
+- synchronous=normal: en WAL solo hace fsync en los checkpoints; un corte
+  de luz puede perder la última transacción, pero no corrompe la base
+- busy_timeout: milisegundos que se espera un bloqueo antes de devolver
+  'database is locked'
+- cache_size, mmap_size, temp_store: memoria para páginas, lectura por
+  memoria mapeada y tablas temporales en RAM
+
+El mantenimiento periódico (`manage.py optimizar_sqlite`) actualiza las
+estadísticas del planificador (PRAGMA optimize o ANALYZE), vacía el WAL y
+compacta el índice de búsqueda; `manage.py benchmark_sqlite` compara el
+rendimiento de escritura con y sin los pragmas.
+"""
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from examen.services.busqueda import TABLA_FTS, indice_disponible
+
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS_POR_DEFECTO = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 10000,
+    # Negativo: KiB por conexión (32 MiB)
+    'cache_size': -32000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# Pragmas que se aceptan en SQLITE_PRAGMAS
+PRAGMAS_PERMITIDOS = {
+    'journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size',
+    'temp_store', 'wal_autocheckpoint', 'journal_size_limit', 'foreign_keys',
+}
+
+
+def pragmas_configurados():
+    """Pragmas de settings.SQLITE_PRAGMAS (por defecto PRAGMAS_POR_DEFECTO)"""
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', PRAGMAS_POR_DEFECTO)
+    desconocidos = set(pragmas) - PRAGMAS_PERMITIDOS
+    if desconocidos:
+        raise ValueError(f'Pragmas de SQLite no soportados: {", ".join(sorted(desconocidos))}')
+    return pragmas
+
+
+def _sentencia(nombre, valor):
+    # Los valores van dentro del SQL: solo números o palabras
+    valor = str(valor)
+    if not re.fullmatch(r'-?\w+', valor):
+        raise ValueError(f'Valor no válido para PRAGMA {nombre}: {valor!r}')
+    return f'PRAGMA {nombre} = {valor}'
+
+
+def ejecutar_pragmas(cursor, pragmas):
+    """Aplica los pragmas con un cursor DB-API de sqlite3 (Django o sqlite3 directo)"""
+    for nombre, valor in pragmas.items():
+        try:
+            cursor.execute(_sentencia(nombre, valor))
+        except (OperationalError, sqlite3.OperationalError) as error:
+            # Pasar a WAL necesita acceso exclusivo: si otra conexión tiene
+            # la base abierta se reintenta en la próxima conexión
+            if nombre != 'journal_mode':
+                raise
+            logger.warning('No se pudo aplicar PRAGMA journal_mode=%s: %s', valor, error)
+
+
+def aplicar_pragmas(connection):
+    """Aplica settings.SQLITE_PRAGMAS a una conexión recién abierta"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = pragmas_configurados()
+    if pragmas:
+        with connection.cursor() as cursor:
+            ejecutar_pragmas(cursor, pragmas)
+
+
+def pragmas_actuales(using=DEFAULT_DB_ALIAS):
+    """{pragma: valor} vigentes en la conexión"""
+    with connections[using].cursor() as cursor:
+        actuales = {}
+        for nombre in sorted(PRAGMAS_PERMITIDOS):
+            cursor.execute(f'PRAGMA {nombre}')
+            fila = cursor.fetchone()
+            actuales[nombre] = fila[0] if fila else None
+    return actuales
+
+
+def optimizar(analizar=False, compactar=False, using=DEFAULT_DB_ALIAS):
+    """
+    Mantenimiento periódico de una base SQLite:
+
+    1. PRAGMA optimize (ANALYZE solo de las tablas que lo necesitan) o, con
+       `analizar`, ANALYZE completo. Las estadísticas también las usa el
+       conteo estimado del admin (services.conteo)
+    2. Compacta el índice FTS5 de búsqueda
+    3. Con `compactar`, VACUUM (reescribe el archivo; bloquea la base)
+    4. Checkpoint del WAL truncando el archivo -wal
+
+    Devuelve {'antes', 'despues'} con el tamaño del archivo (páginas,
+    páginas libres y bytes) y el resultado del checkpoint.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        raise ValueError('La base de datos no es SQLite')
+
+    antes = _tamano(connection)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE' if analizar else 'PRAGMA optimize')
+        if indice_disponible(using):
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+        if compactar:
+            cursor.execute('VACUUM')
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        checkpoint = cursor.fetchone()
+    return {
+        'antes': antes,
+        'despues': _tamano(connection),
+        # (bloqueado, páginas en el WAL, páginas copiadas a la base)
+        'checkpoint': checkpoint,
+    }
+
+
+def _tamano(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        paginas = cursor.fetchone()[0]
+        cursor.execute('PRAGMA freelist_count')
+        libres = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        tamano_pagina = cursor.fetchone()[0]
+    return {
+        'paginas': paginas,
+        'paginas_libres': libres,
+        'bytes': paginas * tamano_pagina,
+    }
+
+
+# ==================== BENCHMARK DE ESCRITURA ====================
+
+_ESQUEMA_BENCHMARK = [
+    'CREATE TABLE muestra (id INTEGER PRIMARY KEY, numero TEXT UNIQUE, fecha TEXT, '
+    'centro INTEGER, resultado TEXT, observaciones TEXT)',
+    'CREATE INDEX muestra_centro_fecha ON muestra (centro, fecha)',
+]
+
+
+def _escritor(ruta, pragmas, inmediata, numero, transacciones, resultado):
+    """
+    Registra muestras de una en una como la digitación en un laboratorio:
+    cada transacción lee (conteo del día del centro) y luego inserta.
+    """
+    conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+    ejecutar_pragmas(conexion.cursor(), pragmas)
+    centro = numero % 5
+    for i in range(transacciones):
+        inicio = time.perf_counter()
+        try:
+            conexion.execute('BEGIN IMMEDIATE' if inmediata else 'BEGIN')
+            conexion.execute(
+                'SELECT count(*) FROM muestra WHERE centro = ? AND fecha = ?', (centro, '2025-01-15')
+            ).fetchone()
+            conexion.execute(
+                'INSERT INTO muestra (numero, fecha, centro, resultado, observaciones) VALUES (?, ?, ?, ?, ?)',
+                (f'B{numero}-{i}', '2025-01-15', centro, 'POS' if i % 3 else 'NEG', 'x' * 200),
+            )
+            conexion.execute('COMMIT')
+            resultado['latencias'].append(time.perf_counter() - inicio)
+        except sqlite3.OperationalError:
+            # 'database is locked': la muestra no se guardó
+            if conexion.in_transaction:
+                conexion.execute('ROLLBACK')
+            resultado['errores'] += 1
+    conexion.close()
+
+
+def _lector(ruta, pragmas, detener, resultado):
+    """Consultas de dashboard mientras se escribe"""
+    conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+    ejecutar_pragmas(conexion.cursor(), pragmas)
+    while not detener.is_set():
+        try:
+            conexion.execute('SELECT centro, resultado, count(*) FROM muestra GROUP BY centro, resultado').fetchall()
+            resultado['lecturas'] += 1
+        except sqlite3.OperationalError:
+            resultado['errores_lectura'] += 1
+    conexion.close()
+
+
+def medir_escritura(pragmas, inmediata, escritores=4, lectores=2, transacciones=200, directorio=None):
+    """
+    Escribe `transacciones` muestras por cada uno de `escritores` hilos (con
+    `lectores` hilos consultando a la vez) en una base nueva en `directorio`.
+    `pragmas` como SQLITE_PRAGMAS; `inmediata` usa BEGIN IMMEDIATE.
+
+    Devuelve {'transacciones_por_segundo', 'guardadas', 'errores',
+    'latencia_p95_ms', 'lecturas', 'errores_lectura', 'segundos'}.
+    """
+    with tempfile.TemporaryDirectory(dir=directorio) as carpeta:
+        ruta = os.path.join(carpeta, 'benchmark.sqlite3')
+        conexion = sqlite3.connect(ruta)
+        for sentencia in _ESQUEMA_BENCHMARK:
+            conexion.execute(sentencia)
+        conexion.commit()
+        conexion.close()
+
+        # Un diccionario por hilo; se suman al final
+        resultados = [
+            {'latencias': [], 'errores': 0, 'lecturas': 0, 'errores_lectura': 0}
+            for _ in range(escritores + lectores)
+        ]
+        detener = threading.Event()
+        hilos_escritores = [
+            threading.Thread(
+                target=_escritor,
+                args=(ruta, pragmas, inmediata, numero, transacciones, resultados[numero]),
+            )
+            for numero in range(escritores)
+        ]
+        hilos_lectores = [
+            threading.Thread(target=_lector, args=(ruta, pragmas, detener, resultados[escritores + numero]))
+            for numero in range(lectores)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos_lectores + hilos_escritores:
+            hilo.start()
+        for hilo in hilos_escritores:
+            hilo.join()
+        segundos = time.perf_counter() - inicio
+        detener.set()
+        for hilo in hilos_lectores:
+            hilo.join()
+
+    latencias = sorted(latencia for resultado in resultados for latencia in resultado['latencias'])
+    return {
+        'transacciones_por_segundo': len(latencias) / segundos,
+        'guardadas': len(latencias),
+        'errores': sum(resultado['errores'] for resultado in resultados),
+        'latencia_p95_ms': latencias[int(len(latencias) * 0.95)] * 1000 if latencias else None,
+        'lecturas': sum(resultado['lecturas'] for resultado in resultados),
+        'errores_lectura': sum(resultado['errores_lectura'] for resultado in resultados),
+        'segundos': segundos,
+    }
+
+
+def directorio_base_datos(using=DEFAULT_DB_ALIAS):
+    """Carpeta del archivo SQLite configurado (el benchmark mide ese disco), o None"""
+    configuracion = settings.DATABASES[using]
+    if configuracion['ENGINE'] != 'django.db.backends.sqlite3' or str(configuracion['NAME']).startswith(':memory:'):
+        return None
+    return Path(configuracion['NAME']).resolve().parent
@@ -0,0 +1,214 @@
+# examen/services/tareas.py
+"""
+Cola de tareas diferidas en la base de datos (sin broker externo).
+
+- Los signals encolan tareas con transaction.on_commit: si la transacción
+  se revierte no se encola nada.
+- Cada tarea tiene una clave; solo puede haber una PENDIENTE por clave, así
+  diez guardados sobre la misma semana y centro son un solo recálculo.
+- `manage.py procesar_tareas` toma lotes, los agrupa por tipo y ejecuta el
+  manejador del tipo una vez por lote. Los manejadores son idempotentes
+  (recalculan desde los datos), por lo que repetir una tarea es seguro.
+- Si un lote falla, sus tareas se reintentan con espera creciente hasta
+  MAX_INTENTOS y luego quedan como FALLIDA.
+- Con TAREAS_SINCRONAS = True (pruebas, scripts) las tareas se ejecutan al
+  confirmar la transacción, sin pasar por la tabla.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from examen.models import TareaDiferida, Muestra
+from .alertas import evaluar_lote
+from .estadisticas import recalcular_pares
+from .cache_dashboard import invalidar_por_centros
+from .reportes_excel import generar_reporte
+
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = getattr(settings, 'TAREAS_MAX_INTENTOS', 5)
+
+# Segundos tras los que una tarea EN_PROCESO se considera abandonada
+TIEMPO_ABANDONO = getattr(settings, 'TAREAS_TIEMPO_ABANDONO', 600)
+
+
+def _sincronas():
+    return getattr(settings, 'TAREAS_SINCRONAS', False)
+
+
+# ==================== MANEJADORES ====================
+
+def _procesar_estadisticas(lista_parametros):
+    """Recalcula los pares (semana, centro) del lote y sus semanas con una consulta agrupada"""
+    claves = {(p['semana_id'], p['centro_id']) for p in lista_parametros}
+    recalcular_pares(claves)
+
+    # Las series semanales de los dashboards se leen de estas tablas
+    centros = {centro_id for _, centro_id in claves}
+    transaction.on_commit(lambda: invalidar_por_centros(centros))
+
+
+def _procesar_alertas(lista_parametros):
+    """Evalúa los pares (centro, parásito, fecha) del lote agrupados por centro y parásito"""
+    muestra_ids = {p['muestra_id'] for p in lista_parametros if p.get('muestra_id')}
+    muestras = Muestra.objects.in_bulk(muestra_ids)
+
+    evaluar_lote(
+        (
+            p['centro_id'],
+            p['parasito_campo'],
+            date.fromisoformat(p['fecha']),
+            muestras.get(p.get('muestra_id')),
+        )
+        for p in lista_parametros
+    )
+
+
+def _procesar_reportes(lista_parametros):
+    """Genera los reportes Excel pedidos (los que ya están al día no se repiten)"""
+    for p in lista_parametros:
+        generar_reporte(p['alcance'], p['objeto_id'], tuple(p['desde']), tuple(p['hasta']))
+
+
+MANEJADORES = {
+    'estadisticas': _procesar_estadisticas,
+    'alertas': _procesar_alertas,
+    'reporte_excel': _procesar_reportes,
+}
+
+
+# ==================== ENCOLAR ====================
+
+def tarea_estadisticas(semana_id, centro_id):
+    """Recálculo completo de un par; los signals aplican deltas y ya no la encolan"""
+    return TareaDiferida(
+        tipo='estadisticas',
+        clave=f'estadisticas:{semana_id}:{centro_id}',
+        parametros={'semana_id': semana_id, 'centro_id': centro_id},
+    )
+
+
+def tarea_alertas(centro_id, parasito_campo, fecha, muestra_id=None):
+    """Con muestra_id la evaluación puede crear la alerta; sin ella solo la actualiza"""
+    modo = 'crear' if muestra_id else 'actualizar'
+    return TareaDiferida(
+        tipo='alertas',
+        clave=f'alertas:{centro_id}:{parasito_campo}:{fecha.isoformat()}:{modo}',
+        parametros={
+            'centro_id': centro_id,
+            'parasito_campo': parasito_campo,
+            'fecha': fecha.isoformat(),
+            'muestra_id': muestra_id,
+        },
+    )
+
+
+def tarea_reporte_excel(alcance, objeto_id, desde, hasta):
+    """Reporte Excel de un alcance y un rango de semanas ((año, semana))"""
+    return TareaDiferida(
+        tipo='reporte_excel',
+        clave=f'reporte_excel:{alcance}:{objeto_id}:{desde[0]}-{desde[1]}:{hasta[0]}-{hasta[1]}',
+        parametros={
+            'alcance': alcance,
+            'objeto_id': objeto_id,
+            'desde': list(desde),
+            'hasta': list(hasta),
+        },
+    )
+
+
+def _insertar(tareas):
+    # Las claves que ya tienen una tarea PENDIENTE se ignoran (se agrupan)
+    TareaDiferida.objects.bulk_create(tareas, ignore_conflicts=True)
+
+
+def encolar(tareas):
+    """
+    Encola tareas (instancias sin guardar de TareaDiferida) al confirmar la
+    transacción actual. En modo síncrono las ejecuta en ese momento.
+    """
+    tareas = list(tareas)
+    if not tareas:
+        return
+    if _sincronas():
+        transaction.on_commit(lambda: ejecutar(tareas))
+    else:
+        transaction.on_commit(lambda: _insertar(tareas))
+
+
+# ==================== PROCESAR ====================
+
+def ejecutar(tareas):
+    """Ejecuta un grupo de tareas agrupadas por tipo (una llamada por tipo)"""
+    por_tipo = {}
+    for tarea in tareas:
+        por_tipo.setdefault(tarea.tipo, {})[tarea.clave] = tarea.parametros
+    for tipo, parametros in por_tipo.items():
+        MANEJADORES[tipo](list(parametros.values()))
+
+
+def _tomar_lote(tamano):
+    """Marca como EN_PROCESO hasta `tamano` tareas disponibles y las devuelve"""
+    ahora = timezone.now()
+    disponibles = TareaDiferida.objects.filter(
+        Q(estado='PENDIENTE', disponible_desde__lte=ahora) |
+        Q(estado='EN_PROCESO', fecha_inicio_proceso__lt=ahora - timedelta(seconds=TIEMPO_ABANDONO))
+    ).order_by('id')
+
+    with transaction.atomic():
+        if transaction.get_connection().features.has_select_for_update_skip_locked:
+            disponibles = disponibles.select_for_update(skip_locked=True)
+        ids = list(disponibles.values_list('id', flat=True)[:tamano])
+        TareaDiferida.objects.filter(id__in=ids).update(
+            estado='EN_PROCESO', fecha_inicio_proceso=ahora
+        )
+    return list(TareaDiferida.objects.filter(id__in=ids, fecha_inicio_proceso=ahora))
+
+
+def _reintentar(tareas, error):
+    """Devuelve las tareas a PENDIENTE con espera creciente, o las marca FALLIDA"""
+    for tarea in tareas:
+        tarea.intentos += 1
+        tarea.ultimo_error = error
+        if tarea.intentos >= MAX_INTENTOS:
+            tarea.estado = 'FALLIDA'
+        else:
+            tarea.estado = 'PENDIENTE'
+            tarea.disponible_desde = timezone.now() + timedelta(seconds=30 * 2 ** tarea.intentos)
+        try:
+            with transaction.atomic():
+                tarea.save(update_fields=['intentos', 'ultimo_error', 'estado', 'disponible_desde'])
+        except IntegrityError:
+            # Ya hay otra tarea PENDIENTE con la misma clave: esa hará el trabajo
+            tarea.delete()
+
+
+def procesar_lote(tamano=500):
+    """
+    Procesa un lote de tareas. Devuelve (procesadas, fallidas).
+    Si falla el manejador de un tipo se reintentan solo las tareas de ese tipo.
+    """
+    tareas = _tomar_lote(tamano)
+    procesadas = fallidas = 0
+
+    por_tipo = {}
+    for tarea in tareas:
+        por_tipo.setdefault(tarea.tipo, []).append(tarea)
+
+    for tipo, grupo in por_tipo.items():
+        try:
+            with transaction.atomic():
+                ejecutar(grupo)
+                TareaDiferida.objects.filter(id__in=[t.id for t in grupo]).delete()
+            procesadas += len(grupo)
+        except Exception as e:
+            logger.exception('Error procesando tareas de tipo %s', tipo)
+            _reintentar(grupo, f'{type(e).__name__}: {e}')
+            fallidas += len(grupo)
+
+    return procesadas, fallidas
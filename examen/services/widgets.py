@@ -0,0 +1,276 @@
+# examen/services/widgets.py
+"""
+Datos de cada sección (widget) de los dashboards, por alcance.
+
+Cada widget se calcula de forma independiente y devuelve estructuras
+serializables a JSON (sin instancias de modelos), para que la API los
+entregue por separado y la página los cargue solo cuando se muestran.
+
+Alcances: 'nacional', 'region' (Region) y 'centro' (CentroAtencion).
+"""
+from django.db.models import Count, Q
+
+from examen.models import Muestra, CentroAtencion, Region, Departamento
+from .dashboard import (
+    PARASITOS,
+    calcular_tasa,
+    clasificar_intensidad,
+    resumen_general,
+    agregados_por_region,
+    top_parasitos,
+    series_semanales_nacionales,
+    series_semanales_por_centros,
+    _resumen_basico,
+    _vacio,
+)
+
+
+# ==================== ALCANCE ====================
+
+def muestras_del_alcance(alcance, objeto=None):
+    """Queryset de muestras visibles en un alcance"""
+    if alcance == 'region':
+        return Muestra.objects.filter(centro_atencion__region=objeto)
+    if alcance == 'centro':
+        return Muestra.objects.filter(centro_atencion=objeto)
+    return Muestra.objects.all()
+
+
+def regiones_del_alcance(alcance, objeto=None):
+    """Regiones que se muestran en las secciones por región"""
+    regiones = Region.objects.filter(activo=True).order_by('numero_region')
+    if alcance == 'region':
+        return regiones.filter(pk=objeto.pk)
+    if alcance == 'centro':
+        return regiones.filter(pk=objeto.region_id)
+    return regiones
+
+
+def centros_del_alcance(alcance, objeto=None):
+    """Centros de atención visibles en un alcance"""
+    centros = CentroAtencion.objects.all()
+    if alcance == 'region':
+        return centros.filter(region=objeto)
+    if alcance == 'centro':
+        return centros.filter(pk=objeto.pk)
+    return centros
+
+
+# ==================== WIDGETS ====================
+
+def widget_kpis(alcance, objeto=None):
+    """Total de muestras, positivas, negativas y tasa de positividad"""
+    return _resumen_basico(muestras_del_alcance(alcance, objeto))
+
+
+def widget_semanas(alcance, objeto=None):
+    """Positivas y negativas de las últimas 12 semanas epidemiológicas"""
+    if alcance == 'region':
+        series = series_semanales_por_centros(centro_atencion__region=objeto)
+    elif alcance == 'centro':
+        series = series_semanales_por_centros(centro_atencion=objeto)
+    else:
+        series = series_semanales_nacionales()
+
+    semanas_labels, semanas_positivas, semanas_negativas = series
+    return {
+        'labels': semanas_labels,
+        'positivas': semanas_positivas,
+        'negativas': semanas_negativas,
+    }
+
+
+def widget_top_parasitos(alcance, objeto=None):
+    """Top 5 de parásitos en las muestras positivas más recientes"""
+    limite = 50 if alcance == 'centro' else 100
+    top = top_parasitos(muestras_del_alcance(alcance, objeto), ultimas=limite)
+    return [{'nombre': nombre, 'total': total} for nombre, total in top]
+
+
+def _totales_por_region(alcance, objeto=None):
+    """Lista de (region, total, positivas) del alcance en una sola consulta agrupada"""
+    filas = muestras_del_alcance(alcance, objeto).order_by().values(
+        'centro_atencion__region'
+    ).annotate(
+        total=Count('id'),
+        positivas=Count('id', filter=Q(resultado='POS')),
+    )
+    por_region = {fila['centro_atencion__region']: fila for fila in filas}
+
+    resultado = []
+    for region in regiones_del_alcance(alcance, objeto):
+        fila = por_region.get(region.id, {'total': 0, 'positivas': 0})
+        resultado.append((region, fila['total'], fila['positivas']))
+    return resultado
+
+
+def widget_regiones(alcance, objeto=None):
+    """Muestras por región"""
+    return [
+        {
+            'numero_region': region.numero_region,
+            'nombre': region.nombre,
+            'total_muestras': total,
+            'total_positivas': positivas,
+            'tasa_positividad': calcular_tasa(positivas, total),
+        }
+        for region, total, positivas in _totales_por_region(alcance, objeto)
+    ]
+
+
+def widget_mapa_regiones(alcance, objeto=None):
+    """Tasa de positividad por región con su intensidad y color para el mapa"""
+    datos = []
+    for region, total, positivas in _totales_por_region(alcance, objeto):
+        tasa = calcular_tasa(positivas, total)
+        intensidad, color = clasificar_intensidad(tasa)
+        datos.append({
+            'numero': region.numero_region,
+            'nombre': region.nombre,
+            'total_muestras': total,
+            'total_positivas': positivas,
+            'tasa_positividad': tasa,
+            'intensidad': intensidad,
+            'color': color,
+            'es_metropolitana': region.es_metropolitana,
+        })
+    return datos
+
+
+def widget_matriz(alcance, objeto=None):
+    """Matriz región x parásito para el top 5 de parásitos recientes"""
+    muestras = muestras_del_alcance(alcance, objeto)
+    limite = 50 if alcance == 'centro' else 100
+    top_5_nombres = [nombre for nombre, _ in top_parasitos(muestras, ultimas=limite)]
+    nombre_a_campo = {nombre: campo for campo, nombre in PARASITOS}
+
+    por_region = agregados_por_region(muestras) if top_5_nombres else {}
+    totales_por_parasito = {parasito: 0 for parasito in top_5_nombres}
+    filas = []
+
+    for region in regiones_del_alcance(alcance, objeto):
+        fila_region = por_region.get(region.id) or _vacio()
+        fila = {
+            'numero_region': region.numero_region,
+            'nombre': region.nombre,
+            'parasitos': {},
+            'total': fila_region['positivas'],
+        }
+        for parasito in top_5_nombres:
+            count = fila_region[nombre_a_campo[parasito]]
+            fila['parasitos'][parasito] = count
+            totales_por_parasito[parasito] += count
+        filas.append(fila)
+
+    return {
+        'parasitos': top_5_nombres,
+        'filas': filas,
+        'totales_por_parasito': totales_por_parasito,
+        'total_positivas': sum(fila['positivas'] for fila in por_region.values()),
+    }
+
+
+def widget_parasitos(alcance, objeto=None):
+    """Conteo de muestras positivas de los 21 parásitos"""
+    general = resumen_general(muestras_del_alcance(alcance, objeto))
+    todos_parasitos = [
+        {
+            'nombre': nombre,
+            'total': general[campo],
+            'porcentaje': calcular_tasa(general[campo], general['positivas']),
+        }
+        for campo, nombre in PARASITOS
+    ]
+    return sorted(todos_parasitos, key=lambda x: x['total'], reverse=True)
+
+
+def widget_mapa_departamentos(alcance, objeto=None):
+    """Tasa de positividad y top 3 de parásitos por departamento"""
+    por_region = agregados_por_region(muestras_del_alcance(alcance, objeto))
+
+    por_departamento = {}
+    for region in Region.objects.filter(activo=True, id__in=por_region.keys()):
+        if region.departamento_id is None:
+            continue
+        acumulado = por_departamento.setdefault(region.departamento_id, _vacio())
+        for clave, valor in por_region[region.id].items():
+            acumulado[clave] += valor
+
+    datos = []
+    for departamento in Departamento.objects.all().order_by('codigo'):
+        fila_depto = por_departamento.get(departamento.id) or _vacio()
+        total = fila_depto['total']
+        positivas = fila_depto['positivas']
+
+        top_parasitos_depto = []
+        if positivas > 0:
+            parasitos_depto = [
+                {'nombre': nombre, 'count': fila_depto[campo]}
+                for campo, nombre in PARASITOS
+                if fila_depto[campo] > 0
+            ]
+            top_parasitos_depto = sorted(parasitos_depto, key=lambda x: x['count'], reverse=True)[:3]
+
+        datos.append({
+            'codigo': departamento.codigo,
+            'nombre': departamento.nombre,
+            'total_muestras': total,
+            'total_positivas': positivas,
+            'tasa_positividad': calcular_tasa(positivas, total),
+            'top_parasitos': top_parasitos_depto,
+        })
+    return datos
+
+
+def widget_top_centros(alcance, objeto=None):
+    """Top 10 de centros con más muestras"""
+    centros = centros_del_alcance(alcance, objeto).annotate(
+        num_muestras=Count('muestras')
+    ).filter(num_muestras__gt=0).order_by('-num_muestras').values(
+        'id', 'codigo', 'nombre', 'region__numero_region', 'num_muestras'
+    )[:10]
+
+    return [
+        {
+            'id': centro['id'],
+            'codigo': centro['codigo'],
+            'nombre': centro['nombre'],
+            'numero_region': centro['region__numero_region'],
+            'num_muestras': centro['num_muestras'],
+        }
+        for centro in centros
+    ]
+
+
+def widget_ultimas_muestras(alcance, objeto=None):
+    """Últimas 10 muestras registradas"""
+    muestras = muestras_del_alcance(alcance, objeto).order_by('-fecha_examen').values(
+        'numero_examen', 'expediente__dni', 'centro_atencion__codigo',
+        'fecha_examen', 'semana_numero', 'resultado',
+    )[:10]
+
+    return [
+        {
+            'numero_examen': muestra['numero_examen'],
+            'dni': muestra['expediente__dni'],
+            'centro': muestra['centro_atencion__codigo'],
+            'fecha_examen': muestra['fecha_examen'].strftime('%d/%m/%Y'),
+            'semana_numero': muestra['semana_numero'],
+            'resultado': muestra['resultado'],
+        }
+        for muestra in muestras
+    ]
+
+
+WIDGETS = {
+    'kpis': widget_kpis,
+    'semanas': widget_semanas,
+    'top-parasitos': widget_top_parasitos,
+    'regiones': widget_regiones,
+    'matriz': widget_matriz,
+    'parasitos': widget_parasitos,
+    'mapa-regiones': widget_mapa_regiones,
+    'mapa-departamentos': widget_mapa_departamentos,
+    'top-centros': widget_top_centros,
+    'ultimas-muestras': widget_ultimas_muestras,
+}
@@ -1,9 +1,35 @@
 # examen/signals.py
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.db.backends.signals import connection_created
 from django.dispatch import receiver
+from django.db import transaction
 from django.contrib.auth.models import User
-from datetime import timedelta
-from .models import Profile, Rol, Muestra, SemanaEpidemiologica, ConfiguracionAlerta, Alerta
+from .models import Profile, Rol, Muestra, Expediente, SemanaEpidemiologica, ConfiguracionAlerta, Departamento, Municipio
+from .services.resumen_diario import aplicar_delta
+from .services.estadisticas import aplicar_delta_estadisticas
+from .services.alertas import claves_cambio, invalidar_configuraciones
+from .services.tareas import encolar, tarea_alertas
+from .services.cache_dashboard import invalidar_por_centros
+from .services.geografia import invalidar_resolutor
+from .services.busqueda import (
+    crear_indice_texto,
+    indexar_expedientes,
+    indexar_muestras,
+    desindexar,
+    TIPO_EXPEDIENTE,
+    TIPO_MUESTRA,
+)
+from .services.sqlite import aplicar_pragmas
+from .services.semanas import limpiar_cache as limpiar_cache_semanas_proceso
+from .batch import lote_activo, omitir_en_lote
+
+
+# ==================== SIGNALS DE CONEXIÓN ====================
+
+@receiver(connection_created)
+def configurar_conexion_sqlite(sender, connection, **kwargs):
+    """Aplica settings.SQLITE_PRAGMAS a cada conexión SQLite nueva"""
+    aplicar_pragmas(connection)
 
 
 # ==================== SIGNALS DE USUARIO ====================
@@ -38,159 +64,230 @@ def guardar_profile_usuario(sender, instance, **kwargs):
 # ==================== SIGNALS PARA SEMANA EPIDEMIOLÓGICA ====================
 
 @receiver(post_save, sender=Muestra)
+@omitir_en_lote
 def actualizar_estadisticas_semana(sender, instance, created, **kwargs):
     """
-    Actualiza las estadísticas cacheadas en SemanaEpidemiologica
-    cuando se crea o modifica una Muestra.
+    Actualiza las estadísticas cacheadas en SemanaEpidemiologica y
+    EstadisticaSemanalCentro cuando se crea o modifica una Muestra.
+    Solo suma la diferencia entre el estado anterior y el actual (semana,
+    centro y resultado) con UPDATE ... F(), sin recontar la semana.
     """
-    if instance.semana_epidemiologica:
-        semana = instance.semana_epidemiologica
-        
-        # Recalcular estadísticas
-        muestras = semana.muestras.all()
-        semana.total_muestras = muestras.count()
-        semana.total_positivas = muestras.filter(resultado='POS').count()
-        semana.total_negativas = muestras.filter(resultado='NEG').count()
-        
-        semana.save(update_fields=['total_muestras', 'total_positivas', 'total_negativas', 'fecha_actualizacion'])
+    anterior = None if created else getattr(instance, '_estado_anterior', None)
+    aplicar_delta_estadisticas(anterior, _estado_actual(instance))
 
 
 @receiver(post_delete, sender=Muestra)
+@omitir_en_lote
 def actualizar_estadisticas_semana_eliminar(sender, instance, **kwargs):
     """
-    Actualiza las estadísticas cuando se elimina una Muestra.
+    Descuenta de las estadísticas semanales la muestra eliminada.
+    """
+    estado = getattr(instance, '_estado_anterior', None) or instance.capturar_estado()
+    aplicar_delta_estadisticas(estado, None)
+
+
+@receiver(post_save, sender=SemanaEpidemiologica)
+@receiver(post_delete, sender=SemanaEpidemiologica)
+def limpiar_cache_semanas(sender, instance, update_fields=None, **kwargs):
+    """
+    Vacía la cache de ids de semanas del proceso cuando se borra o edita
+    una semana. Los recálculos de totales (update_fields sin año ni
+    semana) no la tocan.
     """
-    if instance.semana_epidemiologica:
-        semana = instance.semana_epidemiologica
-        
-        # Recalcular estadísticas
-        muestras = semana.muestras.all()
-        semana.total_muestras = muestras.count()
-        semana.total_positivas = muestras.filter(resultado='POS').count()
-        semana.total_negativas = muestras.filter(resultado='NEG').count()
-        
-        semana.save(update_fields=['total_muestras', 'total_positivas', 'total_negativas', 'fecha_actualizacion'])
+    if update_fields is not None and not {'año', 'semana'} & set(update_fields):
+        return
+    limpiar_cache_semanas_proceso()
+    transaction.on_commit(limpiar_cache_semanas_proceso)
+
+
+# ==================== SIGNALS PARA RESUMEN DIARIO ====================
+
+@receiver(pre_save, sender=Muestra)
+def capturar_estado_anterior_muestra(sender, instance, **kwargs):
+    """
+    Asegura que la muestra conozca su estado guardado antes de modificarse.
+    Normalmente viene de Muestra.from_db; si no (instancia construida a mano
+    o con campos diferidos) se lee de la BD.
+    """
+    if instance._state.adding or getattr(instance, '_estado_anterior', None):
+        return
+    
+    guardada = Muestra.objects.filter(pk=instance.pk).first()
+    instance._estado_anterior = guardada.capturar_estado() if guardada else None
+
+
+def _estado_actual(instance):
+    """Estado recién guardado de la muestra (Muestra.capturar_estado)"""
+    actual = instance.capturar_estado()
+    if actual is None:
+        # Instancia con campos diferidos: leer el estado recién guardado
+        actual = Muestra.objects.get(pk=instance.pk).capturar_estado()
+    return actual
+
+
+@receiver(post_save, sender=Muestra)
+@omitir_en_lote
+def actualizar_resumen_diario(sender, instance, created, **kwargs):
+    """
+    Aplica a ResumenDiarioParasito la diferencia entre el estado anterior
+    y el actual de la muestra. Debe ejecutarse antes de detectar alertas.
+    """
+    anterior = None if created else getattr(instance, '_estado_anterior', None)
+    aplicar_delta(anterior, _estado_actual(instance))
+
+
+@receiver(post_delete, sender=Muestra)
+@omitir_en_lote
+def actualizar_resumen_diario_eliminar(sender, instance, **kwargs):
+    """Descuenta del resumen diario la muestra eliminada"""
+    estado = getattr(instance, '_estado_anterior', None) or instance.capturar_estado()
+    aplicar_delta(estado, None)
 
 
 # ==================== SIGNALS PARA ALERTAS EPIDEMIOLÓGICAS ====================
 
+def _encolar_alertas(anterior, actual, muestra_id=None):
+    """Encola la evaluación de los pares (centro, parásito, fecha) que cambiaron"""
+    nuevas, quitadas = claves_cambio(anterior, actual)
+    encolar(
+        [tarea_alertas(centro_id, campo, fecha, muestra_id) for centro_id, campo, fecha in nuevas] +
+        [tarea_alertas(centro_id, campo, fecha) for centro_id, campo, fecha in quitadas]
+    )
+
+
 @receiver(post_save, sender=Muestra)
+@omitir_en_lote
 def detectar_alertas_epidemiologicas(sender, instance, created, **kwargs):
     """
-    Detecta automáticamente alertas epidemiológicas cuando se registra una muestra positiva.
+    Detecta automáticamente alertas epidemiológicas cuando se registra o
+    modifica una muestra.
     
     FLUJO:
-    1. Verifica que la muestra sea positiva
-    2. Obtiene los parásitos encontrados
-    3. Por cada parásito, busca si hay configuración de alerta activa
-    4. Cuenta casos recientes en la ventana de tiempo
-    5. Determina el nivel de alerta según umbrales
-    6. Crea o actualiza la alerta correspondiente
+    1. Compara los parásitos monitoreados de la muestra antes y después de guardar
+    2. Encola la evaluación de cada caso nuevo y de cada caso que la muestra
+       dejó de aportar (se procesa con `manage.py procesar_tareas`)
+    3. La tarea cuenta los casos de la ventana desde el resumen diario,
+       determina el nivel según umbrales y crea o actualiza la alerta
     """
-    
-    # Solo procesar muestras positivas
-    if instance.resultado != 'POS':
+    anterior = None if created else getattr(instance, '_estado_anterior', None)
+    _encolar_alertas(anterior, _estado_actual(instance), instance.pk)
+
+
+@receiver(post_delete, sender=Muestra)
+@omitir_en_lote
+def detectar_alertas_epidemiologicas_eliminar(sender, instance, **kwargs):
+    """Descuenta la muestra eliminada de las alertas abiertas"""
+    estado = getattr(instance, '_estado_anterior', None) or instance.capturar_estado()
+    _encolar_alertas(estado, None)
+
+
+@receiver(post_save, sender=ConfiguracionAlerta)
+@receiver(post_delete, sender=ConfiguracionAlerta)
+def invalidar_configuraciones_alerta(sender, instance, **kwargs):
+    """Descarta la cache de configuraciones activas del motor de alertas"""
+    invalidar_configuraciones()
+    transaction.on_commit(invalidar_configuraciones)
+
+# ==================== SIGNALS PARA GEOGRAFÍA ====================
+
+@receiver(post_save, sender=Departamento)
+@receiver(post_delete, sender=Departamento)
+@receiver(post_save, sender=Municipio)
+@receiver(post_delete, sender=Municipio)
+def invalidar_resolutor_geografico(sender, instance, **kwargs):
+    """Descarta el índice de nombres de departamentos y municipios"""
+    invalidar_resolutor()
+    transaction.on_commit(invalidar_resolutor)
+
+
+# ==================== SIGNALS PARA CACHE DE DASHBOARDS ====================
+
+def _centros_afectados(instance):
+    """Centro actual de la muestra y, si cambió, el anterior"""
+    anterior = getattr(instance, '_estado_anterior', None)
+    centros = {instance.centro_atencion_id}
+    if anterior:
+        centros.add(anterior['centro_atencion_id'])
+    return centros
+
+
+@receiver(post_save, sender=Muestra)
+@omitir_en_lote
+def invalidar_cache_dashboards(sender, instance, **kwargs):
+    """
+    Invalida los snapshots nacional, regional y de centro afectados por la muestra.
+    Se hace al confirmar la transacción para no recalcular con datos sin confirmar.
+    """
+    centros = _centros_afectados(instance)
+    transaction.on_commit(lambda: invalidar_por_centros(centros))
+
+
+@receiver(post_delete, sender=Muestra)
+@omitir_en_lote
+def invalidar_cache_dashboards_eliminar(sender, instance, **kwargs):
+    """Invalida los snapshots afectados por una muestra eliminada"""
+    centros = _centros_afectados(instance)
+    transaction.on_commit(lambda: invalidar_por_centros(centros))
+
+
+# ==================== SIGNALS PARA EL ÍNDICE DE BÚSQUEDA ====================
+
+@receiver(post_migrate)
+def crear_indice_busqueda(sender, using, **kwargs):
+    """Crea el índice de texto del motor (FTS5 o tsvector) sobre EntradaBusqueda"""
+    if sender.name == 'examen':
+        crear_indice_texto(using)
+
+
+@receiver(post_save, sender=Expediente)
+def indexar_expediente(sender, instance, created, **kwargs):
+    """
+    Actualiza la entrada de búsqueda del expediente y, si ya existía, las
+    de sus muestras (llevan el nombre y el DNI del paciente).
+    """
+    indexar_expedientes(Expediente.objects.filter(pk=instance.pk))
+    if not created:
+        indexar_muestras(Muestra.objects.filter(expediente=instance))
+
+
+@receiver(post_delete, sender=Expediente)
+def desindexar_expediente(sender, instance, **kwargs):
+    desindexar(TIPO_EXPEDIENTE, [instance.pk])
+
+
+# También en modo lote: es una sola inserción por muestra y la búsqueda
+# debe encontrarla en cuanto se confirma el bloque
+@receiver(post_save, sender=Muestra)
+def indexar_muestra(sender, instance, **kwargs):
+    """Actualiza la entrada de búsqueda de la muestra"""
+    indexar_muestras(Muestra.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Muestra)
+def desindexar_muestra(sender, instance, **kwargs):
+    desindexar(TIPO_MUESTRA, [instance.pk])
+
+
+# ==================== SIGNALS EN MODO LOTE ====================
+
+@receiver(post_save, sender=Muestra)
+def registrar_muestra_en_lote(sender, instance, created, **kwargs):
+    """
+    Dentro de lote_de_muestras() los receivers anteriores no se ejecutan:
+    solo se anota el cambio y se recalcula todo al salir del bloque.
+    """
+    lote = lote_activo()
+    if lote is None:
         return
-    
-    # Obtener parásitos encontrados en esta muestra
-    parasitos_encontrados = instance.get_parasitos_encontrados()
-    
-    # Por cada parásito encontrado, verificar si hay alerta configurada
-    for parasito_nombre, estadio in parasitos_encontrados.items():
-        
-        # Mapeo de nombres legibles a campos del modelo
-        mapeo_parasitos = {
-            'Entamoeba histolytica': 'entamoeba_histolytica',
-            'Entamoeba coli': 'entamoeba_coli',
-            'Entamoeba hartmanni': 'entamoeba_hartmanni',
-            'Endolimax nana': 'endolimax_nana',
-            'Iodamoeba bütschlii': 'iodamoeba_butschlii',
-            'Giardia intestinalis': 'giardia_intestinalis',
-            'Pentatrichomonas hominis': 'pentatrichomonas_hominis',
-            'Chilomastix mesnili': 'chilomastix_mesnili',
-            'Balantidium coli': 'balantidium_coli',
-            'Blastocystis sp': 'blastocystis_sp',
-            'Cystoisospora belli': 'cystoisospora_belli',
-            'Cyclospora cayetanensis': 'cyclospora_cayetanensis',
-            'Cryptosporidium spp': 'cryptosporidium_spp',
-            'Ascaris lumbricoides': 'ascaris_lumbricoides',
-            'Trichuris trichiura': 'trichuris_trichiura',
-            'Necator americanus': 'necator_americanus',
-            'Strongyloides stercoralis': 'strongyloides_stercoralis',
-            'Enterobius vermicularis': 'enterobius_vermicularis',
-            'Taenia spp': 'taenia_spp',
-            'Hymenolepis diminuta': 'hymenolepis_diminuta',
-            'Rodentolepis nana': 'rodentolepis_nana',
-        }
-        
-        parasito_campo = mapeo_parasitos.get(parasito_nombre)
-        if not parasito_campo:
-            continue  # Parásito no mapeado, saltar
-        
-        # Buscar configuración de alerta activa para este parásito
-        try:
-            config = ConfiguracionAlerta.objects.get(
-                parasito_campo=parasito_campo,
-                activo=True
-            )
-        except ConfiguracionAlerta.DoesNotExist:
-            continue  # No hay alerta configurada para este parásito
-        
-        # Calcular ventana de tiempo
-        fecha_inicio = instance.fecha_examen - timedelta(days=config.ventana_tiempo_dias)
-        
-        # Contar casos recientes en el centro en la ventana de tiempo
-        casos_ventana = Muestra.objects.filter(
-            centro_atencion=instance.centro_atencion,
-            fecha_examen__gte=fecha_inicio,
-            fecha_examen__lte=instance.fecha_examen,
-            resultado='POS',
-            **{f'{parasito_campo}__isnull': False}
-        ).exclude(**{parasito_campo: ''}).count()
-        
-        # Contar casos en el día actual
-        casos_dia = Muestra.objects.filter(
-            centro_atencion=instance.centro_atencion,
-            fecha_examen=instance.fecha_examen,
-            resultado='POS',
-            **{f'{parasito_campo}__isnull': False}
-        ).exclude(**{parasito_campo: ''}).count()
-        
-        # Determinar nivel de alerta (evaluar de mayor a menor gravedad)
-        nivel = None
-        if casos_ventana >= config.umbral_emergencia:
-            nivel = 'ROJO'
-        elif casos_ventana >= config.umbral_alerta:
-            nivel = 'NARANJA'
-        elif casos_ventana >= config.umbral_precaucion:
-            nivel = 'AMARILLO'
-        else:
-            # No alcanza ningún umbral, no crear alerta
-            continue
-        
-        # Verificar si ya existe una alerta ACTIVA para este parásito en este centro
-        alerta_existente = Alerta.objects.filter(
-            configuracion=config,
-            centro_atencion=instance.centro_atencion,
-            estado__in=['ACTIVA', 'EN_PROCESO']
-        ).first()
-        
-        if alerta_existente:
-            # ACTUALIZAR alerta existente
-            alerta_existente.numero_casos = casos_ventana
-            alerta_existente.numero_casos_dia = casos_dia
-            alerta_existente.nivel = nivel
-            alerta_existente.save()
-            
-        else:
-            # CREAR nueva alerta
-            Alerta.objects.create(
-                configuracion=config,
-                muestra_origen=instance,
-                nivel=nivel,
-                estado='ACTIVA',
-                centro_atencion=instance.centro_atencion,
-                region=instance.centro_atencion.region,
-                numero_casos=casos_ventana,
-                numero_casos_dia=casos_dia
-            )
\ No newline at end of file
+    anterior = None if created else getattr(instance, '_estado_anterior', None)
+    lote.registrar(anterior, _estado_actual(instance), instance)
+
+
+@receiver(post_delete, sender=Muestra)
+def registrar_muestra_eliminada_en_lote(sender, instance, **kwargs):
+    """Anota en el lote en curso la muestra eliminada"""
+    lote = lote_activo()
+    if lote is None:
+        return
+    estado = getattr(instance, '_estado_anterior', None) or instance.capturar_estado()
+    lote.registrar(estado, None)
@@ -1,3 +1,585 @@
-from django.test import TestCase
+import io
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from examen.batch import lote_de_muestras
+from examen.models import (
+    Rol, Profile, Region, CentroAtencion, Expediente, Muestra, SemanaEpidemiologica,
+    ConfiguracionAlerta, Alerta, TareaDiferida,
+)
+from examen.services import importar_muestras, reconciliar_estadisticas, reconstruir_en_paralelo
+from examen.services import invalidar_configuraciones
+from examen.services import busqueda, semanas, tareas
+from examen.services.boletines import semana_con_boletin, ultima_semana_cerrada
+
+
+class DatosBase:
+    """Usuario LNP, dos regiones con un centro cada una y un expediente"""
+
+    @staticmethod
+    def crear_usuario(username, nivel, **asignacion):
+        """Usuario con rol de `nivel`; `asignacion` es la región o el centro del profile"""
+        # Con el profile ya asignado el signal no crea el rol CAT por defecto
+        usuario = User(username=username)
+        rol, _ = Rol.objects.get_or_create(nombre=f'Rol {nivel}', nivel=nivel)
+        usuario.profile = Profile(rol=rol, **asignacion)
+        usuario.save()
+        return usuario
+
+    @classmethod
+    def crear_datos_base(cls):
+        cls.usuario = cls.crear_usuario('lnp', 'LNP')
+        cls.region_1 = Region.objects.create(nombre='Región 1', numero_region=1)
+        cls.region_2 = Region.objects.create(nombre='Región 2', numero_region=2)
+        cls.centro_a = CentroAtencion.objects.create(nombre='Centro A', codigo='CA', direccion='x', region=cls.region_1)
+        cls.centro_b = CentroAtencion.objects.create(nombre='Centro B', codigo='CB', direccion='x', region=cls.region_2)
+        cls.expediente = Expediente.objects.create(
+            dni='0801-1990-00001', primer_nombre='Ana', primer_apellido='López', sexo='F',
+            fecha_nacimiento=date(1990, 1, 1), direccion='x', centro_atencion=cls.centro_a,
+            usuario_creacion=cls.usuario,
+        )
+
+    def crear_muestra(self, numero, fecha, centro, **parasitos):
+        return Muestra.objects.create(
+            expediente=self.expediente, numero_examen=numero, fecha_examen=fecha,
+            centro_atencion=centro, consistencia='FOR', usuario_creacion=self.usuario, **parasitos,
+        )
+
+
+class ContadoresTestCase(DatosBase, TestCase):
+    """
+    Los contadores mantenidos por deltas (estadísticas semanales por centro,
+    totales de la semana y resumen diario) deben coincidir con un recálculo
+    desde las muestras después de cualquier alta, edición o baja.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos_base()
+
+    def assertContadoresCuadran(self):
+        reconciliacion = reconciliar_estadisticas(reparar=False)
+        self.assertEqual(reconciliacion['diferencias'], [])
+        for tipo in ('semana', 'centro'):
+            verificacion = reconstruir_en_paralelo(tipo, procesos=1, verificar=True)
+            self.assertEqual(verificacion['diferencias'], [], tipo)
+
+    def test_crear_editar_eliminar(self):
+        positiva = self.crear_muestra('M-1', date(2025, 3, 4), self.centro_a, giardia_intestinalis='Q')
+        negativa = self.crear_muestra('M-2', date(2025, 3, 5), self.centro_a)
+        otra = self.crear_muestra('M-3', date(2025, 3, 12), self.centro_b, ascaris_lumbricoides='H')
+        self.assertContadoresCuadran()
+
+        # Cambio de semana (y de año epidemiológico)
+        positiva.fecha_examen = date(2024, 12, 31)
+        positiva.save()
+        # Cambio de centro y de región
+        negativa.centro_atencion = self.centro_b
+        negativa.save()
+        # Cambio de resultado: de positiva a negativa y al revés
+        otra.ascaris_lumbricoides = ''
+        otra.save()
+        negativa.blastocystis_sp = 'O'
+        negativa.save()
+        self.assertContadoresCuadran()
+
+        # Una instancia leída de la BD (sin la foto tomada al guardar)
+        recargada = Muestra.objects.get(pk=positiva.pk)
+        recargada.giardia_intestinalis = ''
+        recargada.fecha_examen = date(2025, 3, 20)
+        recargada.save()
+        self.assertContadoresCuadran()
+
+        otra.delete()
+        Muestra.objects.get(pk=negativa.pk).delete()
+        self.assertContadoresCuadran()
+
+    def test_lote_e_importacion(self):
+        muestras = [
+            self.crear_muestra(f'M-{i}', date(2025, 5, 1 + i), self.centro_a)
+            for i in range(6)
+        ]
+
+        with lote_de_muestras():
+            for i, muestra in enumerate(muestras[:4]):
+                muestra.giardia_intestinalis = 'T' if i % 2 else ''
+                muestra.centro_atencion = self.centro_b if i % 2 else self.centro_a
+                muestra.fecha_examen = date(2025, 6, 10 + i)
+                muestra.save()
+            muestras[4].delete()
+            self.crear_muestra('M-LOTE', date(2025, 6, 2), self.centro_b, ascaris_lumbricoides='H')
+        self.assertContadoresCuadran()
+
+        archivo = io.StringIO(
+            'dni,numero_examen,fecha_examen,centro,consistencia,giardia_intestinalis,'
+            'primer_nombre,primer_apellido,sexo,fecha_nacimiento\n'
+            '0801-1990-00001,IMP-1,2025-06-03,CA,FOR,Q,,,,\n'
+            '0801-1990-00002,IMP-2,2025-06-04,CB,FOR,,Luis,Pérez,M,1985-02-03\n'
+            '0801-1990-00003,IMP-3,2025-07-15,CB,FOR,T,Rosa,Díaz,F,2015-08-09\n'
+        )
+        resultado = importar_muestras(archivo, self.usuario, formato='csv')
+        self.assertEqual(resultado['errores'], [])
+        self.assertEqual(resultado['importadas'], 3)
+        self.assertContadoresCuadran()
+
+
+class ImportacionTestCase(DatosBase, TestCase):
+    """Validación por fila de la importación masiva: las filas con error no se insertan"""
+
+    ENCABEZADO = (
+        'dni,numero_examen,fecha_examen,centro,consistencia,giardia_intestinalis,'
+        'primer_nombre,primer_apellido,sexo,fecha_nacimiento\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos_base()
+
+    def importar(self, filas, **opciones):
+        return importar_muestras(io.StringIO(self.ENCABEZADO + filas), self.usuario, formato='csv', **opciones)
+
+    def test_errores_por_fila(self):
+        self.crear_muestra('M-EXISTE', date(2025, 1, 2), self.centro_a)
+        mañana = (date.today() + timedelta(days=1)).isoformat()
+        resultado = self.importar(
+            '0801-1990-00001,IMP-1,2025-06-03,CA,FOR,Q,,,,\n'       # 2: válida
+            '0801-1990-1,IMP-2,2025-06-03,CA,FOR,,,,,\n'            # 3
+            '0801-1990-00001,IMP-1,2025-06-03,CA,FOR,,,,,\n'        # 4
+            ',,,,,,,,,\n'                                           # 5: vacía, se omite
+            f'0801-1990-00001,IMP-5,{mañana},CA,FOR,,,,,\n'         # 6
+            '0801-1990-00001,IMP-6,2025-06-03,CB,FOR,,,,,\n'        # 7
+            '0801-1990-00001,IMP-7,2025-06-03,CA,FOR,X,,,,\n'       # 8
+            '0801-1990-00002,IMP-8,2025-06-03,CA,FOR,,Luis,,M,\n'   # 9
+            '0801-1990-00001,M-EXISTE,03/06/2025,ca,for,,,,,\n'     # 10
+            '0801-1990-00003,IMP-10,04/06/2025,ca,for,t,Rosa,Díaz,f,2015-08-09\n',  # 11: válida
+            centros=CentroAtencion.objects.filter(pk=self.centro_a.pk),
+        )
+        errores = dict(resultado['errores'])
+        self.assertEqual(sorted(errores), [3, 4, 6, 7, 8, 9, 10])
+        self.assertIn('DNI con formato inválido', errores[3])
+        self.assertIn('repetido en el archivo', errores[4])
+        self.assertIn('Fecha de examen futura', errores[6])
+        self.assertIn('no encontrado o no permitido', errores[7])
+        self.assertIn('Estadio inválido para Giardia', errores[8])
+        self.assertIn('sin primer nombre o primer apellido', errores[9])
+        self.assertIn('fecha de nacimiento inválida', errores[9])
+        self.assertIn('ya registrado', errores[10])
+
+        self.assertEqual((resultado['filas'], resultado['importadas'], resultado['expedientes_creados']), (9, 2, 1))
+        nueva = Muestra.objects.get(numero_examen='IMP-10')
+        self.assertEqual((nueva.fecha_examen, nueva.giardia_intestinalis), (date(2025, 6, 4), 'T'))
+        self.assertEqual(nueva.expediente.sexo, 'F')
+        self.assertFalse(Muestra.objects.filter(numero_examen__in=['IMP-2', 'IMP-5', 'IMP-6']).exists())
+
+    def test_simular(self):
+        resultado = self.importar('0801-1990-00001,IMP-1,2025-06-03,CA,FOR,Q,,,,\n', simular=True)
+        self.assertEqual((resultado['filas'], resultado['importadas'], resultado['errores']), (1, 0, []))
+        self.assertFalse(Muestra.objects.exists())
+
+    def test_columnas_obligatorias(self):
+        with self.assertRaisesMessage(ValueError, 'Faltan columnas obligatorias: centro'):
+            importar_muestras(
+                io.StringIO('dni,numero_examen,fecha_examen,consistencia\n'), self.usuario, formato='csv'
+            )
+        with self.assertRaisesMessage(ValueError, 'Formato de archivo no soportado'):
+            importar_muestras('muestras.ods', self.usuario)
+
+    def test_xlsx_con_alias(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        hoja = libro.active
+        hoja.append(['DNI', 'Numero', 'Fecha', 'Codigo Centro', 'Consistencia', 'Giardia intestinalis'])
+        hoja.append(['0801-1990-00001', 1234, date(2025, 6, 3), 'CA', 'FOR', 'Q'])
+        archivo = io.BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+
+        resultado = importar_muestras(archivo, self.usuario, formato='xlsx')
+        self.assertEqual(resultado['errores'], [])
+        muestra = Muestra.objects.get(numero_examen='1234')
+        self.assertEqual((muestra.fecha_examen, muestra.giardia_intestinalis), (date(2025, 6, 3), 'Q'))
+
+
+class BusquedaTestCase(DatosBase, TestCase):
+    """Búsqueda por nombre, DNI y número de examen, con y sin índice de texto"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos_base()
+        cls.maria = Expediente.objects.create(
+            dni='0801-1985-00010', primer_nombre='María', segundo_nombre='José', primer_apellido='Núñez',
+            sexo='F', fecha_nacimiento=date(1985, 4, 2), direccion='x', centro_atencion=cls.centro_b,
+            usuario_creacion=cls.usuario,
+        )
+        muestras = (
+            ('LNP-10', date(2025, 3, 1), cls.expediente, cls.centro_a),
+            ('LNP-1', date(2025, 2, 1), cls.expediente, cls.centro_a),
+            ('LNP-100', date(2025, 4, 1), cls.maria, cls.centro_b),
+        )
+        for numero, fecha, expediente, centro in muestras:
+            Muestra.objects.create(
+                expediente=expediente, numero_examen=numero, fecha_examen=fecha,
+                centro_atencion=centro, consistencia='FOR', usuario_creacion=cls.usuario,
+            )
+
+    def etiquetas(self, texto, **opciones):
+        return [entrada.etiqueta for entrada in busqueda.buscar(texto, **opciones)]
+
+    def assertBusquedas(self):
+        # Prefijos de palabras, sin tildes ni mayúsculas
+        self.assertEqual(self.etiquetas('mar nun', tipos=[busqueda.TIPO_EXPEDIENTE]), ['0801-1985-00010 - María José Núñez'])
+        self.assertEqual(self.etiquetas('ANA LÓP', tipos=[busqueda.TIPO_EXPEDIENTE]), ['0801-1990-00001 - Ana López'])
+        self.assertEqual(self.etiquetas('ana perez'), [])
+        # Clave: coincidencia exacta primero y luego las más recientes
+        self.assertEqual(
+            [etiqueta.split(' - ')[0] for etiqueta in self.etiquetas('lnp-1', tipos=[busqueda.TIPO_MUESTRA])],
+            ['LNP-1', 'LNP-100', 'LNP-10'],
+        )
+        self.assertEqual(self.etiquetas('08011985', tipos=[busqueda.TIPO_EXPEDIENTE]), ['0801-1985-00010 - María José Núñez'])
+        # Alcance por centros y mínimo de caracteres
+        centros = CentroAtencion.objects.filter(pk=self.centro_a.pk)
+        self.assertEqual(len(self.etiquetas('lnp', centros=centros)), 2)
+        self.assertEqual(self.etiquetas('l'), [])
+
+        muestras = busqueda.filtrar(Muestra.objects.all(), 'maria')
+        self.assertEqual(list(muestras.values_list('numero_examen', flat=True)), ['LNP-100'])
+
+    def test_buscar_con_indice(self):
+        self.assertTrue(busqueda.indice_disponible())
+        self.assertBusquedas()
+
+    def test_buscar_sin_indice(self):
+        with mock.patch.dict(busqueda._indice_texto, {'default': False}):
+            self.assertBusquedas()
+
+    def test_indice_al_editar_y_eliminar(self):
+        self.maria.primer_apellido = 'Paz'
+        self.maria.save()
+        self.assertEqual(self.etiquetas('nunez'), [])
+        # Las muestras del expediente también se reindexan
+        self.assertEqual(len(self.etiquetas('maria paz')), 2)
+
+        Muestra.objects.get(numero_examen='LNP-100').delete()
+        self.assertEqual(len(self.etiquetas('maria paz')), 1)
+
+    def test_api(self):
+        url = reverse('api_buscar')
+        self.client.force_login(self.crear_usuario('cat', 'CAT', centro_atencion=self.centro_a))
+        resultados = self.client.get(url, {'q': 'lnp'}).json()['resultados']
+        self.assertEqual({(r['tipo'], r['etiqueta'].split(' - ')[0]) for r in resultados},
+                         {('muestra', 'LNP-1'), ('muestra', 'LNP-10')})
+        self.assertEqual(len(self.client.get(url, {'q': 'lnp', 'limite': 1}).json()['resultados']), 1)
+        self.assertEqual(self.client.get(url, {'q': 'lnp', 'tipo': 'otro'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'lnp', 'limite': 'x'}).status_code, 400)
+
+
+class SemanasTestCase(DatosBase, TransactionTestCase):
+    """
+    Cache de ids de semanas: sin consultas al acertar y recuperación cuando
+    la semana cacheada desaparece o su transacción se revierte.
+    (TransactionTestCase: la FK a la semana se verifica al confirmar.)
+    """
+
+    def setUp(self):
+        semanas.limpiar_cache()
+        self.crear_datos_base()
+
+    def test_resolver_sin_consultas_con_cache(self):
+        semanas.resolver(date(2025, 3, 4))
+        with self.assertNumQueries(0):
+            semanas.resolver(date(2025, 3, 4))
+            semanas.resolver(date(2025, 11, 20))
+
+    def test_semana_borrada_en_este_proceso(self):
+        semana_id, _, _ = semanas.resolver(date(2025, 3, 4))
+        SemanaEpidemiologica.objects.get(pk=semana_id).delete()
+
+        muestra = self.crear_muestra('M-1', date(2025, 3, 4), self.centro_a)
+        self.assertNotEqual(muestra.semana_epidemiologica_id, semana_id)
+        self.assertTrue(SemanaEpidemiologica.objects.filter(pk=muestra.semana_epidemiologica_id).exists())
+
+    def test_semana_borrada_en_otro_proceso(self):
+        semana_id, _, _ = semanas.resolver(date(2025, 3, 4))
+        # Sin signals: como si la borrara otro proceso
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM examen_semanaepidemiologica WHERE id = %s', [semana_id])
+
+        muestra = self.crear_muestra('M-1', date(2025, 3, 4), self.centro_a)
+        self.assertTrue(SemanaEpidemiologica.objects.filter(pk=muestra.semana_epidemiologica_id).exists())
+        self.assertEqual(Muestra.objects.filter(semana_epidemiologica__semana=10).count(), 1)
+
+    def test_transaccion_revertida(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                semanas.resolver(date(2025, 3, 4))
+                raise RuntimeError
+
+        semana_id, _, _ = semanas.resolver(date(2025, 3, 4))
+        self.assertTrue(SemanaEpidemiologica.objects.filter(pk=semana_id).exists())
+        # Las claves de la transacción revertida no quedan pendientes para siempre
+        with self.assertNumQueries(0):
+            semanas.resolver(date(2025, 3, 4))
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class AlertasTestCase(DatosBase, TestCase):
+    """
+    Creación y descuento de alertas. La alerta abierta se reevalúa en su
+    fecha de referencia: editar, eliminar o cargar tarde una muestra
+    antigua no la reemplaza con una ventana anterior.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos_base()
+        ConfiguracionAlerta.objects.create(
+            parasito_campo='giardia_intestinalis', umbral_precaucion=2, umbral_alerta=4,
+            umbral_emergencia=8, ventana_tiempo_dias=7, creado_por=cls.usuario,
+        )
+        # La cache de configuraciones sobrevive al rollback de la clase
+        cls.addClassCleanup(invalidar_configuraciones)
+
+    def setUp(self):
+        # captureOnCommitCallbacks cachea semanas que el rollback del test borra
+        self.addCleanup(semanas.limpiar_cache)
+
+    def guardar(self, muestra):
+        with self.captureOnCommitCallbacks(execute=True):
+            muestra.save()
+
+    def crear(self, numero, fecha, **parasitos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.crear_muestra(numero, fecha, self.centro_a, **parasitos)
+
+    def eliminar(self, muestra):
+        with self.captureOnCommitCallbacks(execute=True):
+            muestra.delete()
+
+    def crear_brote(self):
+        """Cuatro casos del 2 al 5 de marzo: alerta NARANJA originada por el segundo"""
+        return [self.crear(f'B-{i}', date(2026, 3, 2 + i), giardia_intestinalis='Q') for i in range(4)]
+
+    def assertAlerta(self, nivel, casos, casos_dia):
+        alerta = Alerta.objects.get(estado='ACTIVA')
+        self.assertEqual((alerta.nivel, alerta.numero_casos, alerta.numero_casos_dia), (nivel, casos, casos_dia))
+        return alerta
+
+    def test_crear_y_escalar(self):
+        self.crear('M-0', date(2026, 3, 2), giardia_intestinalis='Q')
+        self.assertFalse(Alerta.objects.exists())
+
+        brote = self.crear_brote()
+        alerta = self.assertAlerta('NARANJA', 5, 1)
+        self.assertEqual(alerta.muestra_origen, brote[0])
+        # Otro centro no cuenta
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_muestra('M-B', date(2026, 3, 5), self.centro_b, giardia_intestinalis='Q')
+        self.assertAlerta('NARANJA', 5, 1)
+
+    def test_descontar_al_eliminar(self):
+        brote = self.crear_brote()
+        self.assertAlerta('NARANJA', 4, 1)
+
+        # Los casos quitados son anteriores a la fecha de referencia (5 de marzo)
+        self.eliminar(brote[0])
+        self.eliminar(brote[2])
+        self.assertAlerta('AMARILLO', 2, 1)
+
+        # Sin casos el 5 de marzo la referencia pasa al último día con casos
+        self.eliminar(brote[3])
+        self.assertAlerta('VERDE', 1, 1)
+
+    def test_editar_muestra_antigua(self):
+        antigua = self.crear('M-A', date(2026, 1, 10), giardia_intestinalis='Q')
+        brote = self.crear_brote()
+        self.assertAlerta('NARANJA', 4, 1)
+
+        antigua.giardia_intestinalis = ''
+        self.guardar(antigua)
+        self.assertAlerta('NARANJA', 4, 1)
+
+        # Mover un caso del brote a una fecha antigua lo descuenta de la ventana
+        brote[2].fecha_examen = date(2026, 1, 12)
+        self.guardar(brote[2])
+        self.assertAlerta('AMARILLO', 3, 1)
+
+    def test_carga_tardia(self):
+        self.crear_brote()
+        self.crear('M-A', date(2026, 1, 10), giardia_intestinalis='Q')
+        self.assertAlerta('NARANJA', 4, 1)
+
+        # Una carga tardía dentro de la ventana sí se suma
+        self.crear('M-B', date(2026, 2, 28), giardia_intestinalis='Q')
+        self.assertAlerta('NARANJA', 5, 1)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboard'},
+})
+class ApiTestCase(DatosBase, TestCase):
+    """Validación de parámetros y alcance de la API JSON"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos_base()
+        Muestra.objects.create(
+            expediente=cls.expediente, numero_examen='M-A', fecha_examen=date(2025, 3, 4),
+            centro_atencion=cls.centro_a, consistencia='FOR', usuario_creacion=cls.usuario,
+            giardia_intestinalis='Q',
+        )
+        Muestra.objects.create(
+            expediente=cls.expediente, numero_examen='M-B', fecha_examen=date(2025, 3, 5),
+            centro_atencion=cls.centro_b, consistencia='FOR', usuario_creacion=cls.usuario,
+        )
+
+    def setUp(self):
+        # Las versiones de la cache se revierten con cada test; los datos cacheados no
+        caches['dashboard'].clear()
+        self.client.force_login(self.usuario)
+
+    def kpis(self, **parametros):
+        respuesta = self.client.get(reverse('api_dashboard_widget', args=['kpis']), parametros)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        datos = respuesta.json()
+        return datos['alcance'], datos['datos']['total_muestras']
+
+    def test_alcance_lnp(self):
+        self.assertEqual(self.kpis(), ('nacional', 2))
+        self.assertEqual(self.kpis(region=self.region_1.pk), ('region', 1))
+        self.assertEqual(self.kpis(centro=self.centro_b.pk), ('centro', 1))
+
+    def test_alcance_reg_y_cat(self):
+        self.client.force_login(self.crear_usuario('reg', 'REG', region=self.region_1))
+        self.assertEqual(self.kpis(), ('region', 1))
+        self.assertEqual(self.kpis(centro=self.centro_a.pk), ('centro', 1))
+        # Un centro de otra región no existe para el usuario
+        url = reverse('api_dashboard_widget', args=['kpis'])
+        self.assertEqual(self.client.get(url, {'centro': self.centro_b.pk}).status_code, 404)
+
+        # CAT: siempre su centro, aunque pida otro alcance
+        self.client.force_login(self.crear_usuario('cat', 'CAT', centro_atencion=self.centro_b))
+        self.assertEqual(self.kpis(region=self.region_1.pk), ('centro', 1))
+
+    def test_parametros_invalidos(self):
+        url = reverse('api_dashboard_widget', args=['kpis'])
+        for parametros in ({'region': 'abc'}, {'centro': '1.5'}):
+            respuesta = self.client.get(url, parametros)
+            self.assertEqual(respuesta.status_code, 400, parametros)
+            self.assertIn('numérico', respuesta.json()['error'])
+        self.assertEqual(self.client.get(url, {'region': 999999}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_dashboard_widget', args=['otro'])).status_code, 404)
+
+        self.client.logout()
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+
+    def test_reporte_excel_rango(self):
+        url = reverse('api_reporte_excel')
+        proxima = (date.today() + timedelta(days=7)).isocalendar()
+        invalidos = {
+            'formato': {'desde': '2025-xx'},
+            'orden': {'desde': '2025-10', 'hasta': '2025-01'},
+            'futura': {'desde': '2025-01', 'hasta': f'{proxima[0]}-{proxima[1]}'},
+            'largo': {'desde': '2023-01', 'hasta': '2025-01'},
+        }
+        for caso, parametros in invalidos.items():
+            respuesta = self.client.get(url, parametros)
+            self.assertEqual(respuesta.status_code, 400, caso)
+            self.assertIn('error', respuesta.json())
+
+        # Un rango válido se encola (la tarea corre al confirmar)
+        respuesta = self.client.get(url, {'desde': '2025-01', 'hasta': '2025-52'})
+        self.assertEqual(respuesta.status_code, 202)
+
+    def test_boletin_semana(self):
+        url = reverse('api_boletin_semanal')
+        proxima = (date.today() + timedelta(days=7)).isocalendar()
+        self.assertEqual(self.client.get(url, {'semana': 'S10'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'semana': f'{proxima[0]}-{proxima[1]}'}).status_code, 400)
+        # Fuera del historial y sin muestras registradas: no se dibuja
+        self.assertEqual(self.client.get(url, {'semana': '0001-01'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'semana': '2010-10'}).status_code, 404)
+
+        self.crear_muestra('M-1', date(2010, 3, 9), self.centro_a)
+        self.assertTrue(semana_con_boletin(2010, 10))
+        # Las semanas se crean por año completo
+        self.assertTrue(semana_con_boletin(2010, 40))
+        self.assertFalse(semana_con_boletin(2009, 40))
+        self.assertTrue(semana_con_boletin(*ultima_semana_cerrada()))
+
+
+class TareasTestCase(TestCase):
+    """Cola de tareas diferidas: agrupación por clave, toma de lotes y reintentos"""
+
+    def encolar(self, *claves):
+        with self.captureOnCommitCallbacks(execute=True):
+            tareas.encolar(TareaDiferida(tipo='prueba', clave=clave, parametros={'clave': clave}) for clave in claves)
+
+    def test_encolar_agrupa_por_clave(self):
+        self.encolar('a', 'b')
+        self.encolar('a')
+        self.assertEqual(sorted(TareaDiferida.objects.values_list('clave', flat=True)), ['a', 'b'])
+
+        # Si la transacción se revierte no se encola nada
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                tareas.encolar([TareaDiferida(tipo='prueba', clave='c')])
+                raise RuntimeError
+        self.assertFalse(TareaDiferida.objects.filter(clave='c').exists())
+
+    def test_procesar_y_reintentar(self):
+        ejecutadas = []
+        manejador = mock.Mock(side_effect=lambda parametros: ejecutadas.extend(p['clave'] for p in parametros))
+        self.encolar('a', 'b')
+        with mock.patch.dict(tareas.MANEJADORES, {'prueba': manejador}):
+            self.assertEqual(tareas.procesar_lote(), (2, 0))
+        # Un solo llamado por tipo y lote; las tareas hechas se borran
+        manejador.assert_called_once()
+        self.assertEqual(sorted(ejecutadas), ['a', 'b'])
+        self.assertFalse(TareaDiferida.objects.exists())
+
+        self.encolar('a')
+        fallido = mock.Mock(side_effect=ValueError('falla'))
+        with mock.patch.dict(tareas.MANEJADORES, {'prueba': fallido}), self.assertLogs(tareas.logger, 'ERROR'):
+            self.assertEqual(tareas.procesar_lote(), (0, 1))
+            tarea = TareaDiferida.objects.get()
+            self.assertEqual((tarea.estado, tarea.intentos), ('PENDIENTE', 1))
+            self.assertEqual(tarea.ultimo_error, 'ValueError: falla')
+            self.assertGreater(tarea.disponible_desde, timezone.now())
+            # En espera: no se vuelve a tomar
+            self.assertEqual(tareas.procesar_lote(), (0, 0))
+
+            # Último intento: queda FALLIDA y no se vuelve a tomar
+            TareaDiferida.objects.update(intentos=tareas.MAX_INTENTOS - 1, disponible_desde=timezone.now())
+            self.assertEqual(tareas.procesar_lote(), (0, 1))
+            self.assertEqual(TareaDiferida.objects.get().estado, 'FALLIDA')
+            self.assertEqual(tareas.procesar_lote(), (0, 0))
+
+    def test_reintento_con_clave_ya_pendiente(self):
+        self.encolar('a')
+        tomadas = tareas._tomar_lote(10)
+        self.assertEqual(TareaDiferida.objects.get().estado, 'EN_PROCESO')
+
+        # Mientras se procesaba llegó otra tarea con la misma clave: esa hará el trabajo
+        self.encolar('a')
+        tareas._reintentar(tomadas, 'error')
+        tarea = TareaDiferida.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), ('PENDIENTE', 0))
+
+    def test_tarea_abandonada(self):
+        self.encolar('a')
+        tareas._tomar_lote(10)
+        self.assertEqual(tareas._tomar_lote(10), [])
+
+        # Un worker que murió a mitad de lote: la tarea se vuelve a tomar
+        hace_rato = timezone.now() - timedelta(seconds=tareas.TIEMPO_ABANDONO + 1)
+        TareaDiferida.objects.update(fecha_inicio_proceso=hace_rato)
+        self.assertEqual([t.clave for t in tareas._tomar_lote(10)], ['a'])
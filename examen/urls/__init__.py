@@ -21,4 +21,7 @@ urlpatterns = [
     path('dashboard/nacional/', dashboard_nacional, name='dashboard_nacional'),
     path('dashboard/regional/', dashboard_regional, name='dashboard_regional'),
     path('dashboard/centro/', dashboard_centro, name='dashboard_centro'),
+    
+    # API JSON de los widgets del dashboard
+    path('api/', include('examen.urls.api_urls')),
 ]
\ No newline at end of file
@@ -0,0 +1,23 @@
+from django.urls import path
+from ..views import dashboard_widget_api, importar_muestras_api, exportar_muestras_api, exportar_analitica_api, reporte_excel_api, boletin_semanal_api, buscar_api
+
+urlpatterns = [
+    # Secciones de los dashboards (kpis, semanas, matriz, parasitos, mapa-departamentos, ...)
+    path('dashboard/<slug:widget>/', dashboard_widget_api, name='api_dashboard_widget'),
+
+    # Importación masiva de muestras (CSV/XLSX)
+    path('importar/muestras/', importar_muestras_api, name='api_importar_muestras'),
+
+    # Exportación en streaming (CSV/NDJSON) para PowerBI
+    path('exportar/muestras/', exportar_muestras_api, name='api_exportar_muestras'),
+    path('exportar/analitica/', exportar_analitica_api, name='api_exportar_analitica'),
+
+    # Reporte semanal en Excel (se genera en segundo plano y queda en cache)
+    path('reportes/excel/', reporte_excel_api, name='api_reporte_excel'),
+
+    # Boletín epidemiológico semanal en PDF (nacional o regional)
+    path('reportes/boletin/', boletin_semanal_api, name='api_boletin_semanal'),
+
+    # Autocompletar de pacientes y muestras (nombre, DNI o número de examen)
+    path('buscar/', buscar_api, name='api_buscar'),
+]
@@ -1,5 +1,6 @@
 from .auth_views import login_view, logout_view, redirect_to_dashboard, dashboard_view
 from .dashboard_views import dashboard_nacional, dashboard_regional, dashboard_centro
+from .api_views import dashboard_widget_api, importar_muestras_api, exportar_muestras_api, exportar_analitica_api, reporte_excel_api, boletin_semanal_api, buscar_api
 
 __all__ = [
     'login_view',
@@ -9,4 +10,11 @@ __all__ = [
     'dashboard_nacional',
     'dashboard_regional',
     'dashboard_centro',
+    'dashboard_widget_api',
+    'importar_muestras_api',
+    'exportar_muestras_api',
+    'exportar_analitica_api',
+    'reporte_excel_api',
+    'boletin_semanal_api',
+    'buscar_api',
 ]
\ No newline at end of file
@@ -0,0 +1,336 @@
+import os
+import tempfile
+from datetime import date, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404, FileResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from examen.models import Region, CentroAtencion
+from examen.services import WIDGETS, obtener_widget, importar_muestras
+from examen.services.widgets import centros_del_alcance, muestras_del_alcance
+from examen.services.exportacion import respuesta_exportacion, FORMATOS
+from examen.services.analitica import escribir_hechos, EXTENSIONES
+from examen.services.reportes_excel import parsear_semana, validar_rango, reporte_en_cache
+from examen.services.tareas import encolar, tarea_reporte_excel
+from examen.services.boletines import obtener_boletin, ultima_semana_cerrada, semana_futura, semana_con_boletin
+from examen.services.busqueda import buscar, TIPOS as TIPOS_BUSQUEDA, LIMITE_RESULTADOS
+
+
+# Errores de validación que se devuelven en la respuesta de importación
+MAX_ERRORES_RESPUESTA = 500
+
+# Resultados máximos por petición del autocompletar
+MAX_LIMITE_BUSQUEDA = 50
+
+
+def _id_parametro(request, nombre):
+    """Id numérico de un parámetro de la query string, o None si no viene"""
+    valor = request.query_params.get(nombre)
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValidationError({'error': f'{nombre} debe ser numérico'})
+
+
+def resolver_alcance(request):
+    """
+    Alcance (alcance, objeto) de la petición según el rol del usuario.
+
+    - LNP: nacional; puede consultar una región (?region=<id>) o un centro (?centro=<id>)
+    - REG: su región; puede consultar un centro de su región (?centro=<id>)
+    - CAT: su centro de atención
+    """
+    profile = getattr(request.user, 'profile', None)
+    if not profile or not profile.rol:
+        raise PermissionDenied('El usuario no tiene un rol asignado')
+
+    nivel = profile.rol.nivel
+    region_id = _id_parametro(request, 'region')
+    centro_id = _id_parametro(request, 'centro')
+
+    if nivel == 'LNP':
+        if centro_id:
+            return 'centro', get_object_or_404(CentroAtencion, pk=centro_id)
+        if region_id:
+            return 'region', get_object_or_404(Region, pk=region_id)
+        return 'nacional', None
+
+    if nivel == 'REG':
+        if not profile.region:
+            raise PermissionDenied('El usuario no tiene una región asignada')
+        if centro_id:
+            return 'centro', get_object_or_404(CentroAtencion, pk=centro_id, region=profile.region)
+        return 'region', profile.region
+
+    if nivel == 'CAT':
+        if not profile.centro_atencion:
+            raise PermissionDenied('El usuario no tiene un centro de atención asignado')
+        return 'centro', profile.centro_atencion
+
+    raise PermissionDenied('Rol no válido')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def dashboard_widget_api(request, widget):
+    """Datos de una sección del dashboard dentro del alcance del usuario"""
+    if widget not in WIDGETS:
+        raise Http404('Widget no encontrado')
+
+    alcance, objeto = resolver_alcance(request)
+
+    return Response({
+        'widget': widget,
+        'alcance': alcance,
+        'datos': obtener_widget(widget, alcance, objeto),
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def importar_muestras_api(request):
+    """
+    Importa muestras desde un archivo CSV o XLSX (campo `archivo`).
+    Solo se aceptan filas de centros dentro del alcance del usuario.
+    Con `simular=1` solo se valida el archivo.
+    """
+    archivo = request.FILES.get('archivo')
+    if not archivo:
+        return Response({'error': 'Debe adjuntar un archivo'}, status=status.HTTP_400_BAD_REQUEST)
+
+    alcance, objeto = resolver_alcance(request)
+    simular = request.data.get('simular') in ('1', 'true', 'True')
+
+    try:
+        resultado = importar_muestras(
+            archivo,
+            request.user,
+            centros=centros_del_alcance(alcance, objeto),
+            simular=simular,
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    errores = resultado['errores']
+    return Response({
+        'simulacion': simular,
+        'filas': resultado['filas'],
+        'importadas': resultado['importadas'],
+        'expedientes_creados': resultado['expedientes_creados'],
+        'total_errores': len(errores),
+        'errores': [
+            {'fila': fila, 'error': mensaje}
+            for fila, mensaje in errores[:MAX_ERRORES_RESPUESTA]
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exportar_muestras_api(request):
+    """
+    Descarga en streaming las muestras del alcance del usuario.
+
+    Parámetros: formato (csv o ndjson; por defecto csv), desde y hasta
+    (fechas de examen AAAA-MM-DD) y año (año epidemiológico), además de
+    region/centro según el rol.
+    """
+    alcance, objeto = resolver_alcance(request)
+    muestras = muestras_del_alcance(alcance, objeto)
+
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return Response(
+            {'error': f'Formato no soportado (use {", ".join(FORMATOS)})'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        for parametro, filtro in (('desde', 'fecha_examen__gte'), ('hasta', 'fecha_examen__lte')):
+            if request.query_params.get(parametro):
+                muestras = muestras.filter(**{filtro: date.fromisoformat(request.query_params[parametro])})
+        if request.query_params.get('año'):
+            muestras = muestras.filter(año_epidemiologico=int(request.query_params['año']))
+    except ValueError:
+        return Response(
+            {'error': 'Fechas en formato AAAA-MM-DD y año numérico'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    nombre = f'muestras_{alcance}' + (f'_{objeto.pk}' if objeto else '')
+    return respuesta_exportacion(muestras, formato, nombre)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exportar_analitica_api(request):
+    """
+    Descarga la tabla de hechos de muestras del alcance del usuario en
+    formato columnar (formato=parquet o feather; por defecto parquet).
+    Con año se limita a un año epidemiológico.
+    """
+    alcance, objeto = resolver_alcance(request)
+    muestras = muestras_del_alcance(alcance, objeto)
+
+    formato = request.query_params.get('formato', 'parquet')
+    if formato not in EXTENSIONES:
+        return Response(
+            {'error': f'Formato no soportado (use {", ".join(EXTENSIONES)})'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if request.query_params.get('año'):
+        try:
+            muestras = muestras.filter(año_epidemiologico=int(request.query_params['año']))
+        except ValueError:
+            return Response({'error': 'El año debe ser numérico'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Parquet y Feather escriben su índice al final: se arma en un archivo
+    # temporal por bloques y se envía desde el disco. Sin muestras se envía
+    # un archivo sin filas con el esquema completo (pandas y PowerBI lo abren)
+    temporal = tempfile.NamedTemporaryFile(suffix=f'.{EXTENSIONES[formato]}', delete=False)
+    temporal.close()
+    try:
+        escribir_hechos(temporal.name, muestras, formato, vacio=True)
+        archivo = open(temporal.name, 'rb')
+    except ImproperlyConfigured as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    finally:
+        # En POSIX el archivo abierto sigue legible después de borrarlo
+        os.unlink(temporal.name)
+
+    nombre = f'muestras_{alcance}' + (f'_{objeto.pk}' if objeto else '')
+    return FileResponse(archivo, as_attachment=True, filename=f'{nombre}.{EXTENSIONES[formato]}')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def reporte_excel_api(request):
+    """
+    Reporte Excel del alcance del usuario para un rango de semanas
+    epidemiológicas (desde y hasta en formato AAAA-SS; por defecto la última
+    semana completa). El rango no puede incluir semanas futuras ni superar
+    REPORTES_MAX_SEMANAS semanas.
+
+    Si el reporte ya está generado con los datos actuales se descarga; si no
+    se encola su generación y se responde 202: el cliente vuelve a pedirlo
+    más tarde con los mismos parámetros.
+    """
+    alcance, objeto = resolver_alcance(request)
+    objeto_id = objeto.pk if objeto else None
+
+    anterior = (date.today() - timedelta(days=7)).isocalendar()
+    try:
+        desde = parsear_semana(request.query_params.get('desde') or f'{anterior[0]}-{anterior[1]}')
+        hasta = parsear_semana(request.query_params.get('hasta') or f'{desde[0]}-{desde[1]}')
+    except ValueError:
+        return Response({'error': 'Semanas en formato AAAA-SS'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        validar_rango(desde, hasta)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    ruta = reporte_en_cache(alcance, objeto_id, desde, hasta)
+    if ruta is None:
+        encolar([tarea_reporte_excel(alcance, objeto_id, desde, hasta)])
+        # Con TAREAS_SINCRONAS el reporte ya se generó al encolar
+        ruta = reporte_en_cache(alcance, objeto_id, desde, hasta)
+    if ruta is None:
+        return Response({
+            'estado': 'en_proceso',
+            'desde': f'{desde[0]}-{desde[1]:02d}',
+            'hasta': f'{hasta[0]}-{hasta[1]:02d}',
+        }, status=status.HTTP_202_ACCEPTED)
+
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        # Se reemplazó por una versión más nueva entre la consulta y la apertura
+        return Response({'estado': 'en_proceso'}, status=status.HTTP_202_ACCEPTED)
+    nombre = f'reporte_{alcance}' + (f'_{objeto_id}' if objeto else '')
+    nombre += f'_{desde[0]}-S{desde[1]:02d}_{hasta[0]}-S{hasta[1]:02d}.xlsx'
+    return FileResponse(archivo, as_attachment=True, filename=nombre)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def boletin_semanal_api(request):
+    """
+    Boletín epidemiológico semanal en PDF (semana=AAAA-SS; por defecto la
+    última semana cerrada). Hay boletín nacional y por región: un usuario de
+    centro recibe el de la región de su centro. Las semanas anteriores a
+    BOLETINES_SEMANAS_HISTORIAL solo se dibujan si tienen muestras registradas.
+    """
+    alcance, objeto = resolver_alcance(request)
+    if alcance == 'centro':
+        alcance, objeto_id = 'region', objeto.region_id
+    else:
+        objeto_id = objeto.pk if objeto else None
+
+    try:
+        if request.query_params.get('semana'):
+            año, semana = parsear_semana(request.query_params['semana'])
+        else:
+            año, semana = ultima_semana_cerrada()
+    except ValueError:
+        return Response({'error': 'Semana en formato AAAA-SS'}, status=status.HTTP_400_BAD_REQUEST)
+    if semana_futura(año, semana):
+        return Response({'error': 'La semana todavía no empezó'}, status=status.HTTP_400_BAD_REQUEST)
+    if not semana_con_boletin(año, semana):
+        return Response({'error': 'No hay datos registrados para esa semana'}, status=status.HTTP_404_NOT_FOUND)
+
+    ruta = obtener_boletin(alcance, objeto_id, año, semana)
+    nombre = f'boletin_{alcance}' + (f'_{objeto_id}' if objeto_id else '') + f'_{año}-S{semana:02d}.pdf'
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=nombre, content_type='application/pdf')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def buscar_api(request):
+    """
+    Autocompletar de pacientes y muestras dentro del alcance del usuario.
+
+    Parámetros: q (nombre, DNI o número de examen; cada palabra por
+    prefijo), tipo (expediente o muestra; por defecto ambos) y limite
+    (hasta MAX_LIMITE_BUSQUEDA), además de region/centro según el rol.
+    """
+    alcance, objeto = resolver_alcance(request)
+
+    tipo = request.query_params.get('tipo')
+    if tipo and tipo not in TIPOS_BUSQUEDA:
+        return Response(
+            {'error': f'Tipo no soportado (use {", ".join(TIPOS_BUSQUEDA)})'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        limite = min(int(request.query_params.get('limite', LIMITE_RESULTADOS)), MAX_LIMITE_BUSQUEDA)
+    except ValueError:
+        return Response({'error': 'limite debe ser numérico'}, status=status.HTTP_400_BAD_REQUEST)
+
+    entradas = buscar(
+        request.query_params.get('q', ''),
+        tipos=[TIPOS_BUSQUEDA[tipo]] if tipo else TIPOS_BUSQUEDA.values(),
+        centros=centros_del_alcance(alcance, objeto) if objeto else None,
+        limite=max(limite, 1),
+    )
+    nombres_tipo = {valor: nombre for nombre, valor in TIPOS_BUSQUEDA.items()}
+    return Response({
+        'resultados': [
+            {
+                'tipo': nombres_tipo[entrada.tipo],
+                'id': entrada.objeto_id,
+                'etiqueta': entrada.etiqueta,
+                'fecha': entrada.fecha,
+            }
+            for entrada in entradas
+        ],
+    })
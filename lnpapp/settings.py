@@ -10,11 +10,22 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Variables de entorno de un archivo .env junto a manage.py (ver .env.example).
+# Las variables ya definidas en el entorno tienen prioridad.
+load_dotenv(BASE_DIR / '.env')
+
+
+def _env_bool(nombre, defecto=False):
+    return os.getenv(nombre, str(defecto)).strip().lower() in ('1', 'true', 'si', 'sí', 'yes')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -78,13 +89,116 @@ WSGI_APPLICATION = 'lnpapp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Con DB_ENGINE=postgresql (producción) se usa PostgreSQL; si no, SQLite
+# (desarrollo y laboratorios regionales de un solo servidor). Varias
+# regiones escribiendo a la vez se serializan en el bloqueo del archivo de
+# SQLite.
+
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'lnpapp'),
+            'USER': os.getenv('DB_USER', 'lnpapp'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            # Ruta a un directorio para conectarse por socket Unix
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Conexiones persistentes: cada proceso reutiliza la suya durante
+            # DB_CONN_MAX_AGE segundos y la verifica antes de cada petición
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'application_name': 'lnpapp',
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+            },
+        }
     }
+
+    # Pool de conexiones de psycopg 3 dentro de cada proceso. Reemplaza a las
+    # conexiones persistentes (Django no permite ambos a la vez).
+    if _env_bool('DB_POOL'):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        }
+
+    # Detrás de PgBouncer en modo transacción los cursores con nombre
+    # (QuerySet.iterator) no sobreviven entre transacciones
+    if _env_bool('DB_PGBOUNCER'):
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Toma el bloqueo de escritura al abrir la transacción: una
+                # transacción que lee y después escribe espera su turno en vez
+                # de fallar con 'database is locked'
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Pragmas aplicados a cada conexión SQLite (ver examen/services/sqlite.py).
+# {} deja los valores por defecto de SQLite.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',        # lectores y escritor no se bloquean entre sí
+    'synchronous': 'normal',      # fsync solo en los checkpoints del WAL
+    'busy_timeout': 10000,        # ms de espera ante un bloqueo
+    'cache_size': -32000,         # 32 MiB de páginas por conexión
+    'mmap_size': 268435456,       # 256 MiB leídos por memoria mapeada
+    'temp_store': 'memory',       # tablas temporales y ordenamientos en RAM
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'dashboard' guarda los snapshots de los dashboards (ver examen/services/cache_dashboard.py).
+# Se usa archivo para que todos los procesos del servidor compartan el cache sin servicios externos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'dashboard',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+DASHBOARD_CACHE_ALIAS = 'dashboard'
+DASHBOARD_CACHE_REVALIDAR_EN_SEGUNDO_PLANO = True
+
+# Cola de tareas diferidas (evaluación de alertas).
+# Las tareas se procesan con `python manage.py procesar_tareas`.
+# Con True se ejecutan al confirmar cada transacción (sin worker).
+TAREAS_SINCRONAS = False
+TAREAS_MAX_INTENTOS = 5
+
+# Reportes Excel generados por la tarea 'reporte_excel' (uno por alcance y rango de semanas)
+REPORTES_DIR = BASE_DIR / 'reportes'
+# Semanas como máximo en un reporte pedido por la API
+REPORTES_MAX_SEMANAS = 53
+
+# Boletines epidemiológicos semanales en PDF (`python manage.py generar_boletines` cada lunes)
+BOLETINES_DIR = BASE_DIR / 'boletines'
+# Semanas hacia atrás que la API dibuja aunque no tengan muestras registradas
+BOLETINES_SEMANAS_HISTORIAL = 104
+
+# Admin de Muestra y Expediente para tablas de millones de filas: total
+# estimado, paginación por cursor y filtros de autocompletar
+ADMIN_TABLAS_GRANDES = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators